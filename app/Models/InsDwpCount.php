@@ -26,6 +26,15 @@ class InsDwpCount extends Model
     protected $casts = [
         'count' => 'integer',
         'incremental' => 'integer',
+        'th_ok' => 'boolean',
+        'side_ok' => 'boolean',
+        'flags' => 'integer',
+        'auc_th' => 'float',
+        'auc_side' => 'float',
+        'rise_th' => 'float',
+        'rise_side' => 'float',
+        'fall_th' => 'float',
+        'fall_side' => 'float',
     ];
 
     /**
@@ -0,0 +1,60 @@
+<?php
+
+namespace App\Models;
+
+use Illuminate\Database\Eloquent\Model;
+
+/**
+ * Per-minute / per-shift aggregate of ins_dwp_counts for one line, machine and position.
+ * Written by the DWP poller; read-only from the app.
+ */
+class InsDwpRollup extends Model
+{
+    protected $table = 'ins_dwp_rollups';
+
+    protected $guarded = ['*'];
+
+    protected $casts = [
+        'period_start' => 'datetime',
+        'shift' => 'integer',
+        'mechine' => 'integer',
+        'cycles' => 'integer',
+        'good_cycles' => 'integer',
+        'peak_th_sum' => 'float',
+        'peak_th_sumsq' => 'float',
+        'peak_side_sum' => 'float',
+        'peak_side_sumsq' => 'float',
+        'duration_sum' => 'float',
+        'duration_sumsq' => 'float',
+    ];
+
+    public function scopeMinutes($query)
+    {
+        return $query->where('period', 'minute');
+    }
+
+    public function scopeShifts($query)
+    {
+        return $query->where('period', 'shift');
+    }
+
+    /**
+     * Mean of a moment series (peak_th, peak_side, duration)
+     */
+    public function mean(string $series): ?float
+    {
+        return $this->cycles > 0 ? $this->{"{$series}_sum"} / $this->cycles : null;
+    }
+
+    /**
+     * Population standard deviation of a moment series
+     */
+    public function stddev(string $series): ?float
+    {
+        if ($this->cycles <= 0) {
+            return null;
+        }
+        $mean = $this->mean($series);
+        return sqrt(max(0, $this->{"{$series}_sumsq"} / $this->cycles - $mean * $mean));
+    }
+}
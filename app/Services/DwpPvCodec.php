@@ -0,0 +1,73 @@
+<?php
+
+namespace App\Services;
+
+/**
+ * Reader for the `pv` column of ins_dwp_counts.
+ *
+ * Version 1 rows hold plain JSON arrays. Version 2 rows ("v": 2, written by the
+ * Python poller when DWP_PV_VERSION=2) hold each series as base64 of zig-zag
+ * LEB128 varints of the first differences; timestamps are stored as a start
+ * time ("t0") plus the packed sample intervals ("dt"). See py/dwp-poll/pv_codec.py.
+ *
+ * decode() always returns the version 1 layout:
+ * ['waveforms' => [[th...], [side...]], 'timestamps' => [...], 'quality' => [...]]
+ */
+class DwpPvCodec
+{
+    public static function decode($pv): ?array
+    {
+        if (is_string($pv)) {
+            $pv = json_decode($pv, true);
+        }
+        if (!is_array($pv)) {
+            return null;
+        }
+
+        if (($pv['v'] ?? 1) != 2) {
+            return $pv;
+        }
+
+        $decoded = [
+            'waveforms' => array_map([self::class, 'unpackSeries'], $pv['waveforms'] ?? []),
+        ];
+        if (isset($pv['t0'])) {
+            $timestamps = [(int) $pv['t0']];
+            foreach (self::unpackSeries($pv['dt'] ?? '') as $interval) {
+                $timestamps[] = end($timestamps) + $interval;
+            }
+            $decoded['timestamps'] = $timestamps;
+        }
+        $decoded['quality'] = $pv['quality'] ?? [];
+
+        return $decoded;
+    }
+
+    private static function unpackSeries(string $packed): array
+    {
+        $bytes = base64_decode($packed, true);
+        if ($bytes === false) {
+            return [];
+        }
+
+        $values = [];
+        $value = 0;
+        $zigzag = 0;
+        $shift = 0;
+        $length = strlen($bytes);
+        for ($i = 0; $i < $length; $i++) {
+            $byte = ord($bytes[$i]);
+            $zigzag |= ($byte & 0x7F) << $shift;
+            if ($byte & 0x80) {
+                $shift += 7;
+                continue;
+            }
+            $value += ($zigzag >> 1) ^ -($zigzag & 1);
+            $values[] = $value;
+            $zigzag = 0;
+            $shift = 0;
+        }
+
+        return $values;
+    }
+}
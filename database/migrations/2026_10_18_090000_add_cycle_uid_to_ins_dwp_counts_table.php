@@ -0,0 +1,30 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        Schema::table('ins_dwp_counts', function (Blueprint $table) {
+            // Unique ID assigned by the DWP poller spool so replayed cycles are inserted once
+            $table->uuid('cycle_uid')->nullable()->unique()->after('id');
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::table('ins_dwp_counts', function (Blueprint $table) {
+            $table->dropUnique(['cycle_uid']);
+            $table->dropColumn('cycle_uid');
+        });
+    }
+};
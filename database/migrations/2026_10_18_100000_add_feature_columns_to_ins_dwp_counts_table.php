@@ -0,0 +1,72 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\DB;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        Schema::table('ins_dwp_counts', function (Blueprint $table) {
+            // Per-cycle features computed by the DWP poller at ingest, so quality and
+            // trend reports don't have to JSON_EXTRACT std_error or decode pv per row
+            $table->string('grade', 20)->nullable()->after('std_error');
+            $table->string('cycle_type', 20)->nullable()->after('grade');
+            $table->boolean('th_ok')->nullable()->after('cycle_type')->comment('std_error[0][0]');
+            $table->boolean('side_ok')->nullable()->after('th_ok')->comment('std_error[1][0]');
+            $table->unsignedSmallInteger('peak_th')->nullable()->after('side_ok');
+            $table->unsignedSmallInteger('peak_side')->nullable()->after('peak_th');
+            $table->unsignedInteger('time_to_peak_th_ms')->nullable()->after('peak_side');
+            $table->unsignedInteger('time_to_peak_side_ms')->nullable()->after('time_to_peak_th_ms');
+            $table->unsignedInteger('dwell_th_ms')->nullable()->after('time_to_peak_side_ms')->comment('Time above the dwell level');
+            $table->unsignedInteger('dwell_side_ms')->nullable()->after('dwell_th_ms');
+            $table->float('auc_th')->nullable()->after('dwell_side_ms')->comment('Area under curve, value x seconds');
+            $table->float('auc_side')->nullable()->after('auc_th');
+            $table->float('rise_th')->nullable()->after('auc_side')->comment('Mean slope up to the peak, per second');
+            $table->float('rise_side')->nullable()->after('rise_th');
+            $table->float('fall_th')->nullable()->after('rise_side')->comment('Mean slope down from the peak, per second');
+            $table->float('fall_side')->nullable()->after('fall_th');
+            $table->unsignedTinyInteger('flags')->nullable()->after('fall_side')
+                  ->comment('Bits: 1 TH sensor suspect, 2 Side sensor suspect, 4 impossible jump');
+
+            // Covers the per-line quality rate queries over a time range
+            $table->index(['line', 'created_at', 'th_ok', 'side_ok'], 'ins_dwp_counts_line_created_quality_index');
+            $table->index(['grade', 'created_at']);
+        });
+
+        // Existing rows: everything that is stored as JSON can be filled in SQL.
+        // The waveform features need pv decoded: py/dwp-poll/backfill_features.py
+        DB::statement("
+            UPDATE ins_dwp_counts SET
+                th_ok = JSON_EXTRACT(std_error, '$[0][0]'),
+                side_ok = JSON_EXTRACT(std_error, '$[1][0]'),
+                grade = JSON_UNQUOTE(JSON_EXTRACT(pv, '$.quality.grade')),
+                cycle_type = JSON_UNQUOTE(JSON_EXTRACT(pv, '$.quality.cycle_type')),
+                peak_th = JSON_EXTRACT(pv, '$.quality.peaks.th'),
+                peak_side = JSON_EXTRACT(pv, '$.quality.peaks.side')
+            WHERE th_ok IS NULL
+        ");
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::table('ins_dwp_counts', function (Blueprint $table) {
+            $table->dropIndex('ins_dwp_counts_line_created_quality_index');
+            $table->dropIndex(['grade', 'created_at']);
+            $table->dropColumn([
+                'grade', 'cycle_type', 'th_ok', 'side_ok',
+                'peak_th', 'peak_side', 'time_to_peak_th_ms', 'time_to_peak_side_ms',
+                'dwell_th_ms', 'dwell_side_ms', 'auc_th', 'auc_side',
+                'rise_th', 'rise_side', 'fall_th', 'fall_side', 'flags',
+            ]);
+        });
+    }
+};
@@ -0,0 +1,61 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        // Per-minute and per-shift aggregates of ins_dwp_counts, maintained by the
+        // DWP poller in the same transaction as the cycles (py/dwp-poll/rollup.py)
+        // and rebuilt from history by py/dwp-poll/backfill_rollups.py.
+        // Mean = sum / cycles, variance = sumsq / cycles - mean²
+        Schema::create('ins_dwp_rollups', function (Blueprint $table) {
+            $table->id();
+            $table->enum('period', ['minute', 'shift']);
+            $table->dateTime('period_start');
+            $table->unsignedTinyInteger('shift')->nullable()->comment('Shift number, shift rows only');
+            $table->string('line');
+            $table->integer('mechine');
+            $table->string('position');
+
+            $table->unsignedInteger('cycles')->default(0);
+            $table->unsignedInteger('good_cycles')->default(0)->comment('th_ok and side_ok');
+            $table->unsignedInteger('grade_excellent')->default(0);
+            $table->unsignedInteger('grade_good')->default(0);
+            $table->unsignedInteger('grade_marginal')->default(0);
+            $table->unsignedInteger('grade_defective')->default(0);
+            $table->unsignedInteger('grade_sensor_low')->default(0);
+            $table->unsignedInteger('grade_pressure_high')->default(0);
+            $table->unsignedInteger('grade_short_cycle')->default(0);
+            $table->unsignedInteger('grade_overflow')->default(0);
+            $table->unsignedInteger('grade_timeout')->default(0);
+            $table->unsignedInteger('grade_other')->default(0);
+
+            foreach (['peak_th', 'peak_side', 'duration'] as $series) {
+                $table->double("{$series}_sum")->default(0);
+                $table->double("{$series}_sumsq")->default(0);
+                $table->float("{$series}_min")->nullable();
+                $table->float("{$series}_max")->nullable();
+            }
+
+            $table->timestamps();
+
+            $table->unique(['period', 'period_start', 'line', 'mechine', 'position'], 'ins_dwp_rollups_bucket_unique');
+            $table->index(['period', 'line', 'period_start']);
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::dropIfExists('ins_dwp_rollups');
+    }
+};
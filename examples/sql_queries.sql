@@ -1,7 +1,11 @@
 -- DWP Data Analysis SQL Queries
--- Using the boolean array format for std_error: [[th_quality],[side_quality]]
--- where array[0][0] = toe/heel quality (1=good, 0=bad)
--- where array[1][0] = side quality (1=good, 0=bad)
+-- std_error keeps the boolean array format [[th_quality],[side_quality]]; the
+-- poller also writes it to typed, indexed columns (1=good, 0=bad):
+--   th_ok   = std_error[0][0] (toe/heel quality)
+--   side_ok = std_error[1][0] (side quality)
+-- together with grade, cycle_type, peak_th/peak_side and the waveform features
+-- (time to peak, dwell, area under curve, rise/fall slopes, flags), so these
+-- queries don't parse JSON per row.
 
 -- =============================================
 -- Basic Quality Queries
@@ -9,23 +13,23 @@
 
 -- Get all cycles where both sensors are good
 SELECT * FROM ins_dwp_counts
-WHERE JSON_EXTRACT(std_error, '$[0][0]') = 1
-  AND JSON_EXTRACT(std_error, '$[1][0]') = 1;
+WHERE th_ok = 1
+  AND side_ok = 1;
 
 -- Get cycles where both sensors are bad
 SELECT * FROM ins_dwp_counts
-WHERE JSON_EXTRACT(std_error, '$[0][0]') = 0
-  AND JSON_EXTRACT(std_error, '$[1][0]') = 0;
+WHERE th_ok = 0
+  AND side_ok = 0;
 
 -- Get cycles where only toe/heel is good
 SELECT * FROM ins_dwp_counts
-WHERE JSON_EXTRACT(std_error, '$[0][0]') = 1
-  AND JSON_EXTRACT(std_error, '$[1][0]') = 0;
+WHERE th_ok = 1
+  AND side_ok = 0;
 
 -- Get cycles where only side is good
 SELECT * FROM ins_dwp_counts
-WHERE JSON_EXTRACT(std_error, '$[0][0]') = 0
-  AND JSON_EXTRACT(std_error, '$[1][0]') = 1;
+WHERE th_ok = 0
+  AND side_ok = 1;
 
 -- =============================================
 -- Quality Statistics by Line
@@ -35,12 +39,12 @@ WHERE JSON_EXTRACT(std_error, '$[0][0]') = 0
 SELECT
     line,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]')) as th_good_count,
-    SUM(JSON_EXTRACT(std_error, '$[1][0]')) as side_good_count,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) as both_good_count,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]')) / COUNT(*) * 100, 2) as th_success_rate,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as side_success_rate,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as overall_quality_rate
+    SUM(th_ok) as th_good_count,
+    SUM(side_ok) as side_good_count,
+    SUM(th_ok * side_ok) as both_good_count,
+    ROUND(SUM(th_ok) / COUNT(*) * 100, 2) as th_success_rate,
+    ROUND(SUM(side_ok) / COUNT(*) * 100, 2) as side_success_rate,
+    ROUND(SUM(th_ok * side_ok) / COUNT(*) * 100, 2) as overall_quality_rate
 FROM ins_dwp_counts
 GROUP BY line
 ORDER BY overall_quality_rate DESC;
@@ -55,8 +59,8 @@ SELECT
     mechine,
     position,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) as good_cycles,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as quality_rate
+    SUM(th_ok * side_ok) as good_cycles,
+    ROUND(SUM(th_ok * side_ok) / COUNT(*) * 100, 2) as quality_rate
 FROM ins_dwp_counts
 GROUP BY line, mechine, position
 ORDER BY line, mechine, position;
@@ -66,8 +70,8 @@ SELECT
     line,
     mechine,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) as good_cycles,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as quality_rate
+    SUM(th_ok * side_ok) as good_cycles,
+    ROUND(SUM(th_ok * side_ok) / COUNT(*) * 100, 2) as quality_rate
 FROM ins_dwp_counts
 GROUP BY line, mechine
 HAVING quality_rate < 80
@@ -81,8 +85,8 @@ ORDER BY quality_rate ASC;
 SELECT
     HOUR(created_at) as hour_of_day,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) as good_cycles,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as quality_rate
+    SUM(th_ok * side_ok) as good_cycles,
+    ROUND(SUM(th_ok * side_ok) / COUNT(*) * 100, 2) as quality_rate
 FROM ins_dwp_counts
 WHERE created_at >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
 GROUP BY HOUR(created_at)
@@ -92,10 +96,10 @@ ORDER BY hour_of_day;
 SELECT
     DATE(created_at) as production_date,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]')) as th_good,
-    SUM(JSON_EXTRACT(std_error, '$[1][0]')) as side_good,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) as both_good,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as quality_rate
+    SUM(th_ok) as th_good,
+    SUM(side_ok) as side_good,
+    SUM(th_ok * side_ok) as both_good,
+    ROUND(SUM(th_ok * side_ok) / COUNT(*) * 100, 2) as quality_rate
 FROM ins_dwp_counts
 WHERE created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
 GROUP BY DATE(created_at)
@@ -108,22 +112,22 @@ ORDER BY production_date DESC;
 -- Find cycles with toe/heel sensor issues
 SELECT
     id, line, mechine, position, created_at,
-    JSON_EXTRACT(pv, '$.quality.peaks.th') as th_peak,
-    JSON_EXTRACT(pv, '$.quality.peaks.side') as side_peak,
-    JSON_EXTRACT(pv, '$.quality.grade') as quality_grade
+    peak_th as th_peak,
+    peak_side as side_peak,
+    grade as quality_grade
 FROM ins_dwp_counts
-WHERE JSON_EXTRACT(std_error, '$[0][0]') = 0
+WHERE th_ok = 0
 ORDER BY created_at DESC
 LIMIT 20;
 
 -- Find cycles with side sensor issues
 SELECT
     id, line, mechine, position, created_at,
-    JSON_EXTRACT(pv, '$.quality.peaks.th') as th_peak,
-    JSON_EXTRACT(pv, '$.quality.peaks.side') as side_peak,
-    JSON_EXTRACT(pv, '$.quality.grade') as quality_grade
+    peak_th as th_peak,
+    peak_side as side_peak,
+    grade as quality_grade
 FROM ins_dwp_counts
-WHERE JSON_EXTRACT(std_error, '$[1][0]') = 0
+WHERE side_ok = 0
 ORDER BY created_at DESC
 LIMIT 20;
 
@@ -131,15 +135,15 @@ LIMIT 20;
 SELECT
     'Toe/Heel Sensor' as sensor_type,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]')) as good_readings,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]')) / COUNT(*) * 100, 2) as success_rate
+    SUM(th_ok) as good_readings,
+    ROUND(SUM(th_ok) / COUNT(*) * 100, 2) as success_rate
 FROM ins_dwp_counts
 UNION ALL
 SELECT
     'Side Sensor' as sensor_type,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[1][0]')) as good_readings,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as success_rate
+    SUM(side_ok) as good_readings,
+    ROUND(SUM(side_ok) / COUNT(*) * 100, 2) as success_rate
 FROM ins_dwp_counts;
 
 -- =============================================
@@ -149,9 +153,9 @@ FROM ins_dwp_counts;
 -- Quality pattern distribution
 SELECT
     CASE
-        WHEN JSON_EXTRACT(std_error, '$[0][0]') = 1 AND JSON_EXTRACT(std_error, '$[1][0]') = 1 THEN 'Both Good'
-        WHEN JSON_EXTRACT(std_error, '$[0][0]') = 1 AND JSON_EXTRACT(std_error, '$[1][0]') = 0 THEN 'TH Good, Side Bad'
-        WHEN JSON_EXTRACT(std_error, '$[0][0]') = 0 AND JSON_EXTRACT(std_error, '$[1][0]') = 1 THEN 'TH Bad, Side Good'
+        WHEN th_ok = 1 AND side_ok = 1 THEN 'Both Good'
+        WHEN th_ok = 1 AND side_ok = 0 THEN 'TH Good, Side Bad'
+        WHEN th_ok = 0 AND side_ok = 1 THEN 'TH Bad, Side Good'
         ELSE 'Both Bad'
     END as quality_pattern,
     COUNT(*) as cycle_count,
@@ -162,11 +166,11 @@ ORDER BY cycle_count DESC;
 
 -- Quality grades from PV field
 SELECT
-    JSON_EXTRACT(pv, '$.quality.grade') as quality_grade,
+    grade as quality_grade,
     COUNT(*) as count,
     ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM ins_dwp_counts), 2) as percentage
 FROM ins_dwp_counts
-GROUP BY JSON_EXTRACT(pv, '$.quality.grade')
+GROUP BY grade
 ORDER BY count DESC;
 
 -- =============================================
@@ -177,7 +181,7 @@ ORDER BY count DESC;
 WITH quality_sequences AS (
     SELECT
         id, line, mechine, position, created_at,
-        JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]') as is_good_quality,
+        th_ok * side_ok as is_good_quality,
         ROW_NUMBER() OVER (PARTITION BY line, mechine, position ORDER BY created_at) as rn
     FROM ins_dwp_counts
     ORDER BY line, mechine, position, created_at
@@ -202,19 +206,36 @@ ORDER BY consecutive_count DESC, start_time DESC;
 
 -- Peak value analysis with quality correlation
 SELECT
-    JSON_EXTRACT(pv, '$.quality.grade') as grade,
-    AVG(CAST(JSON_EXTRACT(pv, '$.quality.peaks.th') AS SIGNED)) as avg_th_peak,
-    AVG(CAST(JSON_EXTRACT(pv, '$.quality.peaks.side') AS SIGNED)) as avg_side_peak,
-    MIN(CAST(JSON_EXTRACT(pv, '$.quality.peaks.th') AS SIGNED)) as min_th_peak,
-    MAX(CAST(JSON_EXTRACT(pv, '$.quality.peaks.th') AS SIGNED)) as max_th_peak,
-    MIN(CAST(JSON_EXTRACT(pv, '$.quality.peaks.side') AS SIGNED)) as min_side_peak,
-    MAX(CAST(JSON_EXTRACT(pv, '$.quality.peaks.side') AS SIGNED)) as max_side_peak,
+    grade as grade,
+    AVG(peak_th) as avg_th_peak,
+    AVG(peak_side) as avg_side_peak,
+    MIN(peak_th) as min_th_peak,
+    MAX(peak_th) as max_th_peak,
+    MIN(peak_side) as min_side_peak,
+    MAX(peak_side) as max_side_peak,
     COUNT(*) as sample_count
 FROM ins_dwp_counts
-WHERE JSON_EXTRACT(pv, '$.quality.peaks.th') IS NOT NULL
-GROUP BY JSON_EXTRACT(pv, '$.quality.grade')
+WHERE peak_th IS NOT NULL
+GROUP BY grade
 ORDER BY avg_th_peak DESC;
 
+-- Hourly waveform feature trends per line for the last 24 hours
+SELECT
+    line,
+    DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00') as hour,
+    COUNT(*) as cycles,
+    ROUND(AVG(time_to_peak_th_ms)) as avg_th_time_to_peak_ms,
+    ROUND(AVG(dwell_th_ms)) as avg_th_dwell_ms,
+    ROUND(AVG(dwell_side_ms)) as avg_side_dwell_ms,
+    ROUND(AVG(auc_th), 2) as avg_th_auc,
+    ROUND(AVG(auc_side), 2) as avg_side_auc,
+    ROUND(AVG(rise_th), 1) as avg_th_rise_per_s,
+    SUM(flags & 3 != 0) as sensor_suspect_cycles
+FROM ins_dwp_counts
+WHERE created_at >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
+GROUP BY line, hour
+ORDER BY line, hour;
+
 -- =============================================
 -- Real-time Monitoring Queries
 -- =============================================
@@ -225,11 +246,11 @@ SELECT
     mechine,
     position,
     created_at,
-    JSON_EXTRACT(std_error, '$[0][0]') as th_quality,
-    JSON_EXTRACT(std_error, '$[1][0]') as side_quality,
-    JSON_EXTRACT(pv, '$.quality.grade') as grade,
-    JSON_EXTRACT(pv, '$.quality.peaks.th') as th_peak,
-    JSON_EXTRACT(pv, '$.quality.peaks.side') as side_peak
+    th_ok as th_quality,
+    side_ok as side_quality,
+    grade as grade,
+    peak_th as th_peak,
+    peak_side as side_peak
 FROM (
     SELECT *,
            ROW_NUMBER() OVER (PARTITION BY line ORDER BY created_at DESC) as rn
@@ -246,12 +267,12 @@ SELECT
     position,
     created_at,
     'QUALITY_ISSUE' as alert_type,
-    CONCAT('TH:', JSON_EXTRACT(pv, '$.quality.peaks.th'),
-           ' Side:', JSON_EXTRACT(pv, '$.quality.peaks.side'),
-           ' Grade:', JSON_EXTRACT(pv, '$.quality.grade')) as details
+    CONCAT('TH:', peak_th,
+           ' Side:', peak_side,
+           ' Grade:', grade) as details
 FROM ins_dwp_counts
 WHERE created_at >= DATE_SUB(NOW(), INTERVAL 30 MINUTE)
-  AND (JSON_EXTRACT(std_error, '$[0][0]') = 0 OR JSON_EXTRACT(std_error, '$[1][0]') = 0)
+  AND (th_ok = 0 OR side_ok = 0)
 ORDER BY created_at DESC;
 
 -- =============================================
@@ -262,10 +283,48 @@ ORDER BY created_at DESC;
 SELECT
     'Overall Performance' as metric_category,
     COUNT(*) as total_cycles,
-    SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) as good_cycles,
-    ROUND(SUM(JSON_EXTRACT(std_error, '$[0][0]') * JSON_EXTRACT(std_error, '$[1][0]')) / COUNT(*) * 100, 2) as quality_rate,
+    SUM(th_ok * side_ok) as good_cycles,
+    ROUND(SUM(th_ok * side_ok) / COUNT(*) * 100, 2) as quality_rate,
     ROUND(AVG(duration), 2) as avg_cycle_time,
     COUNT(DISTINCT line) as active_lines,
     COUNT(DISTINCT CONCAT(line, '-', mechine)) as active_machines
 FROM ins_dwp_counts
 WHERE created_at >= DATE_SUB(NOW(), INTERVAL 24 HOUR);
+
+-- =============================================
+-- Rollups (ins_dwp_rollups)
+-- =============================================
+
+-- Per-shift quality and peak statistics per machine, without scanning ins_dwp_counts
+SELECT
+    period_start,
+    shift,
+    line,
+    mechine,
+    position,
+    cycles,
+    ROUND(good_cycles / cycles * 100, 2) as quality_rate,
+    ROUND(peak_th_sum / cycles, 1) as avg_peak_th,
+    ROUND(SQRT(GREATEST(peak_th_sumsq / cycles - POW(peak_th_sum / cycles, 2), 0)), 2) as stddev_peak_th,
+    peak_th_min,
+    peak_th_max,
+    ROUND(duration_sum / cycles, 1) as avg_duration
+FROM ins_dwp_rollups
+WHERE period = 'shift'
+  AND line = 'LINEA'
+  AND period_start >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+ORDER BY period_start, mechine, position;
+
+-- Cycles per minute per line over the last hour (throughput chart)
+SELECT
+    period_start,
+    line,
+    SUM(cycles) as cycles,
+    SUM(good_cycles) as good_cycles,
+    SUM(grade_defective + grade_sensor_low + grade_pressure_high) as rejected
+FROM ins_dwp_rollups
+WHERE period = 'minute'
+  AND line = 'LINEA'
+  AND period_start >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
+GROUP BY period_start, line
+ORDER BY period_start;
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Fill the waveform feature columns of ins_dwp_counts rows written before they existed.
+
+The migration that adds the columns fills grade, cycle_type, th_ok/side_ok
+and the peaks from the stored JSON. The rest of the feature vector (time to
+peak, dwell, area under curve, rise/fall slopes, flags) needs pv decoded,
+which this script does in id order, one batch per transaction:
+
+    python backfill_features.py
+    python backfill_features.py --batch 2000 --limit 100000
+
+Rows whose `flags` is still NULL are the ones without features, so the
+script can be stopped and re-run at any time.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from dwp_poll import DB_CONFIG, FEATURE_DWELL_LEVEL, DatabaseManager
+from pv_codec import decode_pv
+from waveform_analysis import FEATURE_COLUMNS, cycle_features
+
+logger = logging.getLogger("DWP")
+
+UPDATE_SQL = (
+    f"UPDATE `ins_dwp_counts` SET {', '.join(f'`{column}` = %s' for column in FEATURE_COLUMNS)} WHERE `id` = %s"
+)
+
+
+def row_features(pv_json) -> tuple:
+    """Feature column values for one stored pv, or () if it holds no usable waveform"""
+    pv = decode_pv(json.loads(pv_json) if isinstance(pv_json, (str, bytes)) else pv_json)
+    waveforms = pv.get("waveforms") or []
+    if len(waveforms) != 2 or not waveforms[0] or len(waveforms[0]) != len(waveforms[1]):
+        return ()
+    features = cycle_features(waveforms[0], waveforms[1], pv.get("timestamps"), FEATURE_DWELL_LEVEL)
+    return tuple(getattr(features, column) for column in FEATURE_COLUMNS)
+
+
+async def backfill(db: DatabaseManager, batch_size: int, limit: int) -> int:
+    updated = skipped = 0
+    last_id = 0
+    started = time.perf_counter()
+    while not limit or updated + skipped < limit:
+        size = min(batch_size, limit - updated - skipped) if limit else batch_size
+        async with db.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT `id`, `pv` FROM `ins_dwp_counts` WHERE `id` > %s AND `flags` IS NULL ORDER BY `id` LIMIT %s",
+                    (last_id, size),
+                )
+                rows = await cur.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                values = []
+                for row_id, pv_json in rows:
+                    try:
+                        features = row_features(pv_json)
+                    except (ValueError, TypeError, KeyError) as e:
+                        logger.warning(f"⚠️ Row {row_id}: undecodable pv ({e})")
+                        features = ()
+                    if features:
+                        values.append((*features, row_id))
+                    else:
+                        skipped += 1
+
+                if values:
+                    await conn.begin()
+                    await cur.executemany(UPDATE_SQL, values)
+                    await conn.commit()
+                    updated += len(values)
+        logger.info(
+            f"🧮 Backfilled {updated} row(s) up to id {last_id} ({skipped} without waveform) — "
+            f"{updated / max(time.perf_counter() - started, 1e-9):.0f} rows/s"
+        )
+    return updated
+
+
+async def main(batch_size: int, limit: int):
+    db = DatabaseManager(DB_CONFIG)
+    await db.connect()
+    try:
+        updated = await backfill(db, batch_size, limit)
+        logger.info(f"✅ Feature backfill done: {updated} row(s) updated")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill ins_dwp_counts waveform feature columns")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per SELECT/UPDATE transaction")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many rows (0 = all)")
+    args = parser.parse_args()
+    asyncio.run(main(max(1, args.batch), max(0, args.limit)))
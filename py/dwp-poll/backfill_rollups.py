@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Rebuild ins_dwp_rollups from the cycles in ins_dwp_counts.
+
+The poller keeps the rollups current as it saves cycles; this script
+recomputes them for history (or after SHIFT_START_HOURS changes). The range
+is widened to whole shifts, and each shift is rebuilt in one transaction:
+its rollups are deleted and its cycles re-aggregated. An interrupted run
+leaves every shift either rebuilt or untouched, and logs where to resume:
+
+    python backfill_rollups.py --since 2026-10-01
+    python backfill_rollups.py --since "2026-10-01 06:00" --until "2026-10-08 06:00" --batch 10000
+
+--until defaults to the start of the current shift, so it does not race the
+poller, which only adds to the rollups of cycles it writes itself. Run it on
+ranges that have rows in ins_dwp_counts with feature columns (migration
+2026_10_18_100000); rows without them count as cycles but add no peaks.
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime
+from typing import List
+
+from dwp_poll import DB_CONFIG, SHIFT_START_HOURS, DatabaseManager
+from rollup import RollupAggregator, shift_of, upsert_rollups
+
+logger = logging.getLogger("DWP")
+
+SOURCE_COLUMNS = ("line", "mechine", "position", "created_at", "grade", "th_ok", "side_ok",
+                  "peak_th", "peak_side", "duration")
+# Keyset on (created_at, id) over the created_at index: spool replays insert
+# old cycles with new ids, so id order is not time order
+SELECT_SQL = (
+    "SELECT `line`, `mechine`, `position`, UNIX_TIMESTAMP(`created_at`), `grade`, `th_ok`, `side_ok`, "
+    "`peak_th`, `peak_side`, `duration`, `created_at`, `id` FROM `ins_dwp_counts` "
+    "WHERE `created_at` >= FROM_UNIXTIME(%s) AND `created_at` < FROM_UNIXTIME(%s) "
+    "AND (`created_at` > %s OR (`created_at` = %s AND `id` > %s)) "
+    "ORDER BY `created_at`, `id` LIMIT %s"
+)
+
+
+def shift_starts(since: int, until: int) -> List[int]:
+    """Shift start epochs in [since, until]; since and until are shift starts"""
+    starts = [since]
+    hour = since
+    while starts[-1] < until:
+        # Shifts start on whole hours
+        hour += 3600
+        start = shift_of(hour, SHIFT_START_HOURS)[1]
+        if start != starts[-1]:
+            starts.append(start)
+    return starts
+
+
+async def rebuild_shift(conn, cur, start: int, end: int, batch_size: int) -> int:
+    """Replace the rollups of one shift, in one transaction"""
+    aggregator = RollupAggregator(SHIFT_START_HOURS)
+    cycles = 0
+    await conn.begin()
+    try:
+        await cur.execute(
+            "DELETE FROM `ins_dwp_rollups` WHERE `period_start` >= FROM_UNIXTIME(%s) "
+            "AND `period_start` < FROM_UNIXTIME(%s)",
+            (start, end),
+        )
+        last_created, last_id = datetime.fromtimestamp(start), 0
+        while True:
+            await cur.execute(SELECT_SQL, (start, end, last_created, last_created, last_id, batch_size))
+            rows = await cur.fetchall()
+            if not rows:
+                break
+            last_created, last_id = rows[-1][-2:]
+            for row in rows:
+                aggregator.add(dict(zip(SOURCE_COLUMNS, row)))
+            await upsert_rollups(cur, aggregator)
+            aggregator.clear()
+            cycles += len(rows)
+        await conn.commit()
+    except BaseException:
+        with contextlib.suppress(Exception):
+            await conn.rollback()
+        raise
+    return cycles
+
+
+async def backfill(db: DatabaseManager, since: int, until: int, batch_size: int) -> int:
+    starts = shift_starts(since, until)
+    total = 0
+    started = time.perf_counter()
+    async with db.pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for start, end in zip(starts, starts[1:]):
+                try:
+                    cycles = await rebuild_shift(conn, cur, start, end, batch_size)
+                except BaseException:
+                    logger.error(
+                        f"❌ Rollup rebuild stopped in the shift starting {datetime.fromtimestamp(start)} "
+                        f"(rolled back; earlier shifts are done). Resume with --since "
+                        f"\"{datetime.fromtimestamp(start)}\" --until \"{datetime.fromtimestamp(until)}\""
+                    )
+                    raise
+                total += cycles
+                logger.info(
+                    f"📊 Shift {shift_of(start, SHIFT_START_HOURS)[0]} of {datetime.fromtimestamp(start)}: "
+                    f"{cycles} cycle(s) — {total / max(time.perf_counter() - started, 1e-9):.0f} rows/s"
+                )
+    return total
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+async def main(since: datetime, until: datetime, batch_size: int):
+    # Whole shifts only: a partial shift rollup would be overwritten with a partial count
+    since_epoch = shift_of(since.timestamp(), SHIFT_START_HOURS)[1]
+    until_epoch = shift_of(until.timestamp(), SHIFT_START_HOURS)[1]
+    if until_epoch <= since_epoch:
+        logger.error(f"❌ Nothing to rebuild: {since} - {until} is within one shift")
+        return
+    logger.info(
+        f"📊 Rebuilding rollups {datetime.fromtimestamp(since_epoch)} - {datetime.fromtimestamp(until_epoch)}"
+    )
+
+    db = DatabaseManager(DB_CONFIG)
+    await db.connect()
+    try:
+        cycles = await backfill(db, since_epoch, until_epoch, batch_size)
+        logger.info(f"✅ Rollup backfill done: {cycles} cycle(s)")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild ins_dwp_rollups from ins_dwp_counts")
+    parser.add_argument("--since", type=parse_time, required=True, help="Local time, widened to its shift start")
+    parser.add_argument("--until", type=parse_time, default=datetime.now(),
+                        help="Local time, rounded down to its shift start (default: now)")
+    parser.add_argument("--batch", type=int, default=5000, help="Cycles per SELECT/upsert")
+    args = parser.parse_args()
+    asyncio.run(main(args.since, args.until, max(1, args.batch)))
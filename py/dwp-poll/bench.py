@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the DWP poller hot paths.
+
+    python bench.py waveform [--samples 500] [--buffers 2000]
+    python bench.py segment [--samples 1000] [--buffers 2000]
+    python bench.py streaming [--streams 300]
+    python bench.py pv [--samples 200] [--cycles 2000]
+    python bench.py poller [--devices 4] [--machines 4] [--seconds 60] [--json out.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from connection import CircuitBreaker, DeviceConnection
+from cycle_writer import CycleWriter
+import dwp_poll
+from dwp_poll import GOOD_MAX, GOOD_MIN, DeviceConfig, DWPPoller, MachineConfig, logger
+from replay import MachineRecording, replay
+from pv_codec import PV_VERSION_JSON, PV_VERSION_PACKED, decode_pv, encode_pv
+from segmentation import combine_channels, segment_peaks
+from waveform_analysis import analyze_waveform, check_sanity, sensor_flags
+
+
+# ----------------------------
+# REFERENCE IMPLEMENTATIONS
+# ----------------------------
+# Pure-Python rules as they were before waveform_analysis; used to check that
+# the vectorized engine gives identical verdicts, and as the speed baseline.
+def legacy_validate(th, side, sample_count, duration_ms, timestamps_ms) -> Tuple[bool, str]:
+    max_th, max_side, min_th, min_side = max(th), max(side), min(th), min(side)
+    if max_th >= 30 and max_side <= 3:
+        nonzero_side = sum(1 for v in side if v > 5)
+        zero_side_ratio = (len(side) - nonzero_side) / len(side)
+        if zero_side_ratio > 0.8:
+            return False, f"Side sensor likely disconnected: TH={max_th}, Side max={max_side}, {zero_side_ratio:.0%} zeros"
+    for i in range(1, len(th)):
+        dth = abs(th[i] - th[i - 1])
+        dside = abs(side[i] - side[i - 1])
+        if (dth > 30 or dside > 30) and (dth > 40 or dside > 40):
+            return False, f"Impossible pressure jump: ΔTH={dth}, ΔSide={dside} at sample {i}"
+    if max_th - min_th <= 1 and max_side - min_side <= 1 and sample_count > 3:
+        if max_th == 0 and max_side == 0:
+            return False, "Zero flatline — no cycle detected"
+        return False, "Flatline waveform — no pressure change"
+    median_interval_ms = 100
+    if timestamps_ms and len(timestamps_ms) > 1:
+        diffs = [timestamps_ms[i] - timestamps_ms[i - 1] for i in range(1, len(timestamps_ms))]
+        diffs = [d for d in diffs if d > 0]
+        if diffs:
+            median_interval_ms = max(1, int(statistics.median(diffs)))
+    expected_samples = max(1, round(duration_ms / median_interval_ms))
+    if sample_count < 1 or expected_samples == 0:
+        return False, "Invalid duration or sample count"
+    if sample_count < expected_samples * 0.15:
+        return False, f"Too few samples: {sample_count} for {duration_ms}ms (expected ~{expected_samples}, median_interval={median_interval_ms}ms)"
+    if min_th < 0 or min_side < 0:
+        return False, "Negative pressure reading"
+    return True, "OK"
+
+
+def legacy_std_error(th, side, max_th, max_side) -> List[List[int]]:
+    th_flag = 1 if (GOOD_MIN <= max_th <= GOOD_MAX) else 0
+    side_flag = 1 if (GOOD_MIN <= max_side <= GOOD_MAX) else 0
+    if max_th >= 30 and max_side <= 3 and sum(1 for v in side if v > 5) <= 1:
+        side_flag = 0
+    if max_side >= 30 and max_th <= 3 and sum(1 for v in th if v > 5) <= 1:
+        th_flag = 0
+    if len(set(th)) == 1 and len(th) > 2:
+        th_flag = 0
+    if len(set(side)) == 1 and len(side) > 2:
+        side_flag = 0
+    return [[th_flag], [side_flag]]
+
+
+def vectorized_check(th, side, sample_count, duration_ms, timestamps_ms):
+    features = analyze_waveform(th, side, timestamps_ms)
+    th_flag = 1 if (GOOD_MIN <= features.max_th <= GOOD_MAX) else 0
+    side_flag = 1 if (GOOD_MIN <= features.max_side <= GOOD_MAX) else 0
+    return (
+        check_sanity(features, sample_count, duration_ms),
+        sensor_flags(features, th_flag, side_flag),
+    )
+
+
+def legacy_check(th, side, sample_count, duration_ms, timestamps_ms):
+    return (
+        legacy_validate(th, side, sample_count, duration_ms, timestamps_ms),
+        legacy_std_error(th, side, max(th), max(side)),
+    )
+
+
+# The poller's split loops as they were before segmentation.segment_peaks:
+# a rescan for the zero gap between every pair of peaks and an outward walk
+# per peak. Returns (peak, start, end, merged); start/end are None if merged.
+def legacy_split(combined, peaks, end_threshold, min_zero_gap) -> List[Tuple[int, object, object, bool]]:
+    def has_min_zero_gap(start_idx: int, end_idx: int, min_gap: int) -> bool:
+        if end_idx < start_idx:
+            return False
+        run = 0
+        for k in range(start_idx, end_idx + 1):
+            if combined[k] <= end_threshold:
+                run += 1
+                if run >= min_gap:
+                    return True
+            else:
+                run = 0
+        return False
+
+    segments = []
+    prev_peak = None
+    for peak_idx in peaks:
+        if prev_peak is not None and not has_min_zero_gap(prev_peak + 1, peak_idx - 1, min_zero_gap):
+            segments.append((peak_idx, None, None, True))
+            prev_peak = peak_idx
+            continue
+        prev_peak = peak_idx
+
+        start_idx = peak_idx
+        while start_idx > 0 and combined[start_idx - 1] > end_threshold:
+            start_idx -= 1
+        end_idx = peak_idx
+        while end_idx < len(combined) - 1 and combined[end_idx + 1] > end_threshold:
+            end_idx += 1
+        segments.append((peak_idx, start_idx, end_idx, False))
+    return segments
+
+
+def engine_split(combined, peaks, end_threshold, min_zero_gap) -> List[Tuple[int, object, object, bool]]:
+    return [
+        (s.peak, None, None, True) if s.merged else (s.peak, s.start, s.end, False)
+        for s in segment_peaks(combined, peaks, end_threshold, min_zero_gap)
+    ]
+
+
+# ----------------------------
+# SYNTHETIC WAVEFORMS
+# ----------------------------
+def press_waveform(rng: random.Random, n: int) -> Tuple[List[int], List[int], List[int]]:
+    """Ramp → peak → release stroke with noise, plus the occasional fault"""
+    peak_th, peak_side = rng.randint(0, 80), rng.randint(0, 80)
+    th, side = [], []
+    for i in range(n):
+        shape = 4 * (i / n) * (1 - i / n)
+        th.append(max(0, int(peak_th * shape + rng.gauss(0, 1))))
+        side.append(max(0, int(peak_side * shape + rng.gauss(0, 1))))
+    fault = rng.random()
+    if fault < 0.1:
+        side = [0] * n  # disconnected side sensor
+    elif fault < 0.2:
+        th = [th[0]] * n  # flatline
+    elif fault < 0.3:
+        th[rng.randrange(n)] += rng.randint(31, 60)  # spike
+    t0 = 1_700_000_000_000
+    timestamps = [t0 + i * 100 + rng.choice((0, 0, 3, -3, 40)) for i in range(n)]
+    return th, side, timestamps
+
+
+def stroke_train(rng: random.Random, n: int) -> Tuple[List[int], List[int]]:
+    """Strokes separated by dips of 0-6 low samples, starting and ending high or low"""
+    th, side = [], []
+    while len(th) < n:
+        if rng.random() < 0.5:
+            low = rng.choice((0, 1, 2, 3, 4, 5, 6, 20))
+            th += [rng.randint(0, 2) for _ in range(low)]
+            side += [rng.randint(0, 2) for _ in range(low)]
+        width = rng.choice((1, 2, 5, 20, 60))
+        peak_th, peak_side = rng.randint(0, 60), rng.randint(0, 60)
+        for i in range(width):
+            shape = 4 * ((i + 0.5) / width) * (1 - (i + 0.5) / width)
+            th.append(max(0, int(peak_th * shape + rng.gauss(0, 1))))
+            side.append(max(0, int(peak_side * shape + rng.gauss(0, 1))))
+    return th[:n], side[:n]
+
+
+def stroke_recording(rng: random.Random, strokes: int) -> MachineRecording:
+    """One machine's samples: strokes with 0-30 sample gaps, short dips between
+    plateaus (where streaming once lost cycles), faults and jittered timestamps"""
+    positions = []
+    for _ in range(2):
+        samples = [(0, 0)] * 5
+        for _ in range(strokes):
+            if rng.random() < 0.3:
+                width = rng.randint(10, 70)
+                level = [min(40, 8 * i, 8 * (width - 1 - i)) for i in range(width)]
+                samples += [(v, v) for v in level]
+                samples += [(0, 0)] * rng.choice((3, 3, 4, 6))
+                continue
+            width = rng.randint(20, 220)
+            peak_th, peak_side = rng.randint(30, 90), rng.randint(30, 90)
+            fault = rng.random()
+            for i in range(width):
+                shape = 4 * (i / width) * (1 - i / width)
+                th = max(3, int(peak_th * shape + rng.gauss(0, 1.5)))
+                side = max(3, int(peak_side * shape + rng.gauss(0, 1.5)))
+                if fault < 0.05:
+                    side = 0
+                elif fault > 0.95:
+                    th = 20
+                if rng.random() < 0.01:
+                    th += rng.randint(30, 60)
+                samples.append((th, side))
+            samples += [(rng.randint(0, 2), rng.randint(0, 2))] * rng.choice((0, 1, 2, 6, 10, 30))
+        positions.append(samples + [(0, 0)] * 20)
+
+    n = max(len(samples) for samples in positions)
+    for samples in positions:
+        samples += [(0, 0)] * (n - len(samples))
+    steps = [100 + rng.choice((0, 0, 0, 10, -10, 50, 300)) for _ in range(n)]
+    t_ms = 1_700_000_000_000 + np.cumsum(steps)
+    (th_l, side_l), (th_r, side_r) = (np.array(samples, dtype=np.int64).T for samples in positions)
+    return MachineRecording("G5", "mc1", t_ms, th_l, th_r, side_l, side_r)
+
+
+class CycleCapture:
+    """Replay sink that keeps every cycle, minus its random ID"""
+
+    def __init__(self):
+        self.cycles = []
+
+    async def save_cycle(self, cycle_data: dict) -> bool:
+        self.cycles.append({k: v for k, v in cycle_data.items() if k != "cycle_uid"})
+        return True
+
+
+def time_per_call(fn: Callable, cases) -> float:
+    start = time.perf_counter()
+    for case in cases:
+        fn(*case)
+    return (time.perf_counter() - start) / len(cases)
+
+
+def bench_waveform(args):
+    rng = random.Random(args.seed)
+    cases = []
+    for _ in range(args.buffers):
+        th, side, timestamps = press_waveform(rng, args.samples)
+        duration_ms = timestamps[-1] - timestamps[0]
+        cases.append((th, side, len(th), duration_ms, timestamps))
+
+    # The poller hands CycleState buffers (uint16/int64 arrays) to the engine
+    array_cases = [
+        (np.array(th, dtype=np.uint16), np.array(side, dtype=np.uint16), n, duration_ms, np.array(ts, dtype=np.int64))
+        for th, side, n, duration_ms, ts in cases
+    ]
+
+    mismatches = sum(
+        1
+        for case, array_case in zip(cases, array_cases)
+        if not (legacy_check(*case) == vectorized_check(*case) == vectorized_check(*array_case))
+    )
+    legacy = time_per_call(legacy_check, cases)
+    from_lists = time_per_call(vectorized_check, cases)
+    from_arrays = time_per_call(vectorized_check, array_cases)
+    print(f"waveform sanity + std_error, {args.buffers} buffers × {args.samples} samples")
+    print(f"  legacy (pure Python)   : {legacy * 1e6:8.1f} µs/buffer")
+    print(f"  vectorized, list input : {from_lists * 1e6:8.1f} µs/buffer ({legacy / from_lists:.1f}x)")
+    print(f"  vectorized, array input: {from_arrays * 1e6:8.1f} µs/buffer ({legacy / from_arrays:.1f}x)")
+    print(f"  verdict mismatches     : {mismatches}")
+    return 1 if mismatches else 0
+
+
+def bench_pv(args):
+    rng = random.Random(args.seed)
+    quality = {"grade": "GOOD", "peaks": {"th": 0, "side": 0}, "cycle_type": "COMPLETE", "sample_count": args.samples}
+    cycles = [press_waveform(rng, args.samples) for _ in range(args.cycles)]
+
+    print(f"pv column encoding, {args.cycles} cycles × {args.samples} samples (with timestamps)")
+    results = {}
+    for version in (PV_VERSION_JSON, PV_VERSION_PACKED):
+        def encode(th, side, ts):
+            return json.dumps(encode_pv(th, side, ts, quality, version), separators=(",", ":"))
+
+        rows = [encode(*cycle) for cycle in cycles]
+        encode_s = time_per_call(encode, cycles)
+        decode_s = time_per_call(lambda row: decode_pv(json.loads(row)), [(row,) for row in rows])
+        mismatches = sum(
+            1
+            for (th, side, ts), row in zip(cycles, rows)
+            if (lambda pv: pv["waveforms"] != [th, side] or pv["timestamps"] != ts)(decode_pv(json.loads(row)))
+        )
+        size = statistics.mean(len(row) for row in rows)
+        results[version] = (size, encode_s, decode_s, mismatches)
+
+    base_size, base_encode, base_decode, _ = results[PV_VERSION_JSON]
+    for version, (size, encode_s, decode_s, mismatches) in results.items():
+        print(
+            f"  v{version}: {size:8.0f} bytes/row ({base_size / size:.1f}x smaller) | "
+            f"encode {encode_s * 1e6:6.1f} µs ({base_encode / encode_s:.1f}x) | "
+            f"decode {decode_s * 1e6:6.1f} µs ({base_decode / decode_s:.1f}x) | "
+            f"round-trip mismatches {mismatches}"
+        )
+    return 1 if any(r[3] for r in results.values()) else 0
+
+
+def bench_segment(args):
+    from scipy.signal import find_peaks
+
+    rng = random.Random(args.seed)
+    cases = []
+    for _ in range(args.buffers):
+        combined = combine_channels(*stroke_train(rng, args.samples))
+        peaks = set(
+            int(p) for p in find_peaks(combined, height=rng.choice((3, 5, 10)), distance=rng.choice((1, 5, 20)))[0]
+        )
+        # Peaks the engine must also handle: low samples and the buffer edges
+        peaks.update(rng.randrange(len(combined)) for _ in range(rng.randint(0, 3)))
+        peaks.update(rng.sample((0, len(combined) - 1), rng.randint(0, 2)))
+        cases.append((combined, sorted(peaks), rng.choice((0, 2, 5)), rng.randint(1, 6)))
+
+    mismatches = sum(1 for case in cases if legacy_split(*case) != engine_split(*case))
+    merged = sum(segment[3] for case in cases for segment in legacy_split(*case))
+    peaks = sum(len(case[1]) for case in cases)
+    legacy = time_per_call(legacy_split, cases)
+    engine = time_per_call(segment_peaks, cases)
+    print(f"cycle segmentation, {args.buffers} buffers × {args.samples} samples ({peaks} peaks, {merged} merged)")
+    print(f"  legacy loops (pure Python): {legacy * 1e6:8.1f} µs/buffer")
+    print(f"  segment_peaks             : {engine * 1e6:8.1f} µs/buffer ({legacy / engine:.1f}x)")
+    print(f"  split mismatches          : {mismatches}")
+    return 1 if mismatches else 0
+
+
+def bench_streaming(args):
+    rng = random.Random(args.seed)
+    recordings = [stroke_recording(rng, rng.randint(1, 12)) for _ in range(args.streams)]
+
+    def replay_all(stream: bool) -> Tuple[List[list], float]:
+        dwp_poll.STREAM_SUB_CYCLES = stream
+        results = []
+        start = time.perf_counter()
+        for rec in recordings:
+            sink = CycleCapture()
+            asyncio.run(replay([rec], sink))
+            results.append(sink.cycles)
+        return results, time.perf_counter() - start
+
+    streaming = dwp_poll.STREAM_SUB_CYCLES
+    level = logger.level
+    logger.setLevel(logging.ERROR)  # skipped/invalid cycle warnings
+    try:
+        held, held_s = replay_all(False)
+        streamed, streamed_s = replay_all(True)
+    finally:
+        dwp_poll.STREAM_SUB_CYCLES = streaming
+        logger.setLevel(level)
+
+    # Streaming saves a position's strokes earlier, so L and R interleave
+    # differently; each position on its own must come out the same
+    def by_position(cycles: List[dict]) -> List[dict]:
+        return sorted(cycles, key=lambda cycle: cycle["position"])
+
+    mismatches = [i for i, (a, b) in enumerate(zip(held, streamed)) if by_position(a) != by_position(b)]
+    samples = sum(rec.samples for rec in recordings)
+    print(f"streamed vs. held sub-cycles, {args.streams} recordings ({samples} samples per position)")
+    print(f"  held until run end: {sum(map(len, held))} cycles in {held_s:.2f}s")
+    print(f"  streamed          : {sum(map(len, streamed))} cycles in {streamed_s:.2f}s")
+    print(f"  mismatching recordings: {len(mismatches)}" + (f" (first: #{mismatches[0]})" if mismatches else ""))
+    return 1 if mismatches else 0
+
+
+# ----------------------------
+# SYNTHETIC LOAD
+# ----------------------------
+# Press model from examples/README_PRESS_SIMULATION.md: 15–20 s cycles
+# (ramp → peak → release), a short idle between cycles, and the R position
+# trailing L by 2–8 s.
+class PositionSim:
+    def __init__(self, rng: random.Random, first_start: float):
+        self.rng = rng
+        self.next_start = first_start
+        self.new_cycle()
+
+    def new_cycle(self):
+        rng = self.rng
+        self.start = self.next_start
+        self.duration = rng.uniform(15, 20)
+        self.peak_th = rng.randint(20, 60)
+        self.peak_side = rng.randint(20, 60)
+        self.next_start = self.start + self.duration + rng.uniform(1, 4)
+
+    def values(self, now: float) -> Tuple[int, int]:
+        while now >= self.next_start:
+            self.new_cycle()
+        x = (now - self.start) / self.duration
+        if not 0 <= x < 1:
+            return 0, 0
+        shape = 4 * x * (1 - x)
+        noise = self.rng.gauss
+        return (
+            max(0, int(self.peak_th * shape + noise(0, 1))),
+            max(0, int(self.peak_side * shape + noise(0, 1))),
+        )
+
+
+class FakeResponse:
+    def __init__(self, registers: List[int]):
+        self.registers = registers
+
+    def isError(self) -> bool:
+        return False
+
+
+class FakeModbusClient:
+    """In-process stand-in for AsyncModbusTcpClient serving simulated press registers"""
+
+    connected = True
+
+    def __init__(self, machines: List[MachineConfig], rng: random.Random, started: float, latency_sec: float):
+        self.latency_sec = latency_sec
+        self.requests = 0
+        self.registers: Dict[int, Tuple[PositionSim, int]] = {}
+        for machine in machines:
+            left = PositionSim(rng, started + rng.uniform(0, 5))
+            right = PositionSim(rng, left.start + rng.uniform(2, 8))
+            self.registers[machine.addr_th_l] = (left, 0)
+            self.registers[machine.addr_side_l] = (left, 1)
+            self.registers[machine.addr_th_r] = (right, 0)
+            self.registers[machine.addr_side_r] = (right, 1)
+
+    async def read_input_registers(self, address: int, count: int, unit: int = None) -> FakeResponse:
+        self.requests += 1
+        if self.latency_sec:
+            await asyncio.sleep(self.latency_sec)
+        now = time.time()
+        values = {}
+        registers = []
+        for addr in range(address, address + count):
+            if addr not in self.registers:
+                registers.append(0)
+                continue
+            sim, channel = self.registers[addr]
+            if sim not in values:
+                values[sim] = sim.values(now)
+            registers.append(values[sim][channel])
+        return FakeResponse(registers)
+
+    async def connect(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    """Accepts CycleWriter batches without MySQL"""
+
+    def __init__(self):
+        self.cycles = 0
+        self.batches = 0
+        self.last_error = None
+
+    async def save_cycles(self, cycles: List[dict], dedupe: bool = False) -> int:
+        self.cycles += len(cycles)
+        self.batches += 1
+        return len(cycles)
+
+    async def ping(self) -> bool:
+        return True
+
+
+class BenchPoller(DWPPoller):
+    """DWPPoller that records per-tick scheduling lag and poll duration"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tick_lag_ms: List[float] = []
+        self.tick_work_ms: List[float] = []
+
+    async def poll_device(self, dev, client, groups=None):
+        # device_loop has just stored this tick's lag
+        self.tick_lag_ms.append(self.device_loop_stats[dev.id].last_lag_ms)
+        started = time.perf_counter()
+        ok = await super().poll_device(dev, client, groups)
+        self.tick_work_ms.append((time.perf_counter() - started) * 1000)
+        return ok
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p90, p99, p999 = np.percentile(values, (50, 90, 99, 99.9))
+    return {"p50": p50, "p90": p90, "p99": p99, "p99.9": p999, "max": max(values)}
+
+
+def position_memory_bytes(state) -> int:
+    """One CycleState with its buffers (getsizeof of an owning ndarray includes its data)"""
+    return sum(sys.getsizeof(o) for o in (state, state.th, state.side, state.t_ms, state.segmenter))
+
+
+async def run_poller_load(args, spool_path: str) -> dict:
+    rng = random.Random(args.seed)
+    if args.idle_ms:
+        dwp_poll.POLL_IDLE_INTERVAL_SEC = args.idle_ms / 1000
+    if args.active_ms:
+        dwp_poll.POLL_ACTIVE_INTERVAL_SEC = args.active_ms / 1000
+    db = FakeDatabase()
+    writer = CycleWriter(db, spool_path, 50, 1.0, 5.0)
+    poller = BenchPoller(cycle_writer=writer)
+    started = time.time()
+    for dev_id in range(1, args.devices + 1):
+        machines = [
+            MachineConfig(f"mc{m}", 100 + 10 * m, 101 + 10 * m, 102 + 10 * m, 103 + 10 * m)
+            for m in range(1, args.machines + 1)
+        ]
+        poller.devices[dev_id] = DeviceConfig(dev_id, f"bench-{dev_id}", "127.0.0.1", {f"LINE{dev_id}": machines})
+        client = FakeModbusClient(machines, rng, started, args.latency_ms / 1000)
+        connection = poller.connections[dev_id] = DeviceConnection(
+            f"bench-{dev_id}", lambda client=client: client, CircuitBreaker(3, 2.0, 30.0), 1.0, 60.0
+        )
+        await connection.connect()
+    clients = [connection.client for connection in poller.connections.values()]
+    poller.build_read_plans()
+
+    writer.start()
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    loop_task = asyncio.create_task(poller.poll_loop())
+    await asyncio.sleep(args.seconds)
+    poller.running = False
+    await loop_task
+    cpu_s = time.process_time() - cpu_started
+    wall_s = time.perf_counter() - wall_started
+    await writer.close()
+
+    stats = poller.device_loop_stats.values()
+    groups = [group for device_groups in poller.read_groups.values() for group in device_groups]
+    if poller.adaptive_polling:
+        group_polls = sum(g.idle_polls + g.active_polls for g in groups)
+        samples = sum((g.idle_polls + g.active_polls) * len(g.keys) for g in groups)
+        achieved_hz = {
+            mode: statistics.mean(rates) if rates else 0.0
+            for mode, rates in (
+                ("idle", [g.achieved_hz(False) for g in groups if g.idle_polls]),
+                ("active", [g.achieved_hz(True) for g in groups if g.active_polls]),
+            )
+        }
+    else:
+        group_polls = sum(s.ticks for s in stats)
+        samples = group_polls * args.machines * 2  # one sample per position per tick
+        achieved_hz = percentiles([s.effective_hz for s in stats])
+    memory = [position_memory_bytes(state) for state in poller.cycle_states.values()]
+    try:
+        import resource  # Unix only
+
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        max_rss_mb = None
+    return {
+        "devices": args.devices,
+        "machines_per_device": args.machines,
+        "positions": args.devices * args.machines * 2,
+        "seconds": round(wall_s, 2),
+        "tick_lag_ms": percentiles(poller.tick_lag_ms),
+        "tick_work_ms": percentiles(poller.tick_work_ms),
+        "adaptive": poller.adaptive_polling,
+        "achieved_hz": achieved_hz,
+        "modbus_requests_per_s": sum(c.requests for c in clients) / wall_s,
+        "overruns": sum(s.overruns for s in stats),
+        "skipped_ticks": sum(s.skipped_ticks for s in stats),
+        "cpu_us_per_sample": cpu_s / samples * 1e6 if samples else None,
+        "cpu_load": cpu_s / wall_s,
+        "memory_per_position_bytes": statistics.mean(memory) if memory else None,
+        "max_rss_mb": max_rss_mb,
+        "cycles_saved": db.cycles,
+        "cycles_per_min": db.cycles / wall_s * 60,
+        "max_flush_ms": writer.stats.max_flush_ms,
+    }
+
+
+async def run_save_burst(cycles: int, samples: int, spool_path: str) -> dict:
+    """Push cycles through spool → batch INSERT as fast as the writer accepts them"""
+    rng = random.Random(0)
+    db = FakeDatabase()
+    writer = CycleWriter(db, spool_path, 50, 1.0, 5.0)
+    writer.start()
+    th, side, timestamps = press_waveform(rng, samples)
+    cycle = {
+        "line": "BENCH", "machine": 1, "position": "L",
+        "th_waveform": th, "side_waveform": side, "timestamps": timestamps,
+        "duration_s": 16.0, "quality_grade": "GOOD", "max_th": max(th), "max_side": max(side),
+        "sample_count": samples, "cycle_type": "COMPLETE",
+    }
+    started = time.perf_counter()
+    for _ in range(cycles):
+        await writer.save_cycle(dict(cycle))
+    spooled = time.perf_counter() - started
+    await writer.close()
+    drained = time.perf_counter() - started
+    return {
+        "cycles": cycles,
+        "spool_cycles_per_s": cycles / spooled,
+        "end_to_end_cycles_per_s": db.cycles / drained,
+    }
+
+
+def print_poller_report(report: dict, baseline: dict = None):
+    def ms(p: dict) -> str:
+        return " ".join(f"{k}={v:.2f}" for k, v in p.items())
+
+    load, burst = report["load"], report["save_burst"]
+    print(
+        f"poller synthetic load: {load['devices']} devices × {load['machines_per_device']} machines "
+        f"({load['positions']} positions), {load['seconds']}s"
+    )
+    print(f"  tick lag ms      : {ms(load['tick_lag_ms'])}")
+    print(f"  tick work ms     : {ms(load['tick_work_ms'])}")
+    print(f"  achieved Hz      : {ms(load['achieved_hz'])} | overruns={load['overruns']} skipped={load['skipped_ticks']}")
+    if "modbus_requests_per_s" in load:
+        mode = "adaptive (idle/active)" if load.get("adaptive") else "fixed rate"
+        print(f"  Modbus requests  : {load['modbus_requests_per_s']:.1f}/s, {mode}")
+    print(f"  CPU per sample   : {load['cpu_us_per_sample']:.1f} µs (process CPU load {load['cpu_load']:.1%})")
+    max_rss = f"{load['max_rss_mb']:.0f} MB" if load.get("max_rss_mb") is not None else "n/a"
+    print(f"  memory/position  : {load['memory_per_position_bytes']:.0f} B | max RSS {max_rss}")
+    print(f"  cycles saved     : {load['cycles_saved']} ({load['cycles_per_min']:.1f}/min, max flush {load['max_flush_ms']:.1f} ms)")
+    print(
+        f"  save burst       : {burst['cycles']} cycles, spool {burst['spool_cycles_per_s']:.0f}/s, "
+        f"end-to-end {burst['end_to_end_cycles_per_s']:.0f}/s"
+    )
+    if baseline:
+        print("  vs. baseline     :")
+        for label, now, old in (
+            ("tick work p99 ms", load["tick_work_ms"].get("p99"), baseline["load"]["tick_work_ms"].get("p99")),
+            ("tick lag p99 ms", load["tick_lag_ms"].get("p99"), baseline["load"]["tick_lag_ms"].get("p99")),
+            ("CPU µs/sample", load["cpu_us_per_sample"], baseline["load"]["cpu_us_per_sample"]),
+            ("Modbus req/s", load.get("modbus_requests_per_s"), baseline["load"].get("modbus_requests_per_s")),
+            ("save burst /s", burst["end_to_end_cycles_per_s"], baseline["save_burst"]["end_to_end_cycles_per_s"]),
+        ):
+            if now is not None and old:
+                print(f"    {label:<17}: {old:9.2f} → {now:9.2f} ({(now - old) / old:+.1%})")
+
+
+def bench_poller(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        load = asyncio.run(run_poller_load(args, os.path.join(tmp, "load.db")))
+        burst = asyncio.run(run_save_burst(args.burst_cycles, 200, os.path.join(tmp, "burst.db")))
+    report = {"load": load, "save_burst": burst}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_poller_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DWP poller benchmarks")
+    parser.add_argument("--seed", type=int, default=1)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("waveform", help="Waveform sanity/std_error engine vs. the pure-Python rules")
+    p.add_argument("--samples", type=int, default=500)
+    p.add_argument("--buffers", type=int, default=2000)
+    p.set_defaults(func=bench_waveform)
+
+    p = sub.add_parser("segment", help="Peak segmentation engine vs. the poller's previous split loops")
+    p.add_argument("--samples", type=int, default=1000)
+    p.add_argument("--buffers", type=int, default=2000)
+    p.set_defaults(func=bench_segment)
+
+    p = sub.add_parser("streaming", help="Cycles saved with sub-cycle streaming on vs. off (must match)")
+    p.add_argument("--streams", type=int, default=300)
+    p.set_defaults(func=bench_streaming)
+
+    p = sub.add_parser("pv", help="Packed (v2) vs. JSON (v1) pv column size and codec throughput")
+    p.add_argument("--samples", type=int, default=200)
+    p.add_argument("--cycles", type=int, default=2000)
+    p.set_defaults(func=bench_pv)
+
+    p = sub.add_parser("poller", help="DWPPoller against fake Modbus devices and a fake DB")
+    p.add_argument("--devices", type=int, default=4)
+    p.add_argument("--machines", type=int, default=4, help="Machines per device")
+    p.add_argument("--seconds", type=float, default=60)
+    p.add_argument("--latency-ms", type=float, default=2.0, help="Simulated Modbus round trip")
+    p.add_argument("--burst-cycles", type=int, default=5000)
+    p.add_argument("--idle-ms", type=float, help="Adaptive polling: interval while a read group is idle")
+    p.add_argument("--active-ms", type=float, help="Adaptive polling: interval while a read group is mid-cycle")
+    p.add_argument("--json", help="Write the report here (use as a later --baseline)")
+    p.add_argument("--baseline", help="Compare against a previous --json report")
+    p.set_defaults(func=bench_poller)
+
+    args = parser.parse_args()
+    logger.setLevel(logging.WARNING)
+    raise SystemExit(args.func(args))
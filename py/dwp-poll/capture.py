@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from read_plan import MODBUS_MAX_READ_REGISTERS
+
+# Raw register capture for the DWP poller. Every block read is appended as one
+# fixed-width record to a memory-mapped segment file, so a capture costs a
+# single struct.pack_into (~1.5 µs) and no syscall. Segments rotate at a fixed
+# record count and the oldest are deleted beyond a retention limit. The reader
+# side maps segments straight into NumPy structured arrays.
+#
+# Record layout (little endian, 280 bytes):
+#   mono_ns  int64   time.monotonic_ns() of the read
+#   wall_ms  int64   epoch ms of the read (to line captures up with saved cycles)
+#   device   uint32  ins_dwp_devices.id
+#   start    uint16  first register address of the block
+#   count    uint16  registers in the block (0 for a failed read)
+#   status   uint16  CAPTURE_OK or CAPTURE_READ_ERROR
+#   values   uint16[125], first `count` valid
+
+logger = logging.getLogger("DWP")
+
+CAPTURE_OK = 0
+CAPTURE_READ_ERROR = 1
+
+SEGMENT_PREFIX = "dwp-capture-v1-"
+SEGMENT_SUFFIX = ".bin"
+LAYOUT_FILE = "layout.json"
+
+_HEADER = "<qqIHHH2x"  # mono_ns, wall_ms, device, start, count, status, padding
+_HEADER_SIZE = struct.calcsize(_HEADER)  # 28
+RECORD_SIZE = 280  # header + 125 values, padded to a multiple of 8
+RECORD_DTYPE = np.dtype(
+    {
+        "names": ["mono_ns", "wall_ms", "device", "start", "count", "status", "values"],
+        "formats": ["<i8", "<i8", "<u4", "<u2", "<u2", "<u2", ("<u2", (MODBUS_MAX_READ_REGISTERS,))],
+        "offsets": [0, 8, 16, 20, 22, 24, _HEADER_SIZE],
+        "itemsize": RECORD_SIZE,
+    }
+)
+
+
+class CaptureLog:
+    """Append-only writer for raw block reads"""
+
+    def __init__(self, directory: str, segment_records: int = 65536, max_segments: int = 200):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.records_written = 0
+        self.segments_rotated = 0
+        self._packers: Dict[int, struct.Struct] = {}
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._slot = 0
+        existing = segment_paths(self.directory)
+        self._next_seq = int(existing[-1].name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]) + 1 if existing else 1
+        self._open_segment()
+
+    def _open_segment(self):
+        path = self.directory / f"{SEGMENT_PREFIX}{self._next_seq:08d}{SEGMENT_SUFFIX}"
+        self._next_seq += 1
+        self._file = open(path, "w+b")
+        # Sparse preallocation: untouched slots read back as zeros (mono_ns == 0)
+        self._file.truncate(self.segment_records * RECORD_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._slot = 0
+        self._prune()
+
+    def _close_segment(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+    def _prune(self):
+        segments = segment_paths(self.directory)
+        for path in segments[: max(0, len(segments) - self.max_segments)]:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"⚠️ Could not delete capture segment {path.name}: {e}")
+
+    def _packer(self, count: int) -> struct.Struct:
+        packer = self._packers.get(count)
+        if packer is None:
+            packer = self._packers[count] = struct.Struct(f"{_HEADER}{count}H")
+        return packer
+
+    def append(self, device: int, start: int, registers: Sequence[int], status: int = CAPTURE_OK):
+        """Record one block read; `registers` may be empty for a failed read"""
+        if self._slot >= self.segment_records:
+            self._close_segment()
+            self.segments_rotated += 1
+            self._open_segment()
+        count = min(len(registers), MODBUS_MAX_READ_REGISTERS)
+        self._packer(count).pack_into(
+            self._map,
+            self._slot * RECORD_SIZE,
+            time.monotonic_ns(),
+            time.time_ns() // 1_000_000,
+            device,
+            start,
+            count,
+            status,
+            *registers[:count],
+        )
+        self._slot += 1
+        self.records_written += 1
+
+    def write_layout(self, layout: dict):
+        """Store the device/machine register map next to the segments, for readers"""
+        tmp = self.directory / f"{LAYOUT_FILE}.tmp"
+        tmp.write_text(json.dumps(layout, indent=1))
+        os.replace(tmp, self.directory / LAYOUT_FILE)
+
+    def close(self):
+        self._close_segment()
+
+
+# ----------------------------
+# READER
+# ----------------------------
+def segment_paths(directory) -> List[Path]:
+    return sorted(Path(directory).glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+
+def read_segment(path) -> np.ndarray:
+    """Written records of one segment, as a RECORD_DTYPE array"""
+    records = np.fromfile(path, dtype=RECORD_DTYPE)
+    return records[records["mono_ns"] != 0]
+
+
+def iter_records(directory, device: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Yield the records of every segment, oldest first"""
+    for path in segment_paths(directory):
+        records = read_segment(path)
+        if device is not None:
+            records = records[records["device"] == device]
+        if records.size:
+            yield records
+
+
+def load_records(directory, device: Optional[int] = None) -> np.ndarray:
+    chunks = list(iter_records(directory, device))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=RECORD_DTYPE)
+
+
+def load_layout(directory) -> dict:
+    return json.loads((Path(directory) / LAYOUT_FILE).read_text())
+
+
+def tick_series(records: np.ndarray, addresses: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-poll values of `addresses` for one device's records, in capture order.
+
+    Blocks of a poll are read in ascending start order, so a block starting at
+    or below the previous one opens a new poll. Returns (wall_ms per poll,
+    values[poll, address]) for the polls in which every address was read.
+    """
+    if records.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(addresses)), dtype=np.int64)
+    start = records["start"].astype(np.int64)
+    count = records["count"].astype(np.int64)
+    new_poll = np.concatenate(([True], start[1:] <= start[:-1]))
+    poll = np.cumsum(new_poll) - 1
+    polls = int(poll[-1]) + 1
+
+    wall_ms = records["wall_ms"][new_poll]
+    values = np.full((polls, len(addresses)), -1, dtype=np.int64)
+    ok = records["status"] == CAPTURE_OK
+    for column, address in enumerate(addresses):
+        has = ok & (start <= address) & (address < start + count)
+        rows = np.flatnonzero(has)
+        values[poll[rows], column] = records["values"][rows, address - start[rows]]
+    complete = (values >= 0).all(axis=1)
+    return wall_ms[complete], values[complete]
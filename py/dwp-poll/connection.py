@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import asyncio
+import inspect
+import logging
+import random
+import time
+from typing import Any, Callable, Optional
+
+# Connection management for the Modbus gateways. Every device gets a
+# DeviceConnection that owns its client, reconnects it in the background with
+# exponential backoff and jitter, and guards reads with a circuit breaker:
+# after a run of failed polls the breaker opens and the device is skipped
+# (fail fast, no timeouts burned) until a single half-open probe poll is let
+# through. A failed probe re-opens the breaker for longer and recycles the
+# TCP connection, since a silently dead socket never recovers by itself.
+
+logger = logging.getLogger("DWP")
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+def backoff_delay(attempt: int, base_sec: float, max_sec: float, rng: Callable[[], float] = random.random) -> float:
+    """Exponential backoff with "equal jitter": uniform in [cap/2, cap]"""
+    cap = min(max_sec, base_sec * (2 ** min(attempt, 32)))
+    return cap / 2 + rng() * cap / 2
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int,
+        open_sec: float,
+        open_max_sec: float,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_sec = open_sec
+        self.open_max_sec = open_max_sec
+        self.clock = clock
+        self.rng = rng
+        self.state = BREAKER_CLOSED
+        self.failures = 0  # consecutive
+        self.reopens = 0  # failed probes since the breaker first opened
+        self.trips = 0
+        self.open_until = 0.0
+
+    def allow(self) -> bool:
+        """May a poll go through now? Moves an expired open breaker to half-open."""
+        if self.state == BREAKER_OPEN:
+            if self.clock() < self.open_until:
+                return False
+            self.state = BREAKER_HALF_OPEN
+        return True
+
+    def retry_in(self) -> float:
+        return max(0.0, self.open_until - self.clock()) if self.state == BREAKER_OPEN else 0.0
+
+    def record_success(self) -> bool:
+        """Returns True when this success closed an open/half-open breaker"""
+        recovered = self.state != BREAKER_CLOSED
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.reopens = 0
+        return recovered
+
+    def record_failure(self) -> bool:
+        """Returns True when this failure opened the breaker"""
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN:
+            self.reopens += 1
+        elif self.failures < self.failure_threshold:
+            return False
+        else:
+            self.trips += 1
+        self.state = BREAKER_OPEN
+        self.open_until = self.clock() + backoff_delay(self.reopens, self.open_sec, self.open_max_sec, self.rng)
+        return True
+
+
+class DeviceConnection:
+    """A device's Modbus client with background reconnects and a read circuit breaker"""
+
+    def __init__(
+        self,
+        name: str,
+        client_factory: Callable[[], Any],
+        breaker: CircuitBreaker,
+        reconnect_base_sec: float,
+        reconnect_max_sec: float,
+        rng: Callable[[], float] = random.random,
+    ):
+        """client_factory: builds a fresh (unconnected) AsyncModbusTcpClient-like object"""
+        self.name = name
+        self.client_factory = client_factory
+        self.breaker = breaker
+        self.reconnect_base_sec = reconnect_base_sec
+        self.reconnect_max_sec = reconnect_max_sec
+        self.rng = rng
+        self.client = None
+        self.reconnect_task: Optional[asyncio.Task] = None
+        self.reconnects = 0  # successful background reconnects
+
+    @property
+    def connected(self) -> bool:
+        return self.client is not None and bool(self.client.connected)
+
+    @property
+    def reconnecting(self) -> bool:
+        return self.reconnect_task is not None and not self.reconnect_task.done()
+
+    async def connect(self) -> bool:
+        """One connection attempt"""
+        if self.client is None:
+            self.client = self.client_factory()
+        try:
+            await self.client.connect()
+        except Exception as e:
+            logger.debug(f"Connect to {self.name} failed: {e}")
+        return self.connected
+
+    def acquire(self):
+        """The client if a poll may go through now, else None (reconnecting or breaker open)"""
+        if not self.connected:
+            self.start_reconnect()
+            return None
+        if not self.breaker.allow():
+            return None
+        return self.client
+
+    def start_reconnect(self):
+        if not self.reconnecting:
+            self.reconnect_task = asyncio.create_task(self.reconnect(), name=f"dwp-reconnect-{self.name}")
+
+    async def reconnect(self):
+        attempt = 0
+        while not self.connected:
+            delay = backoff_delay(attempt, self.reconnect_base_sec, self.reconnect_max_sec, self.rng)
+            await asyncio.sleep(delay)
+            attempt += 1
+            await self._close_client()
+            if await self.connect():
+                self.reconnects += 1
+                logger.info(f"🔌 Reconnected to {self.name} after {attempt} attempt(s)")
+                return
+            if attempt == 1 or attempt % 10 == 0:
+                logger.warning(f"⚠️ Reconnect to {self.name} failed (attempt {attempt}), retrying with backoff")
+
+    def recycle(self):
+        """Drop the current socket and reconnect in the background"""
+        client, self.client = self.client, None
+        if client is not None:
+            try:
+                result = client.close()
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception:
+                pass
+        self.start_reconnect()
+
+    async def _close_client(self):
+        if self.client is None:
+            return
+        client, self.client = self.client, None
+        try:
+            result = client.close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            pass
+
+    async def close(self):
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            await asyncio.gather(self.reconnect_task, return_exceptions=True)
+            self.reconnect_task = None
+        await self._close_client()
@@ -2,9 +2,13 @@
 import logging
 from typing import List
 
+from segmentation import combine_channels, segment_peaks
+
 # This module contains the extracted split_and_save_cycles helper used by the
-# poller. It was moved out of the DWPPoller class so it can be reused and
-# unit-tested independently.
+# poller. It was moved out of the DWPPoller class so it can be reused outside
+# it. Sub-cycle boundaries come from segmentation.segment_peaks on max(TH, Side),
+# as in the poller; `python bench.py segment` checks that engine against the
+# poller's previous split loops.
 
 logger = logging.getLogger("DWP")
 
@@ -22,6 +26,8 @@ async def split_and_save_cycles(
     peaks: List[int],
     total_duration_ms: int,
     t_buf: List[float],
+    end_threshold: int = 2,
+    min_zero_gap: int = 3,
 ):
     """Split a multi-peak buffer into individual cycles and save each
     sub-cycle using the provided `db` manager. The function accepts helper
@@ -35,24 +41,22 @@ async def split_and_save_cycles(
         extract_machine_id_fn: callable(machine_name) -> int
         line, machine_name, pos: identifiers
         th_buf, side_buf: full buffers
-        peaks: list of peak indices in th_buf
+        peaks: list of peak indices in max(th_buf, side_buf)
         total_duration_ms: total buffer duration estimate (ms)
         t_buf: per-sample epoch timestamps (seconds)
+        end_threshold: combined TH/Side level at or below which a sample is "zero"
+        min_zero_gap: zero samples required between peaks to split them
     """
     log = logger_param or logger
 
-    for i, peak_idx in enumerate(peaks):
-        # Find start (first non-zero before peak)
-        start_idx = peak_idx
-        while start_idx > 0 and th_buf[start_idx - 1] <= 2:
-            start_idx -= 1
-        start_idx = max(0, start_idx)
-
-        # Find end (first zero after peak)
-        end_idx = peak_idx
-        while end_idx < len(th_buf) - 1 and th_buf[end_idx + 1] > 2:
-            end_idx += 1
-        end_idx = min(len(th_buf) - 1, end_idx)
+    # Same segmentation as the poller: sub-cycles are the above-threshold runs
+    # of max(TH, Side); peaks without a zero gap between them stay together
+    combined = combine_channels(th_buf, side_buf)
+    for segment in segment_peaks(combined, peaks, end_threshold, min_zero_gap):
+        if segment.merged:
+            continue
+        i = segment.number
+        start_idx, end_idx = segment.start, segment.end
 
         # Extract sub-cycle
         th_sub = th_buf[start_idx : end_idx + 1]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+from typing import Optional, Tuple
+
+import numpy as np
+
+from segmentation import StreamingSegmenter
+
+# Per-position cycle state for the DWP poller. Sample buffers are allocated
+# once per position and reused for every cycle, so the 10 Hz ingest path only
+# writes into preallocated NumPy arrays instead of growing Python lists.
+
+
+class CycleState:
+    __slots__ = (
+        "state",
+        "start_time",
+        "last_nonzero",
+        "length",
+        "capacity",
+        "th",
+        "side",
+        "t_ms",
+        "segmenter",
+        "emitted",
+        "streamed_until",
+    )
+
+    def __init__(self, capacity: int, end_threshold: int, min_zero_gap: int):
+        """capacity: samples a cycle may hold before it is force-saved as OVERFLOW
+        end_threshold/min_zero_gap: zero-gap rule used to stream sub-cycles out"""
+        self.state = "idle"
+        self.start_time = 0.0  # epoch seconds
+        self.last_nonzero = 0.0  # epoch seconds
+        self.length = 0
+        # One spare slot: the overflow check runs after the sample is appended
+        self.capacity = capacity + 1
+        self.th = np.zeros(self.capacity, dtype=np.uint16)
+        self.side = np.zeros(self.capacity, dtype=np.uint16)
+        self.t_ms = np.zeros(self.capacity, dtype=np.int64)  # epoch ms per sample
+        self.segmenter = StreamingSegmenter(end_threshold, min_zero_gap)
+        self.emitted = 0  # sub-cycles already streamed out of this cycle
+        self.streamed_until = 0  # samples before this index were already split
+
+    def start(self, now: float, th: int, side: int):
+        """Begin a new cycle, reusing the buffers of the previous one"""
+        self.state = "active"
+        self.start_time = now
+        self.last_nonzero = now
+        self.length = 0
+        self.emitted = 0
+        self.streamed_until = 0
+        self.segmenter.reset()
+        self.append(now, th, side)
+
+    def append(self, now: float, th: int, side: int) -> Optional[Tuple[int, int]]:
+        """Store a sample; returns (first, last) sample of a sub-cycle whose
+        trailing zero gap this sample just closed, or None"""
+        n = self.length
+        if n >= self.capacity:
+            return None
+        self.th[n] = th
+        self.side[n] = side
+        self.t_ms[n] = int(now * 1000)
+        self.length = n + 1
+        return self.segmenter.feed(n, max(th, side))
+
+    @property
+    def th_buf(self) -> np.ndarray:
+        """TH samples of the current cycle (a view, valid until the next start)"""
+        return self.th[: self.length]
+
+    @property
+    def side_buf(self) -> np.ndarray:
+        return self.side[: self.length]
+
+    @property
+    def timestamps_ms(self) -> np.ndarray:
+        return self.t_ms[: self.length]
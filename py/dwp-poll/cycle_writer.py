@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from spool import CycleSpool
+
+# Write-behind pipeline for completed cycles. The poller hands cycles to
+# `CycleWriter.save_cycle`, which only appends them to the local spool; a
+# background task drains the spool to MySQL as multi-row INSERTs whenever a
+# batch fills up or the flush interval elapses. This keeps DB round trips off
+# the polling path, and cycles survive a MySQL outage or a poller restart.
+# A batch that keeps failing while MySQL is reachable is bisected: the cycles
+# MySQL accepts are written and the ones it rejects on their own are moved to
+# the spool's dead-letter table, so one bad row can't stall the queue.
+
+logger = logging.getLogger("DWP")
+
+
+@dataclass
+class CycleWriterStats:
+    enqueued: int = 0
+    written: int = 0
+    duplicates: int = 0  # replayed cycles MySQL already had
+    failed_batches: int = 0
+    dead_lettered: int = 0  # cycles moved to the spool's dead_cycles table
+    spool_depth: int = 0  # cycles waiting in the spool
+    max_spool_depth: int = 0
+    last_flush_ms: float = 0.0
+    max_flush_ms: float = 0.0
+
+
+class CycleWriter:
+    def __init__(
+        self,
+        db,
+        spool_path: str,
+        batch_size: int,
+        flush_interval_sec: float,
+        retry_interval_sec: float,
+        spool_synchronous: str = "NORMAL",
+        max_attempts: int = 5,
+    ):
+        """db: DatabaseManager-like object with async `save_cycles(list, dedupe) -> Optional[int]`,
+        `ping() -> bool` and the `last_error` of the last failed save.
+        max_attempts: failures of the oldest spooled cycle before its batch is bisected"""
+        self.db = db
+        self.spool_path = spool_path
+        self.spool_synchronous = spool_synchronous
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_sec = flush_interval_sec
+        self.retry_interval_sec = retry_interval_sec
+        self.max_attempts = max(1, max_attempts)
+        self.spool: Optional[CycleSpool] = None
+        self.stats = CycleWriterStats()
+        self.task: Optional[asyncio.Task] = None
+        # One drain at a time: the background task and release_lines share the spool
+        self.draining = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+        # Called with the duration in seconds of every MySQL batch attempt
+        self.on_flush: Optional[Callable[[float], None]] = None
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.spool = CycleSpool(self.spool_path, self.spool_synchronous)
+        self._track_depth()
+        if self.spool.depth:
+            logger.warning(f"🔁 {self.spool.depth} spooled cycle(s) pending from a previous run — replaying")
+        if self.spool.dead:
+            logger.warning(f"☠️ {self.spool.dead} rejected cycle(s) in the dead_cycles table of {self.spool_path}")
+        self.task = asyncio.create_task(self.run(), name="dwp-cycle-writer")
+        logger.info(
+            f"🧾 Cycle writer started (spool={self.spool_path}, batch={self.batch_size}, "
+            f"flush={self.flush_interval_sec}s)"
+        )
+
+    async def save_cycle(self, cycle_data: dict) -> bool:
+        """Spool a cycle for writing. Never waits on MySQL."""
+        if self.spool is None:
+            logger.error("❌ Cycle writer not running")
+            return False
+        try:
+            self.spool.append(cycle_data)
+        except Exception as e:
+            logger.error(f"❌ Failed to spool cycle: {e}")
+            return False
+        self.stats.enqueued += 1
+        self._track_depth()
+        if self.spool.depth >= self.batch_size:
+            self.wakeup.set()
+        return True
+
+    async def release_lines(self, lines: List[str]) -> bool:
+        """Write out everything spooled, then record that these lines are no longer polled
+        here (sharded mode: the shard taking them over waits for this). False if cycles
+        are left in the spool because MySQL is unavailable."""
+        if self.spool is None:
+            return False
+        async with self.draining:
+            delivered = await self.drain()
+        self.spool.release_lines(lines)
+        return delivered
+
+    async def close(self):
+        """Try to deliver everything still spooled, then stop the writer task"""
+        if self.task is None:
+            return
+        self.stopping.set()
+        self.wakeup.set()
+        await self.task
+        self.task = None
+        if self.spool.depth:
+            logger.warning(f"💾 {self.spool.depth} cycle(s) left in spool — they will be replayed on next start")
+        self.spool.close()
+        self.spool = None
+        logger.info(f"🧾 Cycle writer stopped (written={self.stats.written})")
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval_sec)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            async with self.draining:
+                delivered = await self.drain()
+            if self.stopping.is_set():
+                return
+            if not delivered:
+                # MySQL is unavailable: keep spooling, retry later
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), self.retry_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain(self) -> bool:
+        """Send spooled cycles to MySQL until the spool is empty or a batch fails"""
+        while self.spool.depth:
+            batch = self.spool.pending(self.batch_size)
+            if not batch:
+                break
+            # The oldest cycle has failed every time: if MySQL is up, it's the data
+            suspect = batch[0][2] >= self.max_attempts and await self.db.ping()
+            if suspect:
+                logger.warning(f"🔬 Batch rejected {batch[0][2]} times — bisecting it to find the bad cycle(s)")
+            if not await (self.isolate(batch) if suspect else self.write(batch)):
+                logger.warning(
+                    f"⚠️ DB write failed — {self.spool.depth} cycle(s) kept in spool, "
+                    f"retrying in {self.retry_interval_sec}s"
+                )
+                return False
+        return True
+
+    async def write(self, batch: List[Tuple[int, dict, int]]) -> Optional[int]:
+        """One MySQL attempt for spooled (seq, cycle_data, attempts); acks the batch on success"""
+        seqs = [seq for seq, _, _ in batch]
+        cycles = [cycle_data for _, cycle_data, _ in batch]
+        # Only cycles from a failed attempt can already be in MySQL
+        dedupe = any(attempts for _, _, attempts in batch)
+
+        start = time.perf_counter()
+        try:
+            inserted = await self.db.save_cycles(cycles, dedupe=dedupe)
+        except Exception as e:
+            logger.error(f"❌ Cycle batch write failed: {e}")
+            inserted = None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats.last_flush_ms = elapsed_ms
+        self.stats.max_flush_ms = max(self.stats.max_flush_ms, elapsed_ms)
+        if self.on_flush is not None:
+            self.on_flush(elapsed_ms / 1000)
+
+        if inserted is None:
+            self.stats.failed_batches += 1
+            self.spool.mark_attempt(seqs)
+            return None
+
+        self.spool.ack(seqs)
+        self.stats.written += inserted
+        self.stats.duplicates += len(cycles) - inserted
+        self._track_depth()
+        logger.debug(f"💾 Wrote {inserted} cycle(s) in {elapsed_ms:.1f}ms")
+        return inserted
+
+    async def isolate(self, batch: List[Tuple[int, dict, int]]) -> bool:
+        """Bisect a failing batch: write what MySQL accepts, dead-letter single cycles it
+        has rejected max_attempts times. False if MySQL is unavailable (retry later)."""
+        if not await self.db.ping():
+            return False
+        if len(batch) == 1:
+            seq, cycle_data, attempts = batch[0]
+            if attempts + 1 < self.max_attempts:
+                # Failed on its own, but not often enough to rule out a transient error
+                return False
+            error = self.db.last_error
+            self.spool.dead_letter(seq, error)
+            self.stats.dead_lettered += 1
+            self._track_depth()
+            logger.error(
+                f"☠️ CYCLE REJECTED BY MYSQL - MOVED TO DEAD LETTER | {cycle_data.get('line')} | "
+                f"uid={cycle_data.get('cycle_uid')} | attempts={attempts + 1} | error: {error} | "
+                f"kept in dead_cycles of {self.spool_path}"
+            )
+            return True
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            if await self.write(half) is None and not await self.isolate(half):
+                return False
+        return True
+
+    def _track_depth(self):
+        depth = self.spool.depth if self.spool else 0
+        self.stats.spool_depth = depth
+        self.stats.max_spool_depth = max(self.stats.max_spool_depth, depth)
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 import asyncio
 import json
-import statistics
 import logging
 import signal
 import time
 import argparse
+import contextlib
+import importlib
 import os
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, astuple, dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Reported in the startup log; everything below (third-party deps, .env) counts
+IMPORT_STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -22,11 +27,37 @@ load_dotenv(dotenv_path=dotenv_path)
 import aiomysql
 from pymodbus.client import AsyncModbusTcpClient
 from pymodbus.exceptions import ModbusException
-from scipy.signal import find_peaks
+
+from capture import CAPTURE_READ_ERROR, CaptureLog
+from connection import BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitBreaker, DeviceConnection
+from cycle_state import CycleState
+from cycle_writer import CycleWriter
+from live import LiveHub, LiveServer, Snapshot
+from log_pipeline import start_log_pipeline
+from metrics import MetricsServer, PollerMetrics
+from pymysql.constants import ER
+from pv_codec import PV_VERSIONS, encode_pv
+from read_plan import ReadBlock, compile_read_plan, group_blocks
+from rollup import RollupAggregator, upsert_rollups
+from scheduler import TickScheduler
+from segmentation import combine_channels, segment_peaks
+from shard import ShardSupervisor, assign_shards, shard_path
+from spool import line_released
+from status_writer import StatusRow, StatusWriter
+from waveform_analysis import (
+    FEATURE_COLUMNS,
+    WaveformFeatures,
+    analyze_waveform,
+    check_sanity,
+    cycle_features,
+    sensor_flags,
+)
+
+IMPORT_SEC = time.perf_counter() - IMPORT_STARTED
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("DWP_LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s | %(levelname)-8s | %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
 )
@@ -37,14 +68,53 @@ logger = logging.getLogger("DWP")
 # ----------------------------
 # Polling
 POLL_INTERVAL_SEC = 0.1  # 10 Hz → recommended for press cycles
+# What to do when a tick overruns its deadline:
+#   "skip"  → drop the missed deadlines and stay on the fixed grid
+#   "burst" → poll the missed deadlines back-to-back (up to POLL_CATCHUP_MAX_BURST)
+POLL_CATCHUP_POLICY = "skip"
+POLL_CATCHUP_MAX_BURST = 5
+# Adaptive rate: each read group (blocks shared by a set of machines) is polled
+# every POLL_IDLE_INTERVAL_SEC while all of its positions are idle and every
+# POLL_ACTIVE_INTERVAL_SEC while any of them is mid-cycle, e.g. idle 0.5 s /
+# active 0.04 s. Both default to POLL_INTERVAL_SEC (fixed rate). Sample-count
+# tunables (MAX_BUFFER_LENGTH, SPLIT_MIN_ZERO_GAP, SPLIT_PEAK_DISTANCE) are
+# calibrated for POLL_INTERVAL_SEC and are scaled up to the active rate.
+# Trade-off: a cycle start is seen up to one idle interval late, so its
+# leading samples are not recorded.
+POLL_IDLE_INTERVAL_SEC = float(os.getenv("DWP_POLL_IDLE_SEC", str(POLL_INTERVAL_SEC)))
+POLL_ACTIVE_INTERVAL_SEC = float(os.getenv("DWP_POLL_ACTIVE_SEC", str(POLL_INTERVAL_SEC)))
 MODBUS_TIMEOUT_SEC = 1.0
 MODBUS_PORT = 503
 MODBUS_UNIT_ID = 1
+MODBUS_RETRIES = 0  # pymodbus retries per request; flaky gateways are handled by the circuit breaker
+# Gateways connected at once during startup and reloads; each unreachable one
+# costs up to MODBUS_TIMEOUT_SEC
+CONNECT_CONCURRENCY = int(os.getenv("DWP_CONNECT_CONCURRENCY", "16"))
+
+# Connection management (see connection.py)
+RECONNECT_BASE_SEC = 1.0  # first reconnect delay, doubled per failed attempt (with jitter)...
+RECONNECT_MAX_SEC = 60.0  # ...up to this
+BREAKER_FAILURE_THRESHOLD = 3  # consecutive failed polls before a device's circuit opens
+BREAKER_OPEN_SEC = 2.0  # fail fast this long before a half-open probe poll...
+BREAKER_OPEN_MAX_SEC = 30.0  # ...doubled per failed probe up to this
+
+# Read planning: all machines on a device are coalesced into block reads.
+# A gap is read through when it is cheaper than an extra round trip; the cost
+# of one round trip is expressed in registers transferred.
+READ_PLAN_ROUND_TRIP_COST = 32
 
 # Device offline detection
 OFFLINE_THRESHOLD_SEC = 60  # If no successful read for 60 seconds, mark as offline
 HEARTBEAT_CHECK_INTERVAL_SEC = 10  # Check heartbeat every 10 seconds
 
+# Device config hot reload: ins_dwp_devices is re-read this often (0 = only on SIGHUP).
+# Windows has no SIGHUP: there the interval is the only trigger, so keep it above 0
+# (or restart the poller to apply changes)
+DEVICE_RELOAD_INTERVAL_SEC = float(os.getenv("DWP_DEVICE_RELOAD_SEC", "60"))
+
+# Per-device polling tasks
+DEVICE_SUPERVISOR_INTERVAL_SEC = 1.0  # How often crashed device tasks are checked/restarted
+
 # MySQL
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "127.0.0.1"),
@@ -57,6 +127,67 @@ DB_CONFIG = {
     "maxsize": 10,  # Connection pool size
 }
 
+# Cycle write-behind: cycles are spooled locally, then flushed as multi-row INSERTs
+CYCLE_SPOOL_PATH = os.getenv("DWP_SPOOL_PATH", str(Path(__file__).resolve().parent / "spool" / "cycles.db"))
+CYCLE_SPOOL_SYNCHRONOUS = "NORMAL"  # SQLite sync level: NORMAL (crash-safe) or FULL (power-loss-safe)
+CYCLE_WRITE_BATCH_SIZE = 50  # Flush when this many cycles are spooled...
+CYCLE_WRITE_FLUSH_SEC = 1.0  # ...or at least this often
+CYCLE_WRITE_RETRY_SEC = 5.0  # Wait between attempts while MySQL is unavailable
+CYCLE_WRITE_MAX_ATTEMPTS = 5  # A batch failing this often while MySQL is up is bisected; bad cycles are dead-lettered
+# Per-minute and per-shift rollups (ins_dwp_rollups, see rollup.py), updated
+# in the same transaction as every cycle batch
+ROLLUPS_ENABLED = os.getenv("DWP_ROLLUPS", "1") != "0"
+SHIFT_START_HOURS = tuple(int(hour) for hour in os.getenv("DWP_SHIFT_START_HOURS", "6,14,22").split(","))
+# Device status transitions (log_dwp_uptime) are queued in memory and batched
+STATUS_WRITE_BATCH_SIZE = 100
+STATUS_WRITE_FLUSH_SEC = 1.0
+STATUS_WRITE_RETRY_SEC = 5.0
+STATUS_QUEUE_MAX = 10000  # oldest transitions are dropped beyond this during a MySQL outage
+# Raw register capture (opt-in): every block read is appended to rotating
+# memory-mapped segments in this directory (see capture.py); unset = disabled
+CAPTURE_DIR = os.getenv("DWP_CAPTURE_DIR") or None
+CAPTURE_SEGMENT_RECORDS = 65536  # 280 B records → ~18 MB per segment
+CAPTURE_MAX_SEGMENTS = int(os.getenv("DWP_CAPTURE_MAX_SEGMENTS", "200"))  # oldest deleted beyond this
+
+# Prometheus metrics endpoint, served from the poller's event loop; port 0 = disabled
+METRICS_HOST = os.getenv("DWP_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("DWP_METRICS_PORT", "0"))
+
+# Live events for dashboards (see live.py): Server-Sent Events on GET /events
+# from the poller's event loop; port 0 = disabled. Shard i serves LIVE_PORT + i.
+LIVE_HOST = os.getenv("DWP_LIVE_HOST", "127.0.0.1")
+LIVE_PORT = int(os.getenv("DWP_LIVE_PORT", "0"))
+LIVE_ALLOW_ORIGIN = os.getenv("DWP_LIVE_ALLOW_ORIGIN", "*")  # CORS for dashboards on another origin
+LIVE_VALUES_INTERVAL_SEC = 0.25  # register values per machine at most this often
+LIVE_CLIENT_QUEUE_MAX = 1000  # unsent events per client before the oldest are dropped
+LIVE_HEARTBEAT_SEC = 15.0
+
+# Sharded mode (--shards N): a supervisor runs N poller processes, each polling
+# the devices the hash ring assigns to it (see shard.py). Shard i serves its
+# metrics on SHARD_METRICS_BASE_PORT + i; the supervisor serves the merged set
+# on METRICS_PORT.
+SHARDS = int(os.getenv("DWP_SHARDS", "0"))  # 0 = single process
+SHARD_METRICS_BASE_PORT = int(os.getenv("DWP_SHARD_METRICS_BASE_PORT", "9480"))
+SHARD_HEALTH_INTERVAL_SEC = 5.0  # supervisor scrape interval
+SHARD_HANG_TIMEOUT_SEC = 60.0  # kill a shard whose metrics endpoint is silent this long
+SHARD_RESTART_BACKOFF_MAX_SEC = 60.0
+# When a reload moves a line to another shard, the new owner starts polling it
+# once the old one has written out its spooled cycles for the line (so cycle
+# numbers don't repeat), or after this long if the old owner never lets go
+SHARD_HANDOFF_TIMEOUT_SEC = float(os.getenv("DWP_SHARD_HANDOFF_SEC", "120"))
+SHARD_HANDOFF_CHECK_SEC = 1.0
+
+# Logging (see log_pipeline.py): records go through a bounded queue to a writer
+# thread, and repetitive warnings are rate limited per key. DWP_LOG_LEVEL=DEBUG
+# also dumps the full waveform of every cycle.
+LOG_QUEUE_SIZE = 10000
+LOG_RATE_WINDOW_SEC = 60.0
+LOG_RATE_BURST = 5  # records per key and window...
+LOG_RATE_SAMPLE_EVERY = 100  # ...then only every Nth
+
+# pv column format: 1 = JSON integer arrays, 2 = packed delta/varint/base64 (see pv_codec.py)
+PV_FORMAT_VERSION = int(os.getenv("DWP_PV_VERSION", "1"))
+
 # Cycle detection
 CYCLE_START_THRESHOLD = 1
 CYCLE_END_THRESHOLD = 2
@@ -71,6 +202,9 @@ MIN_DURATION_S = 5
 SPLIT_MIN_SAMPLES = 5
 SPLIT_MIN_ZERO_GAP = 3
 SPLIT_PEAK_DISTANCE = 3
+# Save each stroke of a run as soon as the zero gap after it closes; False holds
+# the run and splits it when it ends (`bench.py streaming` checks both agree)
+STREAM_SUB_CYCLES = True
 
 # Quality thresholds
 GOOD_MIN, GOOD_MAX = 30, 45
@@ -78,6 +212,8 @@ EXTENDED_MIN, EXTENDED_MAX = 25, 55
 MARGINAL_MIN, MARGINAL_MAX = 15, 70
 SENSOR_LOW = 10
 PRESSURE_HIGH = 80
+# Stored feature columns: time above this level counts as dwell (see cycle_features)
+FEATURE_DWELL_LEVEL = GOOD_MIN
 
 
 # ----------------------------
@@ -100,6 +236,51 @@ class DeviceConfig:
     lines: Dict[str, List[MachineConfig]]
 
 
+@dataclass
+class ReadGroup:
+    """Blocks that are always read together and the machines they feed (unit of adaptive polling)"""
+    index: int
+    blocks: List[ReadBlock]
+    machines: List[Tuple[str, MachineConfig]]
+    keys: List[str]  # cycle state keys of the machines' positions
+    last_read: float = float("-inf")  # monotonic
+    idle_polls: int = 0
+    active_polls: int = 0
+    idle_sec: float = 0.0  # time covered by idle / active polls: polls / sec = achieved Hz
+    active_sec: float = 0.0
+
+    def achieved_hz(self, active: bool) -> float:
+        polls, seconds = (self.active_polls, self.active_sec) if active else (self.idle_polls, self.idle_sec)
+        return polls / seconds if seconds else 0.0
+
+
+@dataclass
+class DeviceLoopStats:
+    """Cadence counters of one device polling task"""
+    ticks: int = 0
+    overruns: int = 0  # ticks whose deadline passed before the previous tick finished
+    skipped_ticks: int = 0  # deadlines dropped by the catch-up policy
+    restarts: int = 0  # times the supervisor restarted a crashed task
+    last_tick_ms: float = 0.0
+    max_tick_ms: float = 0.0
+    last_lag_ms: float = 0.0  # tick jitter: actual start vs. absolute deadline
+    max_lag_ms: float = 0.0
+    total_lag_ms: float = 0.0
+    first_tick_at: Optional[float] = None  # monotonic
+    last_tick_at: Optional[float] = None
+
+    @property
+    def mean_lag_ms(self) -> float:
+        return self.total_lag_ms / self.ticks if self.ticks else 0.0
+
+    @property
+    def effective_hz(self) -> float:
+        """Achieved sample rate since the task started"""
+        if self.ticks < 2 or self.last_tick_at == self.first_tick_at:
+            return 0.0
+        return (self.ticks - 1) / (self.last_tick_at - self.first_tick_at)
+
+
 # ----------------------------
 # HELPER FUNCTIONS
 # ----------------------------
@@ -142,29 +323,65 @@ def determine_quality(max_th: int, max_side: int, cycle_type: str = "COMPLETE")
     return "DEFECTIVE"
 
 
+def active_samples(count: int) -> int:
+    """A sample-count tunable (calibrated at POLL_INTERVAL_SEC) at the active polling rate"""
+    return max(count, round(count * POLL_INTERVAL_SEC / POLL_ACTIVE_INTERVAL_SEC))
+
+
+def find_peaks(x, **kwargs):
+    """scipy.signal.find_peaks, imported on first use.
+
+    scipy.signal takes about a second to import and is only needed when a
+    cycle ends, so it is kept off the startup path (see preload_scipy).
+    """
+    from scipy.signal import find_peaks as scipy_find_peaks
+
+    return scipy_find_peaks(x, **kwargs)
+
+
+async def preload_scipy():
+    """Import scipy.signal in a worker thread so the first cycle end doesn't stall the event loop on it"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(importlib.import_module, "scipy.signal")
+        logger.debug(f"scipy.signal loaded in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not preload scipy.signal: {e}")
+
+
 def extract_machine_id(name: str) -> int:
     # Extract digits from "mc2", "machine_5", etc.
     digits = "".join(filter(str.isdigit, name))
     return int(digits) if digits else 0
 
 
-async def maybe_await(obj):
-    """Await obj if it's awaitable (coroutine or Future). Otherwise return immediately."""
-    try:
-        if asyncio.iscoroutine(obj) or asyncio.isfuture(obj):
-            await obj
-    except Exception:
-        # best-effort: if awaiting fails, ignore to avoid blocking shutdown
-        pass
-
-
 # ----------------------------
 # MYSQL DATABASE MANAGER
 # ----------------------------
 class DatabaseManager:
+    # `ins_dwp_counts` columns written per cycle, in build_cycle_row order
+    CYCLE_COLUMNS = (
+        "cycle_uid", "line", "mechine", "count", "incremental", "position", "pv", "duration", "std_error",
+        "grade", "cycle_type", "th_ok", "side_ok", *FEATURE_COLUMNS, "created_at", "updated_at",
+    )
+
     def __init__(self, config: dict):
         self.config = config
         self.pool: Optional[aiomysql.Pool] = None
+        # Last `count` written per line. Only the cycle writer task inserts
+        # cycles, so numbering in-process is race-free; entries are dropped
+        # after a failed write and re-read from the table on the next batch.
+        self.line_counts: Dict[str, int] = {}
+        # Device ids known to exist in ins_dwp_devices (log_dwp_uptime has a
+        # foreign key on them), refreshed whenever devices are loaded
+        self.known_devices: Set[int] = set()
+        self.missing_devices: Set[int] = set()  # already reported as missing
+        self.last_error: Optional[str] = None  # of the last failed save_cycles
+        self.rollups_enabled = ROLLUPS_ENABLED
+
+    def set_known_devices(self, device_ids):
+        self.known_devices = set(device_ids)
+        self.missing_devices.clear()
 
     async def connect(self):
         self.pool = await aiomysql.create_pool(**self.config)
@@ -176,141 +393,341 @@ class DatabaseManager:
             await self.pool.wait_closed()
             logger.info("👋 MySQL pool closed")
 
-    async def log_device_status(
-        self,
-        device_id: int,
-        status: str,
-        message: str = None,
-        duration_seconds: int = None
-    ) -> bool:
-        """
-        Log device connection status changes
-        status: 'online', 'offline', 'timeout'
+    async def check_rollups_table(self):
+        """Turn rollups off if ins_dwp_rollups doesn't exist: every cycle write would fail on the upsert"""
+        if not self.rollups_enabled or not self.pool:
+            return
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SHOW TABLES LIKE 'ins_dwp_rollups'")
+                    exists = await cur.fetchone() is not None
+        except Exception as e:
+            logger.warning(f"⚠️ Could not check for ins_dwp_rollups: {e}")
+            return
+        if not exists:
+            self.disable_rollups()
+
+    def disable_rollups(self):
+        self.rollups_enabled = False
+        logger.error(
+            "❌ Table ins_dwp_rollups does not exist — rollups disabled. Run `php artisan migrate`, "
+            "restart the poller, then rebuild the gap with backfill_rollups.py"
+        )
+
+    async def upsert_rollups(self, cur, rollup: RollupAggregator):
+        try:
+            await upsert_rollups(cur, rollup)
+        except aiomysql.ProgrammingError as e:
+            # Dropped while running: keep the cycles (the INSERT stands), lose the rollups
+            if e.args[0] != ER.NO_SUCH_TABLE:
+                raise
+            self.disable_rollups()
+
+    async def ping(self) -> bool:
+        """True if MySQL answers a trivial query"""
+        if not self.pool:
+            return False
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    async def save_device_statuses(self, rows: List[StatusRow]) -> Optional[int]:
+        """Insert device status transitions with a single multi-row INSERT.
+
+        Rows for devices that are not in ins_dwp_devices are skipped. Returns
+        the number of rows inserted, or None on failure.
         """
         if not self.pool:
             logger.error("❌ DB pool not initialized")
-            return False
+            return None
 
         try:
             async with self.pool.acquire() as conn:
                 async with conn.cursor() as cur:
-                    # First check if device exists
-                    await cur.execute(
-                        "SELECT id FROM ins_dwp_devices WHERE id = %s",
-                        (device_id,)
-                    )
-                    device_exists = await cur.fetchone()
-                    
-                    if not device_exists:
-                        logger.error(
-                            f"❌ Cannot log status: Device ID {device_id} does not exist in ins_dwp_devices table. "
-                            f"Please add the device first or run: php artisan db:seed --class=InsDwpDeviceSeeder"
+                    # Devices loaded from the table are known to exist; only
+                    # others (fallback config, removed devices) are looked up
+                    unknown = sorted({row[0] for row in rows} - self.known_devices)
+                    if unknown:
+                        await cur.execute(
+                            f"SELECT id FROM ins_dwp_devices WHERE id IN ({', '.join(['%s'] * len(unknown))})",
+                            unknown,
                         )
-                        return False
-                    
-                    # Device exists, insert log
+                        self.known_devices.update(row[0] for row in await cur.fetchall())
+                        for device_id in unknown:
+                            if device_id not in self.known_devices and device_id not in self.missing_devices:
+                                self.missing_devices.add(device_id)
+                                logger.error(
+                                    f"❌ Cannot log status: Device ID {device_id} does not exist in ins_dwp_devices table. "
+                                    f"Please add the device first or run: php artisan db:seed --class=InsDwpDeviceSeeder"
+                                )
+                    rows = [row for row in rows if row[0] in self.known_devices]
+                    if not rows:
+                        return 0
+
+                    # logged_at is the transition time, not the (later) write time
+                    placeholders = ", ".join(["(%s, %s, FROM_UNIXTIME(%s), %s, %s, NOW(), NOW())"] * len(rows))
                     await cur.execute(
-                        """
+                        f"""
                         INSERT INTO `log_dwp_uptime` (
-                            `ins_dwp_device_id`, `status`, `logged_at`, 
+                            `ins_dwp_device_id`, `status`, `logged_at`,
                             `message`, `duration_seconds`, `created_at`, `updated_at`
-                        ) VALUES (%s, %s, NOW(), %s, %s, NOW(), NOW())
-                        """,
-                        (device_id, status, message, duration_seconds),
+                        ) VALUES {placeholders}
+                    """,
+                        [
+                            value
+                            for device_id, status, message, duration_seconds, logged_at in rows
+                            for value in (device_id, status, logged_at, message, duration_seconds)
+                        ],
                     )
-                    logger.info(f"📝 Device {device_id} status logged: {status}")
-                    return True
+                    return len(rows)
         except Exception as e:
             logger.error(f"❌ Failed to log device status: {e}")
-            return False
+            # A device may have been deleted since it was validated
+            self.known_devices.clear()
+            return None
+
+    def build_cycle_row(self, cycle_data: dict, count: int) -> tuple:
+        """Column values of one `ins_dwp_counts` row"""
+        pv_data = encode_pv(
+            cycle_data["th_waveform"],
+            cycle_data["side_waveform"],
+            cycle_data.get("timestamps"),
+            {
+                "grade": cycle_data["quality_grade"],
+                "peaks": {
+                    "th": cycle_data["max_th"],
+                    "side": cycle_data["max_side"],
+                },
+                "cycle_type": cycle_data["cycle_type"],
+                "sample_count": cycle_data["sample_count"],
+            },
+            PV_FORMAT_VERSION,
+        )
+        std_error = [
+            [1 if GOOD_MIN <= cycle_data["max_th"] <= GOOD_MAX else 0],
+            [1 if GOOD_MIN <= cycle_data["max_side"] <= GOOD_MAX else 0],
+        ]
+        # Typed copies of the grade and flags plus the feature vector, so
+        # reports can filter and aggregate on indexed columns instead of JSON
+        features = cycle_features(
+            cycle_data["th_waveform"], cycle_data["side_waveform"], cycle_data.get("timestamps"), FEATURE_DWELL_LEVEL
+        )
+        recorded_at = cycle_data.get("recorded_at") or time.time()
+        return (
+            cycle_data.get("cycle_uid"),
+            cycle_data["line"],
+            cycle_data["machine"],
+            count,
+            1,  # incremental
+            cycle_data["position"],
+            json.dumps(pv_data, separators=(",", ":")),
+            cycle_data.get("duration_s", None),  # stored in seconds
+            json.dumps(std_error, separators=(",", ":")),
+            cycle_data["quality_grade"],
+            cycle_data["cycle_type"],
+            std_error[0][0],
+            std_error[1][0],
+            *astuple(features),
+            recorded_at,
+            recorded_at,
+        )
+
+    async def fetch_last_count(self, cur, line: str) -> int:
+        await cur.execute(
+            "SELECT `count` FROM `ins_dwp_counts` WHERE `line` = %s ORDER BY `id` DESC LIMIT 1",
+            (line,),
+        )
+        result = await cur.fetchone()
+        return result[0] if result else 0
+
+    async def seed_line_counts(self, lines: List[str]):
+        """Read the last count of every polled line once, at startup"""
+        if not self.pool:
+            logger.error("❌ DB pool not initialized")
+            return
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    for line in lines:
+                        self.line_counts[line] = await self.fetch_last_count(cur, line)
+            logger.info(f"🔢 Seeded cycle counters for {len(lines)} line(s)")
+        except Exception as e:
+            logger.error(f"❌ Failed to seed cycle counters: {e}")
 
     async def save_cycle(self, cycle_data: dict) -> bool:
+        return await self.save_cycles([cycle_data]) is not None
+
+    async def save_cycles(self, cycles: List[dict], dedupe: bool = False) -> Optional[int]:
+        """Insert cycles with a single multi-row INSERT.
+
+        Returns the number of rows inserted, or None on failure. With `dedupe`,
+        cycles whose `cycle_uid` is already stored are skipped (spool replays).
+        Without it, the duplicate-key clause keeps a replayed cycle out of
+        ins_dwp_counts but not out of the rollup deltas, so a batch that
+        turns out to hold stored cycles is rolled back and redone with dedupe.
+        """
         if not self.pool:
             logger.error("❌ DB pool not initialized")
-            return False
+            return None
 
         try:
             async with self.pool.acquire() as conn:
                 async with conn.cursor() as cur:
-                    # Get last count for line
-                    await cur.execute(
-                        "SELECT `count` FROM `ins_dwp_counts` WHERE `line` = %s ORDER BY `id` DESC LIMIT 1",
-                        (cycle_data["line"],),
+                    if dedupe:
+                        uids = [c["cycle_uid"] for c in cycles if c.get("cycle_uid")]
+                        if uids:
+                            await cur.execute(
+                                f"SELECT `cycle_uid` FROM `ins_dwp_counts` WHERE `cycle_uid` IN ({', '.join(['%s'] * len(uids))})",
+                                uids,
+                            )
+                            existing = {row[0] for row in await cur.fetchall()}
+                            cycles = [c for c in cycles if c.get("cycle_uid") not in existing]
+                    if not cycles:
+                        return 0
+
+                    # Number the batch from the cached counters; the cache only
+                    # advances once the INSERT succeeded
+                    last_counts: Dict[str, int] = {}
+                    rows = []
+                    for cycle_data in cycles:
+                        line = cycle_data["line"]
+                        if line not in last_counts:
+                            if line not in self.line_counts:
+                                self.line_counts[line] = await self.fetch_last_count(cur, line)
+                            last_counts[line] = self.line_counts[line]
+                        last_counts[line] += 1
+                        rows.append(self.build_cycle_row(cycle_data, last_counts[line]))
+
+                    # created_at/updated_at come from the spool time via FROM_UNIXTIME,
+                    # so they follow the session time zone exactly like NOW() did.
+                    # The duplicate-key clause makes a replay that races a lost ack harmless.
+                    row_placeholder = "(" + ", ".join(["%s"] * (len(self.CYCLE_COLUMNS) - 2)) + (
+                        ", FROM_UNIXTIME(%s), FROM_UNIXTIME(%s))"
                     )
-                    result = await cur.fetchone()
-                    new_count = (result[0] if result else 0) + 1
-
-                    # Build JSON fields
-                    pv_data = {
-                        "waveforms": [
-                            cycle_data["th_waveform"],
-                            cycle_data["side_waveform"],
-                        ],
-                        # optional per-sample timestamps (epoch ms)
-                        **({"timestamps": cycle_data.get("timestamps")} if cycle_data.get("timestamps") is not None else {}),
-                        "quality": {
-                            "grade": cycle_data["quality_grade"],
-                            "peaks": {
-                                "th": cycle_data["max_th"],
-                                "side": cycle_data["max_side"],
-                            },
-                            "cycle_type": cycle_data["cycle_type"],
-                            "sample_count": cycle_data["sample_count"],
-                        },
-                    }
-                    std_error = [
-                        [1 if GOOD_MIN <= cycle_data["max_th"] <= GOOD_MAX else 0],
-                        [1 if GOOD_MIN <= cycle_data["max_side"] <= GOOD_MAX else 0],
-                    ]
-
-                    # ✅ INSERT WITHOUT created_at/updated_at — let MySQL auto-fill!
-                    await cur.execute(
-                        """
-                        INSERT INTO `ins_dwp_counts` (
-                            `line`, `mechine`, `count`, `incremental`, `position`,
-                            `pv`, `duration`, `std_error`
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                        (
-                            cycle_data["line"],
-                            cycle_data["machine"],
-                            new_count,
-                            1,  # incremental
-                            cycle_data["position"],
-                            json.dumps(pv_data, separators=(",", ":")),
-                            cycle_data.get("duration_s", None),  # stored in seconds
-                            json.dumps(std_error, separators=(",", ":")),
-                        ),
-                    )
-                    return True
+                    rollup = RollupAggregator(SHIFT_START_HOURS)
+                    if self.rollups_enabled:
+                        for row in rows:
+                            rollup.add(dict(zip(self.CYCLE_COLUMNS, row)))
+                    # The cycles and their rollup deltas commit together
+                    await conn.begin()
+                    try:
+                        await cur.execute(
+                            f"""
+                            INSERT INTO `ins_dwp_counts` (
+                                {", ".join(f"`{column}`" for column in self.CYCLE_COLUMNS)}
+                            ) VALUES {", ".join([row_placeholder] * len(rows))}
+                            ON DUPLICATE KEY UPDATE `id` = `id`
+                        """,
+                            [value for row in rows for value in row],
+                        )
+                        # Duplicates affect 0 rows: this is a replay whose ack was lost
+                        replayed = len(rows) - cur.rowcount if self.rollups_enabled and not dedupe else 0
+                        if not replayed:
+                            await self.upsert_rollups(cur, rollup)
+                            await conn.commit()
+                    except Exception:
+                        with contextlib.suppress(Exception):
+                            await conn.rollback()
+                        raise
+                    if replayed:
+                        await conn.rollback()
+                        logger.info(f"🔁 {replayed} cycle(s) of the batch already stored — redoing it without them")
+                        return await self.save_cycles(cycles, dedupe=True)
+                    self.line_counts.update(last_counts)
+                    return len(rows)
         except Exception as e:
             logger.error(f"❌ DB save failed: {e}")
-            return False
+            self.last_error = str(e)
+            # The INSERT may or may not have landed: reconcile these lines
+            # against the table once the connection is back
+            for cycle_data in cycles:
+                self.line_counts.pop(cycle_data["line"], None)
+            return None
 
 
 # ----------------------------
 # MAIN POLLER CLASS
 # ----------------------------
 class DWPPoller:
-    def __init__(self, poll_only_machine: Optional[str] = None):
-        """poll_only_machine: if set (e.g. 'mc1'), only poll that machine across all lines/devices."""
+    def __init__(
+        self,
+        poll_only_machine: Optional[str] = None,
+        cycle_writer=None,
+        clock: Callable[[], float] = time.time,
+        capture_dir: Optional[str] = None,
+        metrics_port: int = METRICS_PORT,
+        shard: Optional[Tuple[int, int]] = None,
+        live_port: int = LIVE_PORT,
+    ):
+        """poll_only_machine: if set (e.g. 'mc1'), only poll that machine across all lines/devices.
+        cycle_writer: anything with `async save_cycle(cycle_data) -> bool`; defaults to the
+        spooling MySQL writer (replay.py passes its own sink).
+        clock: epoch-seconds source for the cycle state machine (replay drives it from recorded timestamps).
+        capture_dir: if set, record every raw block read there (see capture.py).
+        metrics_port: serve Prometheus metrics on this port (0 = don't serve; metrics are still kept).
+        shard: (index, count) when running as one shard of a supervisor (see shard.py).
+        live_port: serve live events for dashboards on this port (0 = don't serve)."""
         self.devices: Dict[int, DeviceConfig] = {}
-        self.clients: Dict[int, AsyncModbusTcpClient] = {}
-        self.cycle_states: Dict[str, dict] = {}
+        self.connections: Dict[int, DeviceConnection] = {}
+        # Compiled block reads per device: {device_id: [ReadBlock, ...]}
+        self.read_plans: Dict[int, List[ReadBlock]] = {}
+        self.read_groups: Dict[int, List[ReadGroup]] = {}
+        self.cycle_states: Dict[str, CycleState] = {}
+        self.shard = shard
+        if shard is not None:
+            capture_dir = capture_dir and os.path.join(capture_dir, f"shard-{shard[0]}")
         self.db = DatabaseManager(DB_CONFIG)
+        self.cycle_writer = cycle_writer or CycleWriter(
+            self.db,
+            shard_path(CYCLE_SPOOL_PATH, shard[0]) if shard is not None else CYCLE_SPOOL_PATH,
+            CYCLE_WRITE_BATCH_SIZE,
+            CYCLE_WRITE_FLUSH_SEC,
+            CYCLE_WRITE_RETRY_SEC,
+            CYCLE_SPOOL_SYNCHRONOUS,
+            CYCLE_WRITE_MAX_ATTEMPTS,
+        )
+        self.status_writer = StatusWriter(
+            self.db, STATUS_WRITE_BATCH_SIZE, STATUS_WRITE_FLUSH_SEC, STATUS_WRITE_RETRY_SEC, STATUS_QUEUE_MAX
+        )
+        self.clock = clock
+        self.capture_dir = capture_dir
+        self.capture: Optional[CaptureLog] = None
+        self.metrics = PollerMetrics()
+        self.metrics.registry.add_collector(self.collect_metrics)
+        if isinstance(self.cycle_writer, CycleWriter):
+            self.cycle_writer.on_flush = self.metrics.db_flush.observe
+        self.metrics_port = metrics_port
+        self.metrics_server: Optional[MetricsServer] = None
+        self.live = LiveHub(LIVE_CLIENT_QUEUE_MAX, LIVE_VALUES_INTERVAL_SEC)
+        self.live_port = live_port
+        self.live_server: Optional[LiveServer] = None
         self.running = True
         self.shutdown_event = asyncio.Event()
+        self.reload_requested = asyncio.Event()
         # optional: only poll a single machine name (e.g., 'mc1')
         self.poll_only_machine: Optional[str] = poll_only_machine
         # Track device connection states
         self.device_states: Dict[int, dict] = {}  # {device_id: {'status': str, 'last_change': float, 'last_successful_read': float}}
-
-    async def load_devices(self):
-        """Load active devices from database"""
-        if not self.db.pool:
-            logger.error("❌ DB pool not initialized, cannot load devices")
-            return
-
+        # One polling task per device, supervised by poll_loop
+        self.device_tasks: Dict[int, asyncio.Task] = {}
+        self.device_loop_stats: Dict[int, DeviceLoopStats] = {}
+        self.reported_overruns: Dict[int, int] = {}
+        # Sharded mode: shard index of every configured line, as of the last device read
+        self.line_shards: Dict[str, int] = {}
+        self.devices_read_at = 0.0  # epoch
+        # Devices waiting for another shard to hand over their lines → time of that reload
+        self.awaiting_handoff: Dict[int, float] = {}
+        self.handoff_tasks: Set[asyncio.Task] = set()
+
+    async def fetch_devices(self) -> Optional[Dict[int, DeviceConfig]]:
+        """Read and parse the active devices, or None if the query failed"""
+        devices: Dict[int, DeviceConfig] = {}
+        read_at = time.time()
         try:
             async with self.db.pool.acquire() as conn:
                 async with conn.cursor(aiomysql.DictCursor) as cur:
@@ -318,59 +735,63 @@ class DWPPoller:
                         "SELECT id, name, ip_address, config FROM ins_dwp_devices WHERE is_active = 1"
                     )
                     rows = await cur.fetchall()
+            self.devices_read_at = read_at
+        except Exception as e:
+            logger.error(f"❌ Failed to load devices from database: {e}")
+            return None
+
+        self.db.set_known_devices(row['id'] for row in rows)
+        for row in rows:
+            try:
+                config = json.loads(row['config']) if isinstance(row['config'], str) else row['config']
+                
+                # Parse config to extract lines and machines
+                lines = {}
+                for line_config in config:
+                    line_name = line_config.get('line', '').upper()
+                    machines = []
                     
-                    if not rows:
-                        logger.warning("⚠️ No active devices found in database!")
-                        logger.info("💡 To add a device, run: php artisan db:seed --class=InsDwpDeviceSeeder")
-                        return
+                    # Handle different config formats
+                    machine_list = line_config.get('list_mechine', line_config.get('machines', []))
                     
-                    for row in rows:
-                        try:
-                            config = json.loads(row['config']) if isinstance(row['config'], str) else row['config']
-                            
-                            # Parse config to extract lines and machines
-                            lines = {}
-                            for line_config in config:
-                                line_name = line_config.get('line', '').upper()
-                                machines = []
-                                
-                                # Handle different config formats
-                                machine_list = line_config.get('list_mechine', line_config.get('machines', []))
-                                
-                                for machine in machine_list:
-                                    machines.append(MachineConfig(
-                                        name=machine.get('name', ''),
-                                        addr_th_l=int(machine.get('addr_th_l', 0)),
-                                        addr_th_r=int(machine.get('addr_th_r', 0)),
-                                        addr_side_l=int(machine.get('addr_side_l', 0)),
-                                        addr_side_r=int(machine.get('addr_side_r', 0)),
-                                    ))
-                                
-                                if machines:
-                                    lines[line_name] = machines
-                            
-                            if lines:
-                                self.devices[row['id']] = DeviceConfig(
-                                    id=row['id'],
-                                    name=row['name'],
-                                    ip=row['ip_address'],
-                                    lines=lines
-                                )
-                                logger.info(f"✅ Loaded device: {row['name']} (ID: {row['id']}) at {row['ip_address']}")
-                            else:
-                                logger.warning(f"⚠️ Device {row['name']} has no valid machine configuration")
-                        
-                        except Exception as e:
-                            logger.error(f"❌ Failed to parse device {row.get('name', 'unknown')}: {e}")
-                            continue
+                    for machine in machine_list:
+                        machines.append(MachineConfig(
+                            name=machine.get('name', ''),
+                            addr_th_l=int(machine.get('addr_th_l', 0)),
+                            addr_th_r=int(machine.get('addr_th_r', 0)),
+                            addr_side_l=int(machine.get('addr_side_l', 0)),
+                            addr_side_r=int(machine.get('addr_side_r', 0)),
+                        ))
                     
-                    logger.info(f"✅ Loaded {len(self.devices)} active device(s)")
-        
-        except Exception as e:
-            logger.error(f"❌ Failed to load devices from database: {e}")
+                    if machines:
+                        lines[line_name] = machines
+                
+                if lines:
+                    devices[row['id']] = DeviceConfig(
+                        id=row['id'],
+                        name=row['name'],
+                        ip=row['ip_address'],
+                        lines=lines
+                    )
+                else:
+                    logger.warning(f"⚠️ Device {row['name']} has no valid machine configuration")
+            
+            except Exception as e:
+                logger.error(f"❌ Failed to parse device {row.get('name', 'unknown')}: {e}")
+                continue
+        return devices
+
+    async def load_devices(self):
+        """Load active devices from database"""
+        if not self.db.pool:
+            logger.error("❌ DB pool not initialized, cannot load devices")
+            return
+
+        devices = await self.fetch_devices()
+        if devices is None:
             # Fallback to example config if database fails
             logger.warning("⚠️ Using fallback configuration")
-            self.devices = {
+            self.devices = self.shard_devices({
                 1: DeviceConfig(
                     id=1,
                     name="Press-G5",
@@ -384,10 +805,248 @@ class DWPPoller:
                         ]
                     },
                 )
-            }
+            })
             logger.info(f"✅ Loaded {len(self.devices)} device(s) from fallback")
+            self.build_read_plans()
+            return
 
-    async def update_device_state(self, dev_id: int, new_status: str, message: str = None):
+        if not devices:
+            logger.warning("⚠️ No active devices found in database!")
+            logger.info("💡 To add a device, run: php artisan db:seed --class=InsDwpDeviceSeeder")
+            return
+        for dev in devices.values():
+            logger.info(f"✅ Loaded device: {dev.name} (ID: {dev.id}) at {dev.ip}")
+        logger.info(f"✅ Loaded {len(devices)} active device(s)")
+        self.devices = self.shard_devices(devices)
+        self.build_read_plans()
+
+    async def reload_devices(self):
+        """Apply the current ins_dwp_devices rows to the running poller.
+
+        Added devices get a client, read plan and polling task; removed devices
+        are stopped and closed. Everything else keeps its connection and every
+        position whose device and registers are unchanged keeps its cycle state.
+        """
+        if not self.db.pool:
+            return
+        previous_shards, previous_read_at = self.line_shards, self.devices_read_at
+        devices = await self.fetch_devices()
+        if devices is None:
+            logger.warning("⚠️ Device reload failed — keeping the current configuration")
+            return
+        devices = self.shard_devices(devices, quiet=True)
+
+        old_devices = self.devices
+        added = sorted(devices.keys() - old_devices.keys())
+        removed = sorted(old_devices.keys() - devices.keys())
+        changed = sorted(
+            dev_id for dev_id in devices.keys() & old_devices.keys() if devices[dev_id] != old_devices[dev_id]
+        )
+        if not (added or removed or changed):
+            return
+        logger.info(f"🔃 Device config changed | added {added} | removed {removed} | changed {changed}")
+
+        # Positions that now read other registers (or are gone) lose their running cycle
+        old_positions = self.position_sources(old_devices)
+        new_positions = self.position_sources(devices)
+        for key, source in old_positions.items():
+            if new_positions.get(key) == source:
+                continue
+            state = self.cycle_states.pop(key, None)
+            if state is not None and state.state == "active":
+                logger.warning(f"⚠️ Dropping in-flight cycle of {key} ({state.length} samples): position reconfigured")
+
+        # Lines another shard polled until now: their devices wait for it to let go
+        old_lines = {line for dev in old_devices.values() for line in dev.lines}
+        new_lines = {line for dev in devices.values() for line in dev.lines}
+        index = self.shard[0] if self.shard is not None else None
+        adopted = {
+            line: previous_shards[line] for line in new_lines - old_lines if previous_shards.get(line, index) != index
+        }
+        waiting = [dev_id for dev_id in added + changed if not adopted.keys().isdisjoint(devices[dev_id].lines)]
+
+        reconnect = [
+            dev_id for dev_id in changed if devices[dev_id].ip != old_devices[dev_id].ip or dev_id in waiting
+        ]
+        for dev_id in removed + reconnect:
+            await self.stop_device(dev_id)
+        for dev_id in removed:
+            self.awaiting_handoff.pop(dev_id, None)
+            self.read_plans.pop(dev_id, None)
+            self.device_loop_stats.pop(dev_id, None)
+            self.reported_overruns.pop(dev_id, None)
+            if self.device_states.pop(dev_id, None) is not None:
+                self.status_writer.log(dev_id, 'offline', "Removed from poller configuration")
+                self.live.publish(
+                    "status", {"device": dev_id, "status": "removed", "since": time.time()}, old_devices[dev_id].lines,
+                    coalesce=dev_id,
+                )
+            logger.info(f"➖ Stopped polling {old_devices[dev_id].name} (ID:{dev_id})")
+
+        # Lines now polled by another shard: write out their spooled cycles before it
+        # takes over, so it numbers on from the last cycle in MySQL
+        released = sorted(old_lines - new_lines)
+        if released and self.shard is not None:
+            if await self.cycle_writer.release_lines(released):
+                logger.info(f"🤝 Handed over line(s) {released}")
+            else:
+                logger.warning(
+                    f"⚠️ Handing over line(s) {released} with cycles still spooled — "
+                    f"the new shard waits for them (up to {SHARD_HANDOFF_TIMEOUT_SEC:g}s)"
+                )
+        for line in old_lines ^ new_lines:
+            self.db.line_counts.pop(line, None)
+
+        self.devices = devices
+        for dev_id in added + changed:
+            self.build_read_plan(dev_id, devices[dev_id])
+        self.write_capture_layout()
+        if waiting:
+            for dev_id in waiting:
+                self.awaiting_handoff[dev_id] = previous_read_at
+            task = asyncio.create_task(self.adopt_devices(adopted, previous_read_at), name="dwp-shard-handoff")
+            self.handoff_tasks.add(task)
+            task.add_done_callback(self.handoff_tasks.discard)
+        await self.connect_clients([dev_id for dev_id in added + reconnect if dev_id not in self.awaiting_handoff])
+        # poll_loop starts tasks for the new and reconnected devices
+
+    async def adopt_devices(self, owners: Dict[str, int], since: float):
+        """Start polling the devices of lines taken over from other shards (line → previous
+        shard) once every previous owner has released its lines after `since` (epoch)"""
+        pending = dict(owners)
+        logger.info(f"🤝 Waiting for shard(s) {sorted(set(pending.values()))} to hand over line(s) {sorted(pending)}")
+        deadline = time.monotonic() + SHARD_HANDOFF_TIMEOUT_SEC
+        while True:
+            for line, shard in list(pending.items()):
+                if line_released(shard_path(CYCLE_SPOOL_PATH, shard), line, since):
+                    del pending[line]
+            if not pending:
+                logger.info(f"🤝 Took over line(s) {sorted(owners)}")
+                break
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    f"⚠️ Line(s) {sorted(pending)} not handed over in {SHARD_HANDOFF_TIMEOUT_SEC:g}s — "
+                    f"polling them anyway; their cycle numbers may repeat"
+                )
+                break
+            await asyncio.sleep(SHARD_HANDOFF_CHECK_SEC)
+
+        dev_ids = [dev_id for dev_id, read_at in self.awaiting_handoff.items() if read_at == since]
+        for dev_id in dev_ids:
+            del self.awaiting_handoff[dev_id]
+        # Number on from whatever the previous owner wrote
+        for line in owners:
+            self.db.line_counts.pop(line, None)
+        await self.connect_clients(dev_ids)
+
+    def position_sources(self, devices: Dict[int, DeviceConfig]) -> Dict[str, Tuple[int, int, int]]:
+        """Cycle state key → (device id, TH register, SIDE register) of every polled position"""
+        sources = {}
+        for dev_id, dev in devices.items():
+            for line, machine in self.polled_machines(dev):
+                sources[f"{line}-{machine.name}-L"] = (dev_id, machine.addr_th_l, machine.addr_side_l)
+                sources[f"{line}-{machine.name}-R"] = (dev_id, machine.addr_th_r, machine.addr_side_r)
+        return sources
+
+    async def stop_device(self, dev_id: int):
+        """Cancel a device's polling task and close its client"""
+        task = self.device_tasks.pop(dev_id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        connection = self.connections.pop(dev_id, None)
+        if connection is not None:
+            await connection.close()
+
+    async def watch_device_config(self):
+        """Reload devices every DEVICE_RELOAD_INTERVAL_SEC and on SIGHUP"""
+        if DEVICE_RELOAD_INTERVAL_SEC > 0:
+            logger.info(
+                f"🔃 Device config reload every {DEVICE_RELOAD_INTERVAL_SEC:g}s"
+                + (" (and on SIGHUP)" if hasattr(signal, "SIGHUP") else "")
+            )
+        while self.running:
+            waiters = [
+                asyncio.ensure_future(self.reload_requested.wait()),
+                asyncio.ensure_future(self.shutdown_event.wait()),
+            ]
+            try:
+                await asyncio.wait(
+                    waiters,
+                    timeout=DEVICE_RELOAD_INTERVAL_SEC if DEVICE_RELOAD_INTERVAL_SEC > 0 else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+            self.reload_requested.clear()
+            if not self.running:
+                break
+            try:
+                await self.reload_devices()
+            except Exception as e:
+                logger.error(f"❌ Device config reload failed: {e}")
+
+    def polled_machines(self, dev: DeviceConfig) -> List[Tuple[str, MachineConfig]]:
+        """(line, machine) pairs polled on a device, honouring poll_only_machine"""
+        return [
+            (line, machine)
+            for line, machines in dev.lines.items()
+            for machine in machines
+            if not self.poll_only_machine or machine.name == self.poll_only_machine
+        ]
+
+    def shard_devices(self, devices: Dict[int, DeviceConfig], quiet: bool = False) -> Dict[int, DeviceConfig]:
+        """In sharded mode, keep only the devices assigned to this shard"""
+        if self.shard is None:
+            return devices
+        index, count = self.shard
+        assignment = assign_shards({dev_id: dev.lines.keys() for dev_id, dev in devices.items()}, count)
+        self.line_shards = {line: assignment[dev_id] for dev_id, dev in devices.items() for line in dev.lines}
+        devices = {dev_id: dev for dev_id, dev in devices.items() if assignment[dev_id] == index}
+        if not quiet:
+            logger.info(
+                f"🧩 Shard {index}/{count}: polling {len(devices)} device(s) "
+                f"{sorted(devices) if devices else ''}"
+            )
+        return devices
+
+    def build_read_plans(self):
+        """Compile every device's machine registers into coalesced block reads"""
+        self.read_plans = {}
+        self.read_groups = {}
+        for dev_id, dev in self.devices.items():
+            self.build_read_plan(dev_id, dev)
+        self.write_capture_layout()
+
+    def build_read_plan(self, dev_id: int, dev: DeviceConfig):
+        machines = self.polled_machines(dev)
+        registers = [
+            (machine.addr_th_l, machine.addr_th_r, machine.addr_side_l, machine.addr_side_r)
+            for _, machine in machines
+        ]
+        plan = compile_read_plan([a for regs in registers for a in regs], READ_PLAN_ROUND_TRIP_COST)
+        self.read_plans[dev_id] = plan
+        self.read_groups[dev_id] = [
+            ReadGroup(
+                index,
+                [plan[b] for b in block_indices],
+                [machines[m] for m in machine_indices],
+                [f"{line}-{machine.name}-{pos}" for line, machine in (machines[m] for m in machine_indices) for pos in ("L", "R")],
+            )
+            for index, (block_indices, machine_indices) in enumerate(group_blocks(plan, registers))
+        ]
+        logger.info(
+            f"📦 Read plan for {dev.name}: {len(plan)} block(s) "
+            f"[{', '.join(str(block) for block in plan)}] for {sum(map(len, registers))} register(s)"
+            + (f" in {len(self.read_groups[dev_id])} read group(s)" if self.adaptive_polling else "")
+        )
+
+    def write_capture_layout(self):
+        if self.capture is not None:
+            self.capture.write_layout({dev_id: asdict(dev) for dev_id, dev in self.devices.items()})
+
+    def update_device_state(self, dev_id: int, new_status: str, message: str = None):
         """
         Update device connection state and log to database when status changes
         """
@@ -396,7 +1055,8 @@ class DWPPoller:
                 'status': new_status,
                 'last_change': time.time()
             }
-            await self.db.log_device_status(dev_id, new_status, message)
+            self.status_writer.log(dev_id, new_status, message)
+            self.publish_device_state(dev_id)
             return
 
         current_state = self.device_states[dev_id]
@@ -408,7 +1068,7 @@ class DWPPoller:
             duration_seconds = int(now - current_state['last_change'])
             
             # Log the new status with duration in previous state
-            await self.db.log_device_status(
+            self.status_writer.log(
                 dev_id, 
                 new_status, 
                 message, 
@@ -420,6 +1080,7 @@ class DWPPoller:
                 'status': new_status,
                 'last_change': now
             }
+            self.publish_device_state(dev_id)
             
             # Log status change
             logger.info(
@@ -427,39 +1088,74 @@ class DWPPoller:
                 f"(was {old_status} for {duration_seconds}s)"
             )
 
-    async def connect_clients(self):
-        for dev_id, dev in self.devices.items():
-            client = AsyncModbusTcpClient(
-                dev.ip, port=MODBUS_PORT, timeout=MODBUS_TIMEOUT_SEC
+    def device_state_event(self, dev_id: int) -> Tuple[str, dict, Optional[List[str]]]:
+        state = self.device_states[dev_id]
+        dev = self.devices.get(dev_id)
+        data = {"device": dev_id, "status": state['status'], "since": state['last_change']}
+        return "status", data, dev.lines if dev is not None else None
+
+    def publish_device_state(self, dev_id: int):
+        event, data, lines = self.device_state_event(dev_id)
+        self.live.publish(event, data, lines, coalesce=dev_id)
+
+    def live_snapshot(self) -> Snapshot:
+        """Sent to a dashboard when it connects: every device's current status"""
+        return [self.device_state_event(dev_id) for dev_id in self.device_states]
+
+    async def connect_clients(self, dev_ids: Optional[List[int]] = None):
+        """Connect devices (default: all) concurrently, at most CONNECT_CONCURRENCY at a time"""
+        dev_ids = list(self.devices) if dev_ids is None else dev_ids
+        semaphore = asyncio.Semaphore(max(1, CONNECT_CONCURRENCY))
+
+        async def connect(dev_id: int):
+            async with semaphore:
+                await self.connect_client(dev_id, self.devices[dev_id])
+
+        await asyncio.gather(*(connect(dev_id) for dev_id in dev_ids))
+
+    async def connect_client(self, dev_id: int, dev: DeviceConfig):
+        connection = self.connections[dev_id] = DeviceConnection(
+            f"{dev.name} ({dev.ip})",
+            lambda: AsyncModbusTcpClient(
+                dev.ip,
+                port=MODBUS_PORT,
+                timeout=MODBUS_TIMEOUT_SEC,
+                retries=MODBUS_RETRIES,
+                reconnect_delay=0,  # reconnects are DeviceConnection's job
+            ),
+            CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_OPEN_SEC, BREAKER_OPEN_MAX_SEC),
+            RECONNECT_BASE_SEC,
+            RECONNECT_MAX_SEC,
+        )
+        if await connection.connect():
+            # Initialize device state and log ONLINE
+            self.device_states[dev_id] = {
+                'status': 'online',
+                'last_change': time.time(),
+                'last_successful_read': time.time()
+            }
+            self.status_writer.log(
+                dev_id, 
+                'online', 
+                f"Successfully connected to {dev.name} at {dev.ip}"
             )
-            await client.connect()
-            if client.connected:
-                self.clients[dev_id] = client
-                # Initialize device state and log ONLINE
-                self.device_states[dev_id] = {
-                    'status': 'online',
-                    'last_change': time.time(),
-                    'last_successful_read': time.time()
-                }
-                await self.db.log_device_status(
-                    dev_id, 
-                    'online', 
-                    f"Successfully connected to {dev.name} at {dev.ip}"
-                )
-                logger.info(f"🔌 Connected to {dev.name} ({dev.ip})")
-            else:
-                # Initialize as offline and log
-                self.device_states[dev_id] = {
-                    'status': 'offline',
-                    'last_change': time.time(),
-                    'last_successful_read': None
-                }
-                await self.db.log_device_status(
-                    dev_id, 
-                    'offline', 
-                    f"Failed to connect to {dev.name} at {dev.ip}"
-                )
-                logger.error(f"❌ Failed to connect to {dev.name} ({dev.ip})")
+            self.publish_device_state(dev_id)
+            logger.info(f"🔌 Connected to {dev.name} ({dev.ip})")
+        else:
+            # Initialize as offline and log
+            self.device_states[dev_id] = {
+                'status': 'offline',
+                'last_change': time.time(),
+                'last_successful_read': None
+            }
+            self.status_writer.log(
+                dev_id, 
+                'offline', 
+                f"Failed to connect to {dev.name} at {dev.ip}"
+            )
+            self.publish_device_state(dev_id)
+            logger.error(f"❌ Failed to connect to {dev.name} ({dev.ip}) — retrying in the background")
+            connection.start_reconnect()
 
     async def read_registers(
         self, client: AsyncModbusTcpClient, addresses: List[int], dev_id: int = None
@@ -469,6 +1165,7 @@ class DWPPoller:
             count = max(addresses) - start_addr + 1
             # Try with 'unit' parameter (newer pymodbus 3.x)
             # If that fails, try without it (some versions don't need it)
+            sent = time.perf_counter()
             try:
                 response = await client.read_input_registers(
                     address=start_addr, count=count, unit=MODBUS_UNIT_ID
@@ -478,10 +1175,14 @@ class DWPPoller:
                 response = await client.read_input_registers(
                     address=start_addr, count=count
                 )
+            self.metrics.modbus_rtt.observe(time.perf_counter() - sent, dev_id or 0)
             
             if response.isError():
                 raise ModbusException(f"Modbus error: {response}")
 
+            if self.capture is not None:
+                self.capture.append(dev_id or 0, start_addr, response.registers)
+
             # Map back to requested addresses
             values = []
             for addr in addresses:
@@ -496,72 +1197,114 @@ class DWPPoller:
                 self.device_states[dev_id]['last_successful_read'] = time.time()
                 current_status = self.device_states[dev_id].get('status')
                 if current_status != 'online':
-                    await self.update_device_state(dev_id, 'online', 'Connection restored')
+                    self.update_device_state(dev_id, 'online', 'Connection restored')
             
             return values
         except Exception as e:
-            # Log timeout or error
-            if dev_id and dev_id in self.device_states:
+            if self.capture is not None and addresses:
+                self.capture.append(dev_id or 0, min(addresses), (), CAPTURE_READ_ERROR)
+            self.metrics.read_failures.inc(dev_id or 0, "timeout" if "timeout" in str(e).lower() else "error")
+            # Log timeout or error (a failed half-open probe leaves the device offline instead)
+            connection = self.connections.get(dev_id)
+            probing = connection is not None and connection.breaker.state == BREAKER_HALF_OPEN
+            if dev_id and dev_id in self.device_states and not probing:
                 if 'timeout' in str(e).lower():
-                    await self.update_device_state(dev_id, 'timeout', f"Modbus read timeout: {e}")
+                    self.update_device_state(dev_id, 'timeout', f"Modbus read timeout: {e}")
                 else:
-                    await self.update_device_state(dev_id, 'offline', f"Modbus read failed: {e}")
-            logger.error(f"Modbus read failed: {e}")
+                    self.update_device_state(dev_id, 'offline', f"Modbus read failed: {e}")
+            logger.error("Modbus read failed: %s", e, extra={"rate_key": f"modbus-read:{dev_id}"})
             raise
 
+    async def poll_device(
+        self, dev: DeviceConfig, client: AsyncModbusTcpClient, groups: Optional[List[ReadGroup]] = None
+    ) -> bool:
+        """Read a device's compiled blocks, then fan values out to every position.
+        With `groups`, only those read groups are polled. Returns False if a block read failed."""
+        if groups is None:
+            blocks = self.read_plans.get(dev.id, [])
+            machines = self.polled_machines(dev)
+        else:
+            # Ascending, as in a full poll (capture readers rely on it)
+            blocks = sorted((block for group in groups for block in group.blocks), key=lambda b: b.start)
+            machines = [machine for group in groups for machine in group.machines]
+        values: Dict[int, int] = {}
+        error: Optional[Exception] = None
+        for block in blocks:
+            try:
+                regs = await self.read_registers(client, list(block.addresses), dev.id)
+            except Exception as e:
+                # Gateway is failing: don't burn another timeout on the remaining blocks
+                error = e
+                break
+            values.update(zip(block.addresses, regs))
+
+        for line, machine in machines:
+            await self.poll_machine(line, machine, values, error)
+        return error is None
+
     async def poll_machine(
         self,
-        dev: DeviceConfig,
-        client: AsyncModbusTcpClient,
         line: str,
         machine: MachineConfig,
+        values: Dict[int, int],
+        error: Optional[Exception] = None,
     ):
         key_l = f"{line}-{machine.name}-L"
         key_r = f"{line}-{machine.name}-R"
 
-        addrs = [
-            machine.addr_th_l,
-            machine.addr_th_r,
-            machine.addr_side_l,
-            machine.addr_side_r,
-        ]
         try:
-            vals = await self.read_registers(client, addrs, dev.id)
-            th_l, th_r, side_l, side_r = vals
-        except Exception as e:
+            th_l = values[machine.addr_th_l]
+            th_r = values[machine.addr_th_r]
+            side_l = values[machine.addr_side_l]
+            side_r = values[machine.addr_side_r]
+        except KeyError:
             # Log potential data loss when read fails during active cycles
-            if key_l in self.cycle_states and self.cycle_states[key_l].get("state") == "active":
+            if key_l in self.cycle_states and self.cycle_states[key_l].state == "active":
                 logger.warning(
-                    f"⚠️ READ FAILED DURING ACTIVE CYCLE | {key_l} | "
-                    f"Current samples: {len(self.cycle_states[key_l].get('th_buf', []))} | "
-                    f"Error: {e}"
+                    "⚠️ READ FAILED DURING ACTIVE CYCLE | %s | Current samples: %d | Error: %s",
+                    key_l,
+                    self.cycle_states[key_l].length,
+                    error,
+                    extra={"rate_key": f"read-failed:{key_l}"},
                 )
-            if key_r in self.cycle_states and self.cycle_states[key_r].get("state") == "active":
+            if key_r in self.cycle_states and self.cycle_states[key_r].state == "active":
                 logger.warning(
-                    f"⚠️ READ FAILED DURING ACTIVE CYCLE | {key_r} | "
-                    f"Current samples: {len(self.cycle_states[key_r].get('th_buf', []))} | "
-                    f"Error: {e}"
+                    "⚠️ READ FAILED DURING ACTIVE CYCLE | %s | Current samples: %d | Error: %s",
+                    key_r,
+                    self.cycle_states[key_r].length,
+                    error,
+                    extra={"rate_key": f"read-failed:{key_r}"},
                 )
             return
 
+        live_key = f"{line}-{machine.name}"
+        if self.live.due(live_key):
+            self.live.publish(
+                "values",
+                {"line": line, "machine": machine.name, "th_l": th_l, "side_l": side_l, "th_r": th_r, "side_r": side_r},
+                (line,),
+                coalesce=live_key,
+            )
+
         await self.process_position(line, machine.name, "L", th_l, side_l, key_l)
         await self.process_position(line, machine.name, "R", th_r, side_r, key_r)
 
     async def process_position(
         self, line: str, machine_name: str, pos: str, th: int, side: int, key: str
     ):
-        now = time.time()
-        state = self.cycle_states.setdefault(key, {"state": "idle"})
+        now = self.clock()
+        state = self.cycle_states.get(key)
+        if state is None:
+            state = self.cycle_states[key] = CycleState(
+                active_samples(MAX_BUFFER_LENGTH), CYCLE_END_THRESHOLD, active_samples(SPLIT_MIN_ZERO_GAP)
+            )
 
         # Timeout reset — if a cycle runs too long, save as TIMEOUT (best-effort)
-        if (
-            state["state"] != "idle"
-            and (now - state.get("start_time", 0)) > CYCLE_TIMEOUT_SEC
-        ):
-            elapsed_ms = int((now - state.get("start_time", now)) * 1000)
-            sample_count = len(state.get("th_buf", []))
-            max_th = max(state.get("th_buf", [0])) if state.get("th_buf") else 0
-            max_side = max(state.get("side_buf", [0])) if state.get("side_buf") else 0
+        if state.state != "idle" and (now - state.start_time) > CYCLE_TIMEOUT_SEC:
+            elapsed_ms = int((now - state.start_time) * 1000)
+            sample_count = state.length
+            max_th = int(state.th_buf.max()) if sample_count else 0
+            max_side = int(state.side_buf.max()) if sample_count else 0
             
             logger.warning(
                 f"⏱️  TIMEOUT DATA LOSS RISK | {key} | "
@@ -580,58 +1323,75 @@ class DWPPoller:
                     f"Lost data: samples={sample_count}, duration={elapsed_ms}ms, "
                     f"TH_max={max_th}, Side_max={max_side}"
                 )
-            state["state"] = "idle"
+            state.state = "idle"
 
         # State machine
-        if state["state"] == "idle":
+        if state.state == "idle":
             if th >= CYCLE_START_THRESHOLD or side >= CYCLE_START_THRESHOLD:
-                state.update(
-                    {
-                        "state": "active",
-                        "start_time": now,
-                        "last_nonzero": now,
-                        "th_buf": [th],
-                        "side_buf": [side],
-                        "t_buf": [now],  # per-sample epoch timestamps (seconds)
-                    }
-                )
+                state.start(now, th, side)
                 logger.debug(f"🟢 START {key}: TH={th}, Side={side}")
+                self.live.publish(
+                    "cycle_start",
+                    {"line": line, "machine": machine_name, "position": pos, "at": now, "th": th, "side": side},
+                    (line,),
+                )
 
-        elif state["state"] == "active":
-            state["th_buf"].append(th)
-            state["side_buf"].append(side)
-            # record timestamp for each sample
-            state.setdefault("t_buf", []).append(now)
+        elif state.state == "active":
+            closed = state.append(now, th, side)
+
+            # A new stroke after a zero gap: the sub-cycles the end-of-run
+            # split would cut from the samples before that gap are already
+            # decided, so save them now instead of holding them until the
+            # whole run ends. The buffer is kept as it is; the end of the run
+            # splits it as before and skips what was streamed out.
+            if closed is not None and STREAM_SUB_CYCLES:
+                combined = combine_channels(state.th_buf, state.side_buf)
+                peaks, _ = find_peaks(
+                    combined, height=CYCLE_START_THRESHOLD, distance=active_samples(SPLIT_PEAK_DISTANCE)
+                )
+                state.emitted += await self.split_and_save_cycles(
+                    line,
+                    machine_name,
+                    pos,
+                    state.th_buf.tolist(),
+                    state.side_buf.tolist(),
+                    list(peaks),
+                    int((now - state.start_time) * 1000),
+                    state.timestamps_ms.tolist(),
+                    first_peak=state.streamed_until,
+                    last_peak=closed[1],
+                )
+                state.streamed_until = closed[1] + 1
 
             # Update last nonzero time if above threshold
             if th > CYCLE_END_THRESHOLD or side > CYCLE_END_THRESHOLD:
-                state["last_nonzero"] = now
+                state.last_nonzero = now
 
-            elapsed_ms = (now - state["start_time"]) * 1000
+            elapsed_ms = (now - state.start_time) * 1000
 
             # End condition: 500ms of zeros + min duration
             if (
-                now - state["last_nonzero"]
+                now - state.last_nonzero
             ) >= 0.5 and elapsed_ms >= MIN_CYCLE_DURATION_MS:
                 await self.save_cycle_to_db(
                     line, machine_name, pos, state, int(elapsed_ms)
                 )
-                state["state"] = "idle"
+                state.state = "idle"
 
             # Buffer overflow
-            if len(state["th_buf"]) > MAX_BUFFER_LENGTH:
-                max_th_current = max(state["th_buf"]) if state["th_buf"] else 0
-                max_side_current = max(state["side_buf"]) if state["side_buf"] else 0
+            if state.state == "active" and state.length > active_samples(MAX_BUFFER_LENGTH):
+                max_th_current = int(state.th_buf.max())
+                max_side_current = int(state.side_buf.max())
                 logger.warning(
                     f"⚠️ BUFFER OVERFLOW - FORCING SAVE | {key} | "
-                    f"Buffer size: {len(state['th_buf'])} > MAX_BUFFER_LENGTH ({MAX_BUFFER_LENGTH}) | "
+                    f"Buffer size: {state.length} > MAX_BUFFER_LENGTH ({active_samples(MAX_BUFFER_LENGTH)}) | "
                     f"Duration so far: {int(elapsed_ms)}ms | "
                     f"TH_max: {max_th_current} | Side_max: {max_side_current}"
                 )
                 await self.save_cycle_to_db(
                     line, machine_name, pos, state, int(elapsed_ms), "OVERFLOW"
                 )
-                state["state"] = "idle"
+                state.state = "idle"
 
     # ----------------------------
     # NEW: WAVEFORM VALIDATION
@@ -644,99 +1404,22 @@ class DWPPoller:
         duration_ms: int,
         position: str,
         timestamps_ms: Optional[List[int]] = None,
+        features: Optional[WaveformFeatures] = None,
     ) -> Tuple[bool, str]:
         """
         Returns (is_valid, reason_if_invalid)
         Flags physically implausible waveforms.
+        Pass `features` from analyze_waveform to avoid re-analysing the same waveform.
         """
-        if not th_waveform or not side_waveform:
+        if len(th_waveform) == 0 or len(side_waveform) == 0:
             return False, "Empty waveform"
 
         if len(th_waveform) != len(side_waveform):
             return False, "TH/Side length mismatch"
 
-        max_th = max(th_waveform)
-        max_side = max(side_waveform)
-        min_th = min(th_waveform)
-        min_side = min(side_waveform)
-
-        # -------------------------
-        # 1. Side pressure near-zero while TH is high → sensor fault
-        #    In split cycles, allow *brief* side drop, but not entire flat zero
-        # -------------------------
-        if max_th >= 30 and max_side <= 3:
-            nonzero_side = sum(1 for v in side_waveform if v > 5)
-            zero_side_ratio = (len(side_waveform) - nonzero_side) / len(side_waveform)
-            if zero_side_ratio > 0.8:  # >80% zeros → likely sensor disconnected
-                return (
-                    False,
-                    f"Side sensor likely disconnected: TH={max_th}, Side max={max_side}, {zero_side_ratio:.0%} zeros",
-                )
-
-        # -------------------------
-        # 2. Extreme Δ/dt (jumps > 30 in one 100ms sample)
-        # -------------------------
-        for i in range(1, len(th_waveform)):
-            dth = abs(th_waveform[i] - th_waveform[i - 1])
-            dside = abs(side_waveform[i] - side_waveform[i - 1])
-            if dth > 30 or dside > 30:
-                if dth > 40 or dside > 40:
-                    return (
-                        False,
-                        f"Impossible pressure jump: ΔTH={dth}, ΔSide={dside} at sample {i}",
-                    )
-                # else: log warning but allow (e.g., noise spike)
-                logger.debug(
-                    f"⚠️ Large pressure jump ΔTH={dth}, ΔSide={dside} at sample {i}"
-                )
-
-        # -------------------------
-        # 3. Flatline detection
-        # -------------------------
-        if max_th - min_th <= 1 and max_side - min_side <= 1 and sample_count > 3:
-            if max_th == 0 and max_side == 0:
-                return False, "Zero flatline — no cycle detected"
-            return False, "Flatline waveform — no pressure change"
-
-        # -------------------------
-        # 4. Duration vs sample sanity
-        # Expected sample interval: prefer measured median interval if
-        # per-sample timestamps are available. Otherwise fall back to 100ms.
-        # This avoids false "Too few samples" when actual poll interval is
-        # slower than the nominal 100ms due to network/IO latency.
-        # -------------------------
-        median_interval_ms = 100
-        if timestamps_ms and len(timestamps_ms) > 1:
-            try:
-                diffs = [
-                    timestamps_ms[i] - timestamps_ms[i - 1]
-                    for i in range(1, len(timestamps_ms))
-                ]
-                # ignore zero diffs if any (defensive)
-                diffs = [d for d in diffs if d > 0]
-                if diffs:
-                    median_interval_ms = max(1, int(statistics.median(diffs)))
-            except Exception:
-                median_interval_ms = 100
-
-        expected_samples = max(1, round(duration_ms / median_interval_ms))
-        if sample_count < 1 or expected_samples == 0:
-            return False, "Invalid duration or sample count"
-        # Allow sparser buffers now: treat <15% of expected as missed samples
-        if sample_count < expected_samples * 0.15:  # <15% expected → missed samples
-            return (
-                False,
-                f"Too few samples: {sample_count} for {duration_ms}ms (expected ~{expected_samples}, median_interval={median_interval_ms}ms)",
-            )
-
-        # -------------------------
-        # 5. Negative values (shouldn't happen, but guard)
-        # -------------------------
-        if min_th < 0 or min_side < 0:
-            return False, "Negative pressure reading"
-
-        # All passed
-        return True, "OK"
+        if features is None:
+            features = analyze_waveform(th_waveform, side_waveform, timestamps_ms)
+        return check_sanity(features, sample_count, duration_ms)
 
     def compute_std_error_flags(
         self,
@@ -744,6 +1427,7 @@ class DWPPoller:
         side_waveform: List[int],
         max_th: int,
         max_side: int,
+        features: Optional[WaveformFeatures] = None,
     ) -> List[List[int]]:
         """
         Returns [[th_flag], [side_flag]] where 1 = OK, 0 = suspect
@@ -752,42 +1436,26 @@ class DWPPoller:
         th_flag = 1 if (GOOD_MIN <= max_th <= GOOD_MAX) else 0
         side_flag = 1 if (GOOD_MIN <= max_side <= GOOD_MAX) else 0
 
-        # Side sensor likely failed if TH active but Side flat near zero
-        if max_th >= 30 and max_side <= 3:
-            nonzero_side = sum(1 for v in side_waveform if v > 5)
-            if nonzero_side <= 1:
-                side_flag = 0
-
-        # TH sensor likely failed if Side active but TH flat near zero
-        if max_side >= 30 and max_th <= 3:
-            nonzero_th = sum(1 for v in th_waveform if v > 5)
-            if nonzero_th <= 1:
-                th_flag = 0
-
-        # Flatline sensors
-        if len(set(th_waveform)) == 1 and len(th_waveform) > 2:
-            th_flag = 0
-        if len(set(side_waveform)) == 1 and len(side_waveform) > 2:
-            side_flag = 0
-
-        return [[th_flag], [side_flag]]
+        if features is None:
+            features = analyze_waveform(th_waveform, side_waveform)
+        return sensor_flags(features, th_flag, side_flag)
 
     async def save_cycle_to_db(
         self,
         line: str,
         machine_name: str,
         pos: str,
-        state: dict,
+        state: CycleState,
         duration_ms: int,
         cycle_type: str = "COMPLETE",
     ):
-        print("array", state["th_buf"])
-        print("array", state["side_buf"])
-        th_buf = state["th_buf"]
-        side_buf = state["side_buf"]
-        t_buf = state.get("t_buf", [])
-        # Convert per-sample timestamps to epoch-ms for duration / sanity checks
-        timestamps_ms = [int(ts * 1000) for ts in t_buf] if t_buf else []
+        # One copy out of the reused buffers; these lists are what gets stored
+        th_buf = state.th_buf.tolist()
+        side_buf = state.side_buf.tolist()
+        timestamps_ms = state.timestamps_ms.tolist()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"🌊 {line}-{machine_name}-{pos} TH: {th_buf}")
+            logger.debug(f"🌊 {line}-{machine_name}-{pos} Side: {side_buf}")
 
         # Prefer duration computed from timestamps (more accurate); fall back to provided duration_ms
         if len(timestamps_ms) > 1:
@@ -809,12 +1477,14 @@ class DWPPoller:
             return
 
         # Build combined signal (element-wise max) to detect physical cycle peaks
-        combined = [max(a, b) for a, b in zip(th_buf, side_buf)] if th_buf and side_buf else th_buf or side_buf
+        combined = combine_channels(state.th_buf, state.side_buf)
 
         # Detect peaks on combined signal so we catch cycles where TH and Side
         # peak at different times or where only one channel is active.
-        peaks, _ = find_peaks(combined, height=CYCLE_START_THRESHOLD, distance=SPLIT_PEAK_DISTANCE)
-        if len(peaks) > 1:
+        peaks, _ = find_peaks(combined, height=CYCLE_START_THRESHOLD, distance=active_samples(SPLIT_PEAK_DISTANCE))
+        # Once sub-cycles were streamed out, the rest of the run is split too:
+        # saving the whole buffer would store those strokes a second time
+        if len(peaks) > 1 or state.emitted:
             logger.info(
                 f"ℹ️ Multiple peaks ({len(peaks)}) in {line}-{machine_name}-{pos} — attempting split"
             )
@@ -827,45 +1497,38 @@ class DWPPoller:
                     side_buf,
                     list(peaks),
                     duration_ms,
-                    t_buf,
-                )
+                    timestamps_ms,
+                    first_peak=state.streamed_until,
+                ) + state.emitted
             except Exception as e:
                 logger.error(f"❌ Error splitting cycles: {e}")
-                saved_count = 0
+                saved_count = state.emitted
             if saved_count and saved_count > 0:
                 logger.info(f"✅ Saved {saved_count} split sub-cycles for {line}-{machine_name}-{pos}")
                 return
 
-        max_th = max(th_buf) if th_buf else 0
-        max_side = max(side_buf) if side_buf else 0
         sample_count = len(th_buf)
+        features = analyze_waveform(state.th_buf, state.side_buf, state.timestamps_ms)
+        max_th = features.max_th
+        max_side = features.max_side
         # Precompute std_error so it's always available for logging
-        std_error = self.compute_std_error_flags(th_buf, side_buf, max_th, max_side)
-
-        # Convert per-sample timestamps to epoch-ms for storage/visualization
-        timestamps_ms = [int(ts * 1000) for ts in t_buf] if t_buf else []
-
-        # Prefer duration computed from timestamps (more accurate); fall back to provided duration_ms
-        if len(timestamps_ms) > 1:
-            duration_ms_field = int(timestamps_ms[-1] - timestamps_ms[0])
-        else:
-            # duration_ms param is already in milliseconds from the caller
-            duration_ms_field = int(duration_ms)
-
-        # Convert to seconds for storage/visualization (float seconds)
-        duration_s = duration_ms_field / 1000.0
+        std_error = self.compute_std_error_flags(th_buf, side_buf, max_th, max_side, features)
 
         # 🆕 WAVEFORM SANITY CHECK
         is_sane, reason = self.validate_waveform_sanity(
-            th_buf, side_buf, sample_count, duration_ms_field, pos, timestamps_ms
+            th_buf, side_buf, sample_count, duration_ms_field, pos, timestamps_ms, features
         )
         if not is_sane:
+            # Arguments, not an f-string: the rate limiter drops most repeats unformatted
             logger.warning(
-                f"⚠️ INVALID WAVEFORM DETECTED - SAVING AS DEFECTIVE | {line}-{machine_name}-{pos} | "
-                f"Reason: {reason} | Duration: {duration_s:.1f}s | Samples: {sample_count} | "
-                f"TH_max: {max_th} | Side_max: {max_side} | "
-                f"TH_data: {th_buf[:10]}{'...' if len(th_buf) > 10 else ''} | "
-                f"Side_data: {side_buf[:10]}{'...' if len(side_buf) > 10 else ''}"
+                "⚠️ INVALID WAVEFORM DETECTED - SAVING AS DEFECTIVE | %s-%s-%s | "
+                "Reason: %s | Duration: %.1fs | Samples: %d | TH_max: %s | Side_max: %s | "
+                "TH_data: %s%s | Side_data: %s%s",
+                line, machine_name, pos,
+                reason, duration_s, sample_count, max_th, max_side,
+                th_buf[:10], "..." if len(th_buf) > 10 else "",
+                side_buf[:10], "..." if len(side_buf) > 10 else "",
+                extra={"rate_key": f"invalid-waveform:{line}-{machine_name}-{pos}"},
             )
             # Force grade to DEFECTIVE and override cycle_type
             grade = "DEFECTIVE"
@@ -888,7 +1551,7 @@ class DWPPoller:
             "cycle_type": cycle_type,
         }
 
-        success = await self.db.save_cycle(cycle_data)
+        success = await self.spool_cycle(cycle_data)
         if success:
             logger.info(
                 f"✅ {grade} | {line}-{machine_name}-{pos} | "
@@ -897,7 +1560,7 @@ class DWPPoller:
             )
         else:
             logger.error(
-                f"❌ DATABASE SAVE FAILED - DATA LOST | {line}-{machine_name}-{pos} | "
+                f"❌ CYCLE NOT SPOOLED - DATA LOST | {line}-{machine_name}-{pos} | "
                 f"Grade: {grade} | Cycle_type: {cycle_type} | "
                 f"Duration: {duration_s:.3f}s | Samples: {sample_count} | "
                 f"TH_max: {max_th} | Side_max: {max_side} | "
@@ -905,22 +1568,202 @@ class DWPPoller:
                 f"Side_waveform: {side_buf[:20]}{'...' if len(side_buf) > 20 else ''}"
             )
 
-    async def poll_loop(self):
+    async def spool_cycle(self, cycle_data: dict) -> bool:
+        """Hand a finished cycle to the writer, recording latency and per-grade counts"""
+        started = time.perf_counter()
+        success = await self.cycle_writer.save_cycle(cycle_data)
+        self.metrics.save_latency.observe(time.perf_counter() - started)
+        if success:
+            self.metrics.cycles_saved.inc(
+                cycle_data["line"], cycle_data["quality_grade"], cycle_data["cycle_type"]
+            )
+            self.live.publish(
+                "cycle",
+                {
+                    "line": cycle_data["line"],
+                    "machine": cycle_data["machine"],
+                    "position": cycle_data["position"],
+                    "grade": cycle_data["quality_grade"],
+                    "cycle_type": cycle_data["cycle_type"],
+                    "max_th": cycle_data["max_th"],
+                    "max_side": cycle_data["max_side"],
+                    "duration_s": cycle_data["duration_s"],
+                    "th": cycle_data["th_waveform"],
+                    "side": cycle_data["side_waveform"],
+                    "timestamps": cycle_data.get("timestamps"),
+                },
+                (cycle_data["line"],),
+            )
+        else:
+            self.metrics.cycles_lost.inc(cycle_data["line"])
+        return success
+
+    def collect_metrics(self):
+        """Refresh metrics that mirror state the poller already keeps (runs per scrape)"""
+        m = self.metrics
+        # Rebuilt from scratch so devices/positions removed by a reload disappear
+        for mirrored in (
+            m.device_info, m.device_online, m.circuit_state, m.circuit_trips, m.reconnects,
+            m.group_polls, m.group_poll_seconds, m.ticks, m.overruns, m.skipped_ticks, m.restarts, m.buffer_fill,
+        ):
+            mirrored.values.clear()
+        for dev_id, dev in self.devices.items():
+            m.device_info.set(1, dev_id, dev.name, dev.ip)
+        for dev_id, state in self.device_states.items():
+            m.device_online.set(1 if state.get("status") == "online" else 0, dev_id)
+        for dev_id, connection in self.connections.items():
+            breaker = connection.breaker
+            m.circuit_state.set({BREAKER_OPEN: 2, BREAKER_HALF_OPEN: 1}.get(breaker.state, 0), dev_id)
+            m.circuit_trips.set(breaker.trips, dev_id)
+            m.reconnects.set(connection.reconnects, dev_id)
+        for dev_id, groups in self.read_groups.items():
+            for group in groups:
+                m.group_polls.set(group.idle_polls, dev_id, group.index, "idle")
+                m.group_polls.set(group.active_polls, dev_id, group.index, "active")
+                m.group_poll_seconds.set(round(group.idle_sec, 3), dev_id, group.index, "idle")
+                m.group_poll_seconds.set(round(group.active_sec, 3), dev_id, group.index, "active")
+        for dev_id, stats in self.device_loop_stats.items():
+            m.ticks.set(stats.ticks, dev_id)
+            m.overruns.set(stats.overruns, dev_id)
+            m.skipped_ticks.set(stats.skipped_ticks, dev_id)
+            m.restarts.set(stats.restarts, dev_id)
+        for key, state in self.cycle_states.items():
+            line, machine, pos = key.rsplit("-", 2)
+            fill = state.length / active_samples(MAX_BUFFER_LENGTH) if state.state == "active" else 0.0
+            m.buffer_fill.set(fill, line, machine, pos)
+        if isinstance(self.cycle_writer, CycleWriter):
+            writer_stats = self.cycle_writer.stats
+            m.spool_depth.set(writer_stats.spool_depth)
+            m.cycles_written.set(writer_stats.written)
+            m.failed_batches.set(writer_stats.failed_batches)
+            m.cycles_dead_lettered.set(writer_stats.dead_lettered)
+        m.status_queue_depth.set(len(self.status_writer.queue))
+        m.statuses_written.set(self.status_writer.stats.written)
+        m.statuses_dropped.set(self.status_writer.stats.dropped)
+        m.live_clients.set(len(self.live.clients))
+        m.live_events.set(self.live.published)
+        m.live_dropped.set(self.live.total_dropped)
+
+    @property
+    def adaptive_polling(self) -> bool:
+        return POLL_IDLE_INTERVAL_SEC != POLL_ACTIVE_INTERVAL_SEC
+
+    @property
+    def tick_interval(self) -> float:
+        """Device loop cadence: the faster of the idle and active rates"""
+        return min(POLL_IDLE_INTERVAL_SEC, POLL_ACTIVE_INTERVAL_SEC)
+
+    def due_read_groups(self, dev_id: int, deadline: float) -> List[ReadGroup]:
+        """Read groups whose idle or active interval has elapsed at this tick"""
+        due = []
+        # Ticks fall on a fixed grid: take the tick nearest to the interval
+        tolerance = self.tick_interval / 2
+        for group in self.read_groups.get(dev_id, []):
+            active = any(
+                key in self.cycle_states and self.cycle_states[key].state == "active" for key in group.keys
+            )
+            interval = POLL_ACTIVE_INTERVAL_SEC if active else POLL_IDLE_INTERVAL_SEC
+            elapsed = deadline - group.last_read
+            if elapsed >= interval - tolerance:
+                if group.last_read > float("-inf"):
+                    if active:
+                        group.active_polls += 1
+                        group.active_sec += elapsed
+                    else:
+                        group.idle_polls += 1
+                        group.idle_sec += elapsed
+                group.last_read = deadline
+                due.append(group)
+        return due
+
+    async def device_loop(self, dev_id: int):
+        """Poll one device on absolute tick deadlines, independent of every other device"""
+        stats = self.device_loop_stats.setdefault(dev_id, DeviceLoopStats())
+        scheduler = TickScheduler(
+            self.tick_interval, catch_up=POLL_CATCHUP_POLICY, max_burst=POLL_CATCHUP_MAX_BURST
+        )
         while self.running:
-            start = time.perf_counter()
-            for dev in self.devices.values():
-                client = self.clients.get(dev.id)
-                if not client or not client.connected:
-                    continue
-                for line, machines in dev.lines.items():
-                    for machine in machines:
-                        # If configured to poll only one machine, skip others
-                        if self.poll_only_machine and machine.name != self.poll_only_machine:
-                            continue
-                        await self.poll_machine(dev, client, line, machine)
-            # Maintain polling frequency
-            elapsed = time.perf_counter() - start
-            await asyncio.sleep(max(0, POLL_INTERVAL_SEC - elapsed))
+            tick = await scheduler.wait()
+            if not self.running:
+                break
+
+            lag_ms = tick.jitter * 1000
+            stats.ticks += 1
+            stats.overruns += tick.overrun
+            stats.skipped_ticks += tick.skipped
+            stats.last_lag_ms = lag_ms
+            stats.max_lag_ms = max(stats.max_lag_ms, lag_ms)
+            stats.total_lag_ms += lag_ms
+            if stats.first_tick_at is None:
+                stats.first_tick_at = tick.started
+            stats.last_tick_at = tick.started
+
+            dev = self.devices.get(dev_id)
+            connection = self.connections.get(dev_id)
+            groups = self.due_read_groups(dev_id, tick.deadline) if self.adaptive_polling else None
+            if dev and connection and (groups is None or groups):
+                client = connection.acquire()
+                if client is not None:
+                    await self.record_poll_result(dev, connection, await self.poll_device(dev, client, groups))
+                elif not connection.connected and self.device_states.get(dev_id, {}).get('status') == 'online':
+                    self.update_device_state(dev_id, 'offline', "Connection lost — reconnecting")
+
+            stats.last_tick_ms = (time.monotonic() - tick.started) * 1000
+            stats.max_tick_ms = max(stats.max_tick_ms, stats.last_tick_ms)
+            self.metrics.tick_duration.observe(stats.last_tick_ms / 1000, dev_id)
+            self.metrics.tick_lag.observe(tick.jitter, dev_id)
+
+    async def record_poll_result(self, dev: DeviceConfig, connection: DeviceConnection, ok: bool):
+        """Feed a poll outcome to the device's circuit breaker"""
+        breaker = connection.breaker
+        if ok:
+            if breaker.record_success():
+                logger.info(f"✅ {dev.name} (ID:{dev.id}) circuit closed — probe poll succeeded")
+            return
+        probe = breaker.state == BREAKER_HALF_OPEN
+        if not breaker.record_failure():
+            return
+        if probe:
+            # The socket may be silently dead: start over with a fresh connection
+            connection.recycle()
+            logger.warning(
+                f"⚡ {dev.name} (ID:{dev.id}) probe poll failed — circuit open for {breaker.retry_in():.1f}s, reconnecting"
+            )
+        else:
+            logger.warning(
+                f"⚡ {dev.name} (ID:{dev.id}) circuit open after {breaker.failures} failed polls — "
+                f"failing fast for {breaker.retry_in():.1f}s"
+            )
+        self.update_device_state(dev.id, 'offline', f"Circuit open after {breaker.failures} failed polls")
+
+    async def poll_loop(self):
+        """Run one polling task per device and restart any task that crashes"""
+        try:
+            while self.running:
+                for dev_id, dev in self.devices.items():
+                    if dev_id in self.awaiting_handoff:
+                        continue
+                    task = self.device_tasks.get(dev_id)
+                    if task is not None and not task.done():
+                        continue
+                    if task is not None:
+                        stats = self.device_loop_stats.setdefault(dev_id, DeviceLoopStats())
+                        stats.restarts += 1
+                        error = task.exception() if not task.cancelled() else "cancelled"
+                        logger.error(
+                            f"❌ Polling task for {dev.name} (ID:{dev_id}) stopped: {error} | "
+                            f"restarting (restarts={stats.restarts})"
+                        )
+                    self.device_tasks[dev_id] = asyncio.create_task(
+                        self.device_loop(dev_id), name=f"dwp-device-{dev_id}"
+                    )
+                await asyncio.sleep(DEVICE_SUPERVISOR_INTERVAL_SEC)
+        finally:
+            tasks = list(self.device_tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.device_tasks.clear()
 
     async def monitor_heartbeats(self):
         """Background task to monitor device heartbeats and mark offline after threshold"""
@@ -929,7 +1772,8 @@ class DWPPoller:
         while self.running:
             try:
                 now = time.time()
-                for dev_id, state in self.device_states.items():
+                # Copy: a config reload may remove devices while we await
+                for dev_id, state in list(self.device_states.items()):
                     last_read = state.get('last_successful_read')
                     current_status = state.get('status', 'unknown')
                     
@@ -944,7 +1788,9 @@ class DWPPoller:
                     if current_status == 'online' and elapsed > OFFLINE_THRESHOLD_SEC:
                         device_name = next((dev.name for dev in self.devices.values() if dev.id == dev_id), f"Device-{dev_id}")
                         logger.warning(f"💔 {device_name} (ID:{dev_id}) heartbeat lost ({elapsed:.1f}s since last read)")
-                        await self.update_device_state(dev_id, 'offline', f'No response for {elapsed:.1f}s')
+                        self.update_device_state(dev_id, 'offline', f'No response for {elapsed:.1f}s')
+
+                self.report_device_loop_stats()
                 
                 # Sleep for check interval
                 await asyncio.sleep(HEARTBEAT_CHECK_INTERVAL_SEC)
@@ -953,42 +1799,116 @@ class DWPPoller:
                 logger.error(f"❌ Heartbeat monitor error: {e}")
                 await asyncio.sleep(HEARTBEAT_CHECK_INTERVAL_SEC)
 
+    def report_device_loop_stats(self):
+        """Warn about devices whose polling task overran since the last report"""
+        for dev_id, stats in self.device_loop_stats.items():
+            new_overruns = stats.overruns - self.reported_overruns.get(dev_id, 0)
+            if new_overruns <= 0:
+                continue
+            self.reported_overruns[dev_id] = stats.overruns
+            dev = self.devices.get(dev_id)
+            logger.warning(
+                f"🐢 {dev.name if dev else f'Device-{dev_id}'} (ID:{dev_id}) missed cadence | "
+                f"overruns +{new_overruns} (total {stats.overruns}/{stats.ticks} ticks, "
+                f"{stats.skipped_ticks} skipped) | {stats.effective_hz:.2f} Hz | "
+                f"last tick {stats.last_tick_ms:.1f}ms, max {stats.max_tick_ms:.1f}ms | "
+                f"jitter mean {stats.mean_lag_ms:.1f}ms, max {stats.max_lag_ms:.1f}ms | "
+                f"restarts {stats.restarts}"
+            )
+
     def signal_handler(self, signum, frame):
         logger.info("🛑 Shutdown signal received...")
         self.running = False
+        self.shutdown_event.set()
+
+    def reload_signal_handler(self, signum, frame):
+        logger.info("🔃 SIGHUP received — reloading device config")
+        self.reload_requested.set()
 
     async def run(self):
         # Setup signals
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
+        if hasattr(signal, "SIGBREAK"):  # Windows: how the shard supervisor stops its shards
+            signal.signal(signal.SIGBREAK, self.signal_handler)
+        if hasattr(signal, "SIGHUP"):  # not on Windows: see DEVICE_RELOAD_INTERVAL_SEC
+            signal.signal(signal.SIGHUP, self.reload_signal_handler)
+
+        if PV_FORMAT_VERSION not in PV_VERSIONS:
+            raise ValueError(f"DWP_PV_VERSION must be one of {PV_VERSIONS}, got {PV_FORMAT_VERSION}")
 
         try:
+            phases = [("imports", IMPORT_SEC)]
+            started = phase_started = time.perf_counter()
+
+            def phase_done(name: str):
+                nonlocal phase_started
+                now = time.perf_counter()
+                phases.append((name, now - phase_started))
+                phase_started = now
+
             await self.db.connect()
+            await self.db.check_rollups_table()
+            self.cycle_writer.start()
+            self.status_writer.start()
+            if self.metrics_port:
+                self.metrics_server = MetricsServer(self.metrics.registry, METRICS_HOST, self.metrics_port)
+                await self.metrics_server.start()
+            if self.live_port:
+                self.live_server = LiveServer(
+                    self.live, LIVE_HOST, self.live_port, LIVE_ALLOW_ORIGIN, LIVE_HEARTBEAT_SEC, self.live_snapshot
+                )
+                await self.live_server.start()
+            if self.capture_dir:
+                self.capture = CaptureLog(self.capture_dir, CAPTURE_SEGMENT_RECORDS, CAPTURE_MAX_SEGMENTS)
+                logger.info(f"🎙️ Capturing raw register reads to {self.capture_dir}")
+            phase_done("db")
             await self.load_devices()
-            await self.connect_clients()
-            logger.info(f"🚀 DWP Poller started (interval={POLL_INTERVAL_SEC}s)")
-            
-            # Run poll_loop and heartbeat monitor concurrently
+            phase_done("devices")
+            # Independent: counters come from MySQL, connections from the gateways
+            await asyncio.gather(
+                self.db.seed_line_counts(sorted({line for dev in self.devices.values() for line in dev.lines})),
+                self.connect_clients(),
+            )
+            phase_done(f"connect {len(self.devices)} device(s)")
+            interval = (
+                f"{POLL_IDLE_INTERVAL_SEC}s idle / {POLL_ACTIVE_INTERVAL_SEC}s active"
+                if self.adaptive_polling
+                else f"{self.tick_interval}s"
+            )
+            logger.info(
+                f"🚀 DWP Poller started (interval={interval}, catch-up={POLL_CATCHUP_POLICY}, pv=v{PV_FORMAT_VERSION})"
+            )
+            logger.info(
+                f"⏱️ Startup took {IMPORT_SEC + time.perf_counter() - started:.2f}s ("
+                + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in phases)
+                + ")"
+            )
+
+            # Run poll_loop, heartbeat monitor and config watcher concurrently (and warm up scipy)
             await asyncio.gather(
                 self.poll_loop(),
-                self.monitor_heartbeats()
+                self.monitor_heartbeats(),
+                self.watch_device_config(),
+                preload_scipy(),
             )
         finally:
             # Cleanup (best-effort)
-            for client in self.clients.values():
-                # Some AsyncModbusTcpClient.close() implementations return a coroutine,
-                # others are synchronous. Await only when close() is a coroutine.
-                if hasattr(client, "close"):
-                    try:
-                        close_result = client.close()
-                        await maybe_await(close_result)
-                    except Exception:
-                        # Best-effort fallback: try calling close() again and ignore errors
-                        try:
-                            client.close()
-                        except Exception:
-                            pass
+            for task in list(self.handoff_tasks):
+                task.cancel()
+            await asyncio.gather(*self.handoff_tasks, return_exceptions=True)
+            for connection in self.connections.values():
+                await connection.close()
+            # Deliver spooled cycles and queued statuses while the pool is still open
+            await self.cycle_writer.close()
+            await self.status_writer.close()
             await self.db.close()
+            if self.capture is not None:
+                self.capture.close()
+            if self.metrics_server is not None:
+                await self.metrics_server.close()
+            if self.live_server is not None:
+                await self.live_server.close()
             logger.info("👋 DWP Poller stopped.")
 
     async def split_and_save_cycles(
@@ -1000,119 +1920,107 @@ class DWPPoller:
         side_buf: List[int],
         peaks: List[int],
         total_duration_ms: int,
-        t_buf: List[float],
+        timestamps_ms: List[int],
+        first_peak: int = 0,
+        last_peak: Optional[int] = None,
     ):
-        """Split multi-peak buffer into individual cycles"""
-        # element-wise max of TH/Side to reason about physical gaps
-        combined = [max(a, b) for a, b in zip(th_buf, side_buf)] if th_buf and side_buf else th_buf or side_buf
-
-        # helper: check for a run of N consecutive "low" samples in combined between i..j
-        def has_min_zero_gap(start_idx: int, end_idx: int, min_gap: int) -> bool:
-            if end_idx < start_idx:
-                return False
-            run = 0
-            for k in range(start_idx, end_idx + 1):
-                if combined[k] <= CYCLE_END_THRESHOLD:
-                    run += 1
-                    if run >= min_gap:
-                        return True
-                else:
-                    run = 0
-            return False
+        """Split multi-peak buffer into individual cycles; only the sub-cycles
+        whose peak lies in [first_peak, last_peak] are saved"""
+        combined = combine_channels(th_buf, side_buf)
+        segments = segment_peaks(combined, peaks, CYCLE_END_THRESHOLD, active_samples(SPLIT_MIN_ZERO_GAP))
 
         saved_count = 0
-        prev_peak = None
-        for i, peak_idx in enumerate(peaks):
-            # If there was a previous peak, require a zero-gap between them to split
-            if prev_peak is not None:
-                if not has_min_zero_gap(prev_peak + 1, peak_idx - 1, SPLIT_MIN_ZERO_GAP):
-                    logger.info(
-                        f"⏭️ Peaks {prev_peak} and {peak_idx} too close (no zero-gap) — treating as same cycle"
-                    )
-                    prev_peak = peak_idx
-                    continue
-            prev_peak = peak_idx
-
-            # Find start (first above-threshold before peak)
-            start_idx = peak_idx
-            while start_idx > 0 and combined[start_idx - 1] > CYCLE_END_THRESHOLD:
-                start_idx -= 1
-            start_idx = max(0, start_idx)
-
-            # Find end (first below-threshold after peak)
-            end_idx = peak_idx
-            while end_idx < len(combined) - 1 and combined[end_idx + 1] > CYCLE_END_THRESHOLD:
-                end_idx += 1
-            end_idx = min(len(combined) - 1, end_idx)
-
-            # Extract sub-cycle
-            th_sub = th_buf[start_idx : end_idx + 1]
-            side_sub = side_buf[start_idx : end_idx + 1]
-            # Extract timestamp slice (epoch-ms)
-            sub_t_buf = t_buf[start_idx : end_idx + 1] if t_buf else []
-            sub_timestamps_ms = [int(ts * 1000) for ts in sub_t_buf] if sub_t_buf else []
-
-            # Calculate duration (prefer timestamps if present)
-            # sub_timestamps_ms contains epoch-ms for each sample in the sub-cycle
-            if sub_timestamps_ms and len(sub_timestamps_ms) > 1:
-                sub_duration_ms = int(sub_timestamps_ms[-1] - sub_timestamps_ms[0])
-            else:
-                sub_duration_ms = int((end_idx - start_idx + 1) * POLL_INTERVAL_SEC * 1000)
-
-            # store seconds for DB/visualization
-            sub_duration_s = sub_duration_ms / 1000.0
-
-            # Skip very short sub-cycles
-            if sub_duration_s < MIN_DURATION_S:
+        for i, segment in enumerate(segments):
+            if segment.peak < first_peak or (last_peak is not None and segment.peak > last_peak):
+                continue
+            # A peak without a zero-gap to the previous one belongs to that cycle
+            if segment.merged:
                 logger.info(
-                    f"⏭️ Skipping split sub-cycle {i+1}/{len(peaks)} for {line}-{machine_name}-{pos}: duration {sub_duration_s:.1f}s < {MIN_DURATION_S}s"
+                    f"⏭️ Peaks {segments[i - 1].peak} and {segment.peak} too close (no zero-gap) — treating as same cycle"
                 )
                 continue
+            start_idx, end_idx = segment.start, segment.end
+            saved = await self.save_split_cycle(
+                line,
+                machine_name,
+                pos,
+                th_buf[start_idx : end_idx + 1],
+                side_buf[start_idx : end_idx + 1],
+                timestamps_ms[start_idx : end_idx + 1],
+                f"{i + 1}/{len(peaks)}",
+            )
+            saved_count += saved
+        return saved_count
+
+    async def save_split_cycle(
+        self,
+        line: str,
+        machine_name: str,
+        pos: str,
+        th_sub: List[int],
+        side_sub: List[int],
+        sub_timestamps_ms: List[int],
+        label: str,
+    ) -> bool:
+        """Validate and save one sub-cycle as SPLIT; label identifies it in logs"""
+        # Calculate duration (prefer timestamps if present)
+        # sub_timestamps_ms contains epoch-ms for each sample in the sub-cycle
+        if sub_timestamps_ms and len(sub_timestamps_ms) > 1:
+            sub_duration_ms = int(sub_timestamps_ms[-1] - sub_timestamps_ms[0])
+        else:
+            sub_duration_ms = int(len(th_sub) * POLL_ACTIVE_INTERVAL_SEC * 1000)
+
+        # store seconds for DB/visualization
+        sub_duration_s = sub_duration_ms / 1000.0
 
-            # Validate sub-cycle waveform sanity; skip invalid ones
-            is_sane, reason = self.validate_waveform_sanity(
-                th_sub, side_sub, len(th_sub), sub_duration_ms, pos, sub_timestamps_ms
+        # Skip very short sub-cycles
+        if sub_duration_s < MIN_DURATION_S:
+            logger.info(
+                f"⏭️ Skipping split sub-cycle {label} for {line}-{machine_name}-{pos}: duration {sub_duration_s:.1f}s < {MIN_DURATION_S}s"
             )
-            if not is_sane:
-                logger.info(
-                    f"⏭️ Skipping split sub-cycle {i+1}/{len(peaks)} for {line}-{machine_name}-{pos}: invalid waveform ({reason})"
-                )
-                continue
+            return False
 
-            # Save as individual cycle
-            max_th = max(th_sub) if th_sub else 0
-            max_side = max(side_sub) if side_sub else 0
-            grade = determine_quality(max_th, max_side, "SPLIT")
+        # Validate sub-cycle waveform sanity; skip invalid ones
+        is_sane, reason = self.validate_waveform_sanity(
+            th_sub, side_sub, len(th_sub), sub_duration_ms, pos, sub_timestamps_ms
+        )
+        if not is_sane:
+            logger.info(
+                f"⏭️ Skipping split sub-cycle {label} for {line}-{machine_name}-{pos}: invalid waveform ({reason})"
+            )
+            return False
 
-            # Validation: skip very short sub-cycles (insufficient samples)
-            if len(th_sub) < 4:
-                logger.info(
-                    f"⏭️ Skipping split sub-cycle {i+1}/{len(peaks)} for {line}-{machine_name}-{pos}: too few samples ({len(th_sub)})"
-                )
-                continue
+        # Save as individual cycle
+        max_th = max(th_sub) if th_sub else 0
+        max_side = max(side_sub) if side_sub else 0
+        grade = determine_quality(max_th, max_side, "SPLIT")
 
-            cycle_data = {
-                "line": line,
-                "machine": extract_machine_id(machine_name),
-                "position": pos,
-                "th_waveform": th_sub,
-                "side_waveform": side_sub,
-                "timestamps": sub_timestamps_ms,
-                "duration_s": sub_duration_s,
-                "quality_grade": grade,
-                "max_th": max_th,
-                "max_side": max_side,
-                "sample_count": len(th_sub),
-                "cycle_type": "SPLIT",
-            }
+        # Validation: skip very short sub-cycles (insufficient samples)
+        if len(th_sub) < 4:
+            logger.info(
+                f"⏭️ Skipping split sub-cycle {label} for {line}-{machine_name}-{pos}: too few samples ({len(th_sub)})"
+            )
+            return False
 
-            success = await self.db.save_cycle(cycle_data)
-            if success:
-                logger.info(
-                    f"✅ SPLIT Cycle {i + 1}/{len(peaks)} saved for {line}-{machine_name}-{pos}"
-                )
-                saved_count += 1
-        return saved_count
+        cycle_data = {
+            "line": line,
+            "machine": extract_machine_id(machine_name),
+            "position": pos,
+            "th_waveform": th_sub,
+            "side_waveform": side_sub,
+            "timestamps": sub_timestamps_ms,
+            "duration_s": sub_duration_s,
+            "quality_grade": grade,
+            "max_th": max_th,
+            "max_side": max_side,
+            "sample_count": len(th_sub),
+            "cycle_type": "SPLIT",
+        }
+
+        success = await self.spool_cycle(cycle_data)
+        if success:
+            logger.info(f"✅ SPLIT Cycle {label} saved for {line}-{machine_name}-{pos}")
+        return success
 
 # ----------------------------
 # ENTRY POINT
@@ -1120,7 +2028,61 @@ class DWPPoller:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="DWP Poller")
     parser.add_argument("--machine", "-m", help="Poll only this machine name (e.g., mc1)")
+    parser.add_argument("--capture", default=CAPTURE_DIR, help="Record raw register reads to this directory")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--live-port", type=int, default=LIVE_PORT, help="Serve live dashboard events on this port")
+    parser.add_argument("--shards", type=int, default=SHARDS, help="Split devices across this many poller processes")
+    parser.add_argument("--shard", type=int, help=argparse.SUPPRESS)  # set by the supervisor for its workers
     args = parser.parse_args()
 
-    poller = DWPPoller(poll_only_machine=args.machine)
-    asyncio.run(poller.run())
+    if args.shard is not None:
+        if not 0 <= args.shard < args.shards:
+            parser.error(f"--shard must be in [0, {args.shards})")
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(
+                logging.Formatter(
+                    f"%(asctime)s | %(levelname)-8s | [shard {args.shard}] %(message)s", "%Y-%m-%d %H:%M:%S"
+                )
+            )
+        poller = DWPPoller(
+            poll_only_machine=args.machine,
+            capture_dir=args.capture,
+            metrics_port=args.metrics_port,
+            shard=(args.shard, args.shards),
+            live_port=args.live_port + args.shard if args.live_port else 0,
+        )
+        main = poller.run()
+    elif args.shards > 0:
+        worker_args = []
+        if args.machine:
+            worker_args += ["--machine", args.machine]
+        if args.capture:
+            worker_args += ["--capture", args.capture]
+        if args.live_port:
+            worker_args += ["--live-port", str(args.live_port)]
+        supervisor = ShardSupervisor(
+            args.shards,
+            worker_args,
+            METRICS_HOST,
+            args.metrics_port,
+            SHARD_METRICS_BASE_PORT,
+            CYCLE_SPOOL_PATH,
+            SHARD_HEALTH_INTERVAL_SEC,
+            SHARD_HANG_TIMEOUT_SEC,
+            SHARD_RESTART_BACKOFF_MAX_SEC,
+        )
+        main = supervisor.run()
+    else:
+        poller = DWPPoller(
+            poll_only_machine=args.machine,
+            capture_dir=args.capture,
+            metrics_port=args.metrics_port,
+            live_port=args.live_port,
+        )
+        main = poller.run()
+
+    log_pipeline = start_log_pipeline(LOG_QUEUE_SIZE, LOG_RATE_WINDOW_SEC, LOG_RATE_BURST, LOG_RATE_SAMPLE_EVERY)
+    try:
+        asyncio.run(main)
+    finally:
+        log_pipeline.stop()
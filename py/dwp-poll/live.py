@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Live push channel for dashboards: Server-Sent Events on GET /events, served
+# from the poller's own event loop. Events are serialized once per publish and
+# offered to every subscribed client's bounded queue; the poller never waits
+# on a client. Events published with a coalesce key (register values, device
+# status) replace the client's still-unsent event with the same key, so a slow
+# client gets the latest state instead of a backlog. Other events (cycle start
+# and complete) queue in order; when a client's queue is full the oldest event
+# is dropped and the client is sent a `dropped` event so it can resync from
+# MySQL. SSE instead of WebSocket: the channel is one-way, EventSource
+# reconnects on its own and it needs no dependency on either side.
+
+logger = logging.getLogger("DWP")
+
+# (event, data, lines) — lines=None goes to every client
+Snapshot = List[Tuple[str, dict, Optional[Iterable[str]]]]
+
+
+def sse_message(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class LiveClient:
+    def __init__(self, lines: Optional[Set[str]], max_queued: int):
+        """lines: only receive events for these lines (None = all)"""
+        self.lines = lines
+        self.max_queued = max_queued
+        self.pending: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.unreported_drops = 0
+        self.dropped = 0
+
+    def wants(self, lines: Optional[Iterable[str]]) -> bool:
+        return self.lines is None or lines is None or not self.lines.isdisjoint(lines)
+
+    def offer(self, key: Hashable, message: bytes):
+        if key in self.pending:
+            # Coalesce: keep the queue position, send the newest state
+            self.pending[key] = message
+        else:
+            if len(self.pending) >= self.max_queued:
+                self.pending.popitem(last=False)
+                self.unreported_drops += 1
+                self.dropped += 1
+            self.pending[key] = message
+        self.ready.set()
+
+    def take(self) -> bytes:
+        """Everything queued, as one write"""
+        messages = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        if self.unreported_drops:
+            messages.insert(0, sse_message("dropped", {"count": self.unreported_drops}))
+            self.unreported_drops = 0
+        return b"".join(messages)
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+
+class LiveHub:
+    def __init__(self, max_queued: int, values_interval_sec: float, clock: Callable[[], float] = time.monotonic):
+        self.max_queued = max_queued
+        self.values_interval_sec = values_interval_sec
+        self.clock = clock
+        self.clients: Set[LiveClient] = set()
+        self.last_values: dict = {}
+        self.seq = itertools.count()
+        self.published = 0
+        self.dropped = 0  # by clients that have disconnected
+
+    def subscribe(self, lines: Optional[Set[str]]) -> LiveClient:
+        client = LiveClient(lines, self.max_queued)
+        self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client: LiveClient):
+        if client in self.clients:
+            self.clients.discard(client)
+            self.dropped += client.dropped
+
+    @property
+    def total_dropped(self) -> int:
+        return self.dropped + sum(client.dropped for client in self.clients)
+
+    def due(self, key: Hashable) -> bool:
+        """Throttle for periodic state: True at most once per values_interval_sec per key, and only if
+        someone is listening (callers skip building the payload otherwise)"""
+        if not self.clients:
+            return False
+        now = self.clock()
+        if now - self.last_values.get(key, float("-inf")) < self.values_interval_sec:
+            return False
+        self.last_values[key] = now
+        return True
+
+    def publish(
+        self, event: str, data: dict, lines: Optional[Iterable[str]] = None, coalesce: Optional[Hashable] = None
+    ):
+        """Queue an event for every interested client; coalesce: key whose unsent event this replaces"""
+        if not self.clients:
+            return
+        message = sse_message(event, data)
+        key = (event, coalesce) if coalesce is not None else next(self.seq)
+        lines = tuple(lines) if lines is not None else None
+        for client in self.clients:
+            if client.wants(lines):
+                client.offer(key, message)
+        self.published += 1
+
+    def close(self):
+        for client in list(self.clients):
+            client.close()
+
+
+class LiveServer:
+    """Serves GET /events[?lines=A,B] as a Server-Sent Events stream on the running event loop"""
+
+    def __init__(
+        self,
+        hub: LiveHub,
+        host: str,
+        port: int,
+        allow_origin: str,
+        heartbeat_sec: float,
+        snapshot: Callable[[], Snapshot] = list,
+    ):
+        """snapshot: current state (e.g. device statuses) sent to a client when it connects"""
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.allow_origin = allow_origin
+        self.heartbeat_sec = heartbeat_sec
+        self.snapshot = snapshot
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"📡 Live events on http://{self.host}:{self.port}/events")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = None
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            url = urlsplit(parts[1]) if len(parts) >= 2 else None
+            if url is None or parts[0] != "GET" or url.path != "/events":
+                writer.write(
+                    b"HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+                    b"Content-Length: 10\r\nConnection: close\r\n\r\nnot found\n"
+                )
+                await writer.drain()
+                return
+
+            lines = {
+                line.strip()
+                for value in parse_qs(url.query).get("lines", [])
+                for line in value.split(",")
+                if line.strip()
+            }
+            writer.write(
+                "HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                f"Access-Control-Allow-Origin: {self.allow_origin}\r\nX-Accel-Buffering: no\r\n"
+                "Connection: keep-alive\r\n\r\nretry: 2000\n\n".encode()
+            )
+            client = self.hub.subscribe(lines or None)
+            for event, data, event_lines in self.snapshot():
+                if client.wants(event_lines):
+                    client.offer(next(self.hub.seq), sse_message(event, data))
+
+            while not client.closed:
+                try:
+                    await asyncio.wait_for(client.ready.wait(), self.heartbeat_sec)
+                    payload = client.take()
+                except asyncio.TimeoutError:
+                    # Keeps proxies from timing out and finds dead connections
+                    payload = b": ping\n\n"
+                if payload:
+                    writer.write(payload)
+                    # Events keep coalescing in the client's queue while this waits
+                    await asyncio.wait_for(writer.drain(), self.heartbeat_sec * 2)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            if client is not None:
+                self.hub.unsubscribe(client)
+            writer.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # Streams only end when told to; wait_closed waits for them
+            self.hub.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, List
+
+# Non-blocking logging for the DWP poller. `start_log_pipeline` puts a
+# QueueHandler in front of the root logger's handlers: on the event loop a log
+# call is a filter check plus a queue put, and a listener thread does the
+# formatting and stdout/stderr I/O. The queue is bounded and never blocks; when
+# it is full, records are dropped and the drop count is reported once there is
+# room again.
+#
+# Repetitive messages are rate limited per key: pass `extra={"rate_key": ...}`
+# and at most `burst` records per key get through per window, plus every
+# `sample_every`-th one after that. The next record let through for a key says
+# how many were suppressed. Records without a rate_key are never limited.
+
+logger = logging.getLogger("DWP")
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(
+        self,
+        window_sec: float,
+        burst: int,
+        sample_every: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__()
+        self.window_sec = window_sec
+        self.burst = max(1, burst)
+        self.sample_every = max(1, sample_every)
+        self.clock = clock
+        # rate_key → [window start, records in window, suppressed since last emitted]
+        self.keys: Dict[str, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            return True
+        now = self.clock()
+        entry = self.keys.get(key)
+        if entry is None or now - entry[0] >= self.window_sec:
+            entry = self.keys[key] = [now, 0, entry[2] if entry else 0]
+        entry[1] += 1
+        if entry[1] > self.burst and entry[1] % self.sample_every:
+            entry[2] += 1
+            self.suppressed += 1
+            return False
+        if entry[2]:
+            record.msg = f"{record.getMessage()} (+{entry[2]} similar suppressed)"
+            record.args = None
+            entry[2] = 0
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0  # total
+        self.unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process: hand the record over as is and let the listener
+        # thread format it (the stock prepare formats on the caller's thread)
+        return record
+
+    def drop_report(self) -> logging.LogRecord:
+        return logging.makeLogRecord(
+            {
+                "name": logger.name,
+                "levelno": logging.WARNING,
+                "levelname": logging.getLevelName(logging.WARNING),
+                "msg": f"⚠️ Log queue full — dropped {self.unreported} record(s)",
+            }
+        )
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.unreported:
+                self.queue.put_nowait(self.drop_report())
+                self.unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.unreported += 1
+
+
+class LogPipeline(QueueListener):
+    def __init__(self, log_queue: queue.Queue, handler: DroppingQueueHandler, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.handler = handler
+
+    def enqueue_sentinel(self):
+        # Blocking put: the listener thread is still draining a full queue
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        """Flush everything queued and put the original handlers back on the root logger"""
+        if self.handler.unreported:
+            self.queue.put(self.handler.drop_report())
+            self.handler.unreported = 0
+        super().stop()
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        for handler in self.handlers:
+            root.addHandler(handler)
+
+
+def start_log_pipeline(
+    queue_size: int,
+    rate_window_sec: float,
+    rate_burst: int,
+    rate_sample_every: int,
+) -> LogPipeline:
+    """Move the root logger's handlers behind a queue drained by a background thread"""
+    root = logging.getLogger()
+    handlers: List[logging.Handler] = list(root.handlers)
+    log_queue: queue.Queue = queue.Queue(max(1, queue_size))
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(rate_window_sec, rate_burst, rate_sample_every))
+    for existing in handlers:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    pipeline = LogPipeline(log_queue, handler, *handlers)
+    pipeline.start()
+    return pipeline
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Minimal Prometheus text-format metrics for the DWP poller, served over HTTP
+# from the poller's own event loop (no extra thread, no client library).
+# Hot-path updates are a dict lookup plus an add; anything the poller already
+# tracks (device loop stats, writer stats, buffer fill) is read by collectors
+# at scrape time instead of being counted twice.
+
+logger = logging.getLogger("DWP")
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; tuned for Modbus round trips and 100 ms poll ticks
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, value: float, *labels):
+        """For counters: mirror a total that is already kept elsewhere"""
+        self.values[labels] = value
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels → [per-bucket counts (non-cumulative, last = +Inf), sum, count]
+        self.series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Called before every scrape to refresh gauges from existing state"""
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"⚠️ Metrics collector failed: {e}")
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves GET /metrics on the running event loop"""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"📈 Metrics endpoint on http://{self.host}:{self.port}/metrics")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Drain headers; the request body is never used
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"not found\n", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+
+class PollerMetrics:
+    """The metric set exposed by DWPPoller"""
+
+    def __init__(self):
+        r = self.registry = MetricsRegistry()
+        # Modbus
+        self.device_info = r.gauge("dwp_device_info", "Configured device (value is always 1)", ("device", "name", "ip"))
+        self.device_online = r.gauge("dwp_device_online", "1 if the device's last state is online", ("device",))
+        self.modbus_rtt = r.histogram("dwp_modbus_rtt_seconds", "Modbus block read round trip", ("device",))
+        self.read_failures = r.counter(
+            "dwp_modbus_read_failures_total", "Failed Modbus block reads", ("device", "reason")
+        )
+        self.circuit_state = r.gauge(
+            "dwp_device_circuit_state", "Read circuit breaker: 0 closed, 1 half-open, 2 open", ("device",)
+        )
+        self.circuit_trips = r.counter("dwp_device_circuit_trips_total", "Times the read circuit opened", ("device",))
+        self.reconnects = r.counter("dwp_modbus_reconnects_total", "Successful background reconnects", ("device",))
+        # Polling cadence
+        self.tick_duration = r.histogram("dwp_poll_tick_seconds", "Time spent polling a device in one tick", ("device",))
+        self.tick_lag = r.histogram("dwp_poll_tick_lag_seconds", "Tick start delay past its deadline", ("device",))
+        self.ticks = r.counter("dwp_poll_ticks_total", "Poll ticks run", ("device",))
+        self.group_polls = r.counter(
+            "dwp_read_group_polls_total", "Read group polls by adaptive polling mode", ("device", "group", "mode")
+        )
+        self.group_poll_seconds = r.counter(
+            "dwp_read_group_poll_seconds_total",
+            "Time covered by a mode's polls; polls_total / poll_seconds_total is the achieved Hz",
+            ("device", "group", "mode"),
+        )
+        self.overruns = r.counter("dwp_poll_overruns_total", "Ticks started after their deadline", ("device",))
+        self.skipped_ticks = r.counter("dwp_poll_skipped_ticks_total", "Ticks dropped by the catch-up policy", ("device",))
+        self.restarts = r.counter("dwp_poll_task_restarts_total", "Crashed device polling tasks restarted", ("device",))
+        # Cycles
+        self.buffer_fill = r.gauge(
+            "dwp_position_buffer_fill_ratio",
+            "Samples buffered in the running cycle / MAX_BUFFER_LENGTH",
+            ("line", "machine", "position"),
+        )
+        self.cycles_saved = r.counter(
+            "dwp_cycles_saved_total", "Cycles handed to the writer", ("line", "grade", "cycle_type")
+        )
+        self.cycles_lost = r.counter("dwp_cycles_not_spooled_total", "Cycles the writer refused", ("line",))
+        self.save_latency = r.histogram("dwp_save_cycle_seconds", "save_cycle latency (spool append)")
+        # Write-behind to MySQL
+        self.spool_depth = r.gauge("dwp_cycle_spool_depth", "Cycles spooled but not yet in MySQL")
+        self.cycles_written = r.counter("dwp_cycles_written_total", "Cycles inserted into MySQL")
+        self.failed_batches = r.counter("dwp_cycle_write_failed_batches_total", "Failed MySQL batch inserts")
+        self.cycles_dead_lettered = r.counter(
+            "dwp_cycles_dead_lettered_total", "Cycles MySQL kept rejecting, moved to the spool's dead_cycles table"
+        )
+        self.db_flush = r.histogram("dwp_db_flush_seconds", "MySQL batch insert latency")
+        self.status_queue_depth = r.gauge("dwp_device_status_queue_depth", "Status transitions not yet in MySQL")
+        self.statuses_written = r.counter("dwp_device_statuses_written_total", "Rows inserted into log_dwp_uptime")
+        self.statuses_dropped = r.counter(
+            "dwp_device_statuses_dropped_total", "Status transitions dropped from the full queue"
+        )
+        # Live events
+        self.live_clients = r.gauge("dwp_live_clients", "Connected live event streams")
+        self.live_events = r.counter("dwp_live_events_published_total", "Events published to live clients")
+        self.live_dropped = r.counter(
+            "dwp_live_events_dropped_total", "Events dropped from full live client queues"
+        )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import base64
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Encoder/decoder for the `pv` column of ins_dwp_counts.
+#
+# Version 1 (no "v" key) stores plain JSON integer arrays:
+#   {"waveforms": [[th...], [side...]], "timestamps": [epoch_ms...], "quality": {...}}
+#
+# Version 2 keeps the JSON envelope (the column is JSON) but packs every series:
+#   {"v": 2, "n": samples, "waveforms": [b64, b64], "t0": epoch_ms, "dt": b64, "quality": {...}}
+# A packed series is the first difference of the values, zig-zag mapped to
+# unsigned and written as LEB128 varints, then base64. Timestamps are stored as
+# the first epoch-ms value plus the packed sample intervals, so a steady 10 Hz
+# stream costs about one byte per sample instead of ~14 characters.
+#
+# The PHP side (App\Services\DwpPvCodec) reads both versions.
+
+PV_VERSION_JSON = 1
+PV_VERSION_PACKED = 2
+PV_VERSIONS = (PV_VERSION_JSON, PV_VERSION_PACKED)
+
+_MAX_VARINT_BYTES = 10  # 64-bit values
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """Signed int64 → unsigned, small magnitudes stay small (0,-1,1,-2 → 0,1,2,3)"""
+    values = values.astype(np.int64, copy=False)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64, copy=False).view(np.int64)
+    # Logical shift: the top bit of a zig-zag value is data, not sign
+    return ((values >> 1) & np.int64(0x7FFFFFFFFFFFFFFF)) ^ -(values & 1)
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """LEB128-encode unsigned values, vectorized over the whole array"""
+    values = np.asarray(values, dtype=np.uint64)
+    if values.size == 0:
+        return b""
+    if values.max() < 0x80:
+        # Common case for waveform deltas: every varint is a single byte
+        return values.astype(np.uint8).tobytes()
+    # Bytes per value: one per started group of 7 bits
+    lengths = np.ones(values.size, dtype=np.int64)
+    for k in range(1, _MAX_VARINT_BYTES):
+        more = values >= np.uint64(1 << (7 * k))
+        if not more.any():
+            break
+        lengths += more
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max())):
+        has = lengths > k
+        group = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        cont = np.where(lengths[has] > k + 1, 0x80, 0).astype(np.uint64)
+        out[starts[has] + k] = (group | cont).astype(np.uint8)
+    return out.tobytes()
+
+
+def varint_decode(data: bytes) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if raw.max() < 0x80:
+        return raw.astype(np.uint64)
+    ends = np.flatnonzero(raw < 0x80)
+    if ends.size == 0 or ends[-1] != raw.size - 1:
+        raise ValueError("Truncated varint stream")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Position of every byte inside its varint → bit shift of its 7-bit group
+    position = np.arange(raw.size) - np.repeat(starts, ends - starts + 1)
+    if position.max() >= _MAX_VARINT_BYTES:
+        raise ValueError("Varint longer than 64 bits")
+    groups = (raw & 0x7F).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    return np.add.reduceat(groups, starts)
+
+
+def pack_series(values: Sequence[int]) -> str:
+    """Delta + zig-zag + varint + base64"""
+    values = np.asarray(values, dtype=np.int64)
+    deltas = np.diff(values, prepend=np.int64(0))
+    return base64.b64encode(varint_encode(zigzag_encode(deltas))).decode("ascii")
+
+
+def unpack_series(packed: str) -> List[int]:
+    deltas = zigzag_decode(varint_decode(base64.b64decode(packed)))
+    return np.cumsum(deltas).tolist()
+
+
+def encode_pv(
+    th_waveform: Sequence[int],
+    side_waveform: Sequence[int],
+    timestamps_ms: Optional[Sequence[int]],
+    quality: dict,
+    version: int = PV_VERSION_JSON,
+) -> dict:
+    """Build the pv document for one cycle in the requested format version"""
+    if version == PV_VERSION_JSON:
+        return {
+            "waveforms": [list(th_waveform), list(side_waveform)],
+            # optional per-sample timestamps (epoch ms)
+            **({"timestamps": list(timestamps_ms)} if timestamps_ms is not None else {}),
+            "quality": quality,
+        }
+    if version != PV_VERSION_PACKED:
+        raise ValueError(f"Unknown pv version {version}")
+
+    pv = {
+        "v": PV_VERSION_PACKED,
+        "n": len(th_waveform),
+        "waveforms": [pack_series(th_waveform), pack_series(side_waveform)],
+    }
+    if timestamps_ms is not None and len(timestamps_ms):
+        pv["t0"] = int(timestamps_ms[0])
+        pv["dt"] = pack_series(np.diff(np.asarray(timestamps_ms, dtype=np.int64)))
+    pv["quality"] = quality
+    return pv
+
+
+def decode_pv(pv: dict) -> dict:
+    """Return a pv document in version 1 layout, whatever version it was stored in"""
+    version = pv.get("v", PV_VERSION_JSON)
+    if version == PV_VERSION_JSON:
+        return pv
+    if version != PV_VERSION_PACKED:
+        raise ValueError(f"Unknown pv version {version}")
+
+    decoded = {"waveforms": [unpack_series(w) for w in pv["waveforms"]]}
+    if "t0" in pv:
+        intervals = unpack_series(pv.get("dt", ""))
+        decoded["timestamps"] = np.cumsum([pv["t0"]] + intervals).tolist()
+    decoded["quality"] = pv.get("quality", {})
+    return decoded
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Read-plan compiler for the DWP poller. Every machine on a device exposes four
+# input registers (TH/Side for L and R). Instead of one Modbus request per
+# machine, the poller compiles all addresses on a device into the fewest
+# contiguous `read_input_registers` blocks and fans the values out afterwards.
+
+# Modbus protocol limit for a single Read Input Registers request
+MODBUS_MAX_READ_REGISTERS = 125
+
+
+@dataclass(frozen=True)
+class ReadBlock:
+    """A contiguous register span read in one request.
+
+    `addresses` holds only the registers the poller actually needs; the span
+    between them is read through and discarded.
+    """
+
+    addresses: Tuple[int, ...]
+
+    @property
+    def start(self) -> int:
+        return self.addresses[0]
+
+    @property
+    def count(self) -> int:
+        return self.addresses[-1] - self.addresses[0] + 1
+
+    def __str__(self) -> str:
+        return f"{self.start}+{self.count}"
+
+
+def compile_read_plan(
+    addresses: Iterable[int],
+    round_trip_cost: int,
+    max_count: int = MODBUS_MAX_READ_REGISTERS,
+) -> List[ReadBlock]:
+    """Group register addresses into contiguous read blocks.
+
+    Cost model: every block costs `round_trip_cost` (one request/response on
+    the gateway, expressed in register-equivalents) plus one unit per register
+    transferred, gaps included. A block never spans more than `max_count`
+    registers. Addresses are sorted, so an exact DP over split points is cheap
+    (devices carry a few dozen addresses at most).
+    """
+    addrs = sorted(set(int(a) for a in addresses))
+    if not addrs:
+        return []
+
+    n = len(addrs)
+    best = [0.0] + [float("inf")] * n  # best[i]: min cost covering addrs[:i]
+    cut = [0] * (n + 1)  # cut[i]: index where the last block of best[i] starts
+    for i in range(1, n + 1):
+        last = addrs[i - 1]
+        j = i - 1
+        while j >= 0 and last - addrs[j] + 1 <= max_count:
+            cost = best[j] + round_trip_cost + (last - addrs[j] + 1)
+            if cost < best[i]:
+                best[i] = cost
+                cut[i] = j
+            j -= 1
+
+    blocks: List[ReadBlock] = []
+    i = n
+    while i > 0:
+        j = cut[i]
+        blocks.append(ReadBlock(tuple(addrs[j:i])))
+        i = j
+    blocks.reverse()
+    return blocks
+
+
+def group_blocks(
+    plan: List[ReadBlock], register_sets: Sequence[Iterable[int]]
+) -> List[Tuple[List[int], List[int]]]:
+    """Partition a plan into groups of blocks that must be read together.
+
+    Each register set (e.g. one machine's four registers) needs every block
+    holding one of its registers, so sets sharing a block land in one group.
+    Returns (block indices, register-set indices) per group, in block order.
+    """
+    block_of = {address: index for index, block in enumerate(plan) for address in block.addresses}
+    parent = list(range(len(plan)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    set_blocks = []
+    for registers in register_sets:
+        blocks = sorted({block_of[address] for address in registers})
+        for other in blocks[1:]:
+            a, b = find(blocks[0]), find(other)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+        set_blocks.append(blocks)
+
+    groups: Dict[int, Tuple[List[int], List[int]]] = {}
+    for index in range(len(plan)):
+        groups.setdefault(find(index), ([], []))[0].append(index)
+    for set_index, blocks in enumerate(set_blocks):
+        if blocks:
+            groups[find(blocks[0])][1].append(set_index)
+    return [groups[root] for root in sorted(groups)]
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""Offline replay of recorded DWP register samples through the cycle state machine.
+
+Feeds recorded samples, with their own timestamps, through
+DWPPoller.process_position and the split/validate/grade path as fast as the
+CPU allows, and collects the resulting cycles in a sink instead of MySQL.
+Thresholds can be overridden per run, so tuning becomes a reproducible batch
+job:
+
+    python replay.py recording.csv
+    python replay.py recording.csv --set CYCLE_START_THRESHOLD=2 --set MIN_DURATION_S=4
+    python replay.py recording.csv --machine mc1 --cycles-out cycles.jsonl --json
+    python replay.py week-g5.csv --jobs 8
+    python replay.py spool/capture          # a raw capture directory (dwp_poll.py --capture)
+
+Machines are independent, so --jobs replays them in parallel processes.
+
+Recording CSV columns: timestamp_ms,line,machine,th_l,th_r,side_l,side_r
+(one row per poll of one machine, the four registers poll_machine reads).
+A directory argument is read as a capture.py register capture instead.
+"""
+import argparse
+import ast
+import asyncio
+import csv
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import dwp_poll
+import waveform_analysis
+from capture import load_layout, load_records, tick_series
+from dwp_poll import DWPPoller, logger
+
+REPLAY_CHUNK_SAMPLES = 100_000  # samples converted to Python ints at a time
+OVERRIDE_MODULES = {"dwp_poll": dwp_poll, "waveform_analysis": waveform_analysis}
+
+
+# ----------------------------
+# RECORDINGS
+# ----------------------------
+@dataclass
+class MachineRecording:
+    line: str
+    machine: str
+    t_ms: np.ndarray  # epoch ms per sample, ascending
+    th_l: np.ndarray
+    th_r: np.ndarray
+    side_l: np.ndarray
+    side_r: np.ndarray
+
+    @property
+    def samples(self) -> int:
+        return int(self.t_ms.size)
+
+
+def load_csv(path: str) -> List[MachineRecording]:
+    """Read a recording CSV, one MachineRecording per (line, machine)"""
+    columns: Dict[Tuple[str, str], List[List[int]]] = defaultdict(lambda: [[], [], [], [], []])
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        idx = [header.index(name) for name in ("line", "machine", "timestamp_ms", "th_l", "th_r", "side_l", "side_r")]
+        i_line, i_machine, i_ts, *i_values = idx
+        for row in reader:
+            cols = columns[(row[i_line].strip().upper(), row[i_machine].strip())]
+            cols[0].append(int(float(row[i_ts])))
+            for col, i in zip(cols[1:], i_values):
+                col.append(int(row[i]))
+
+    recordings = []
+    for (line, machine), cols in sorted(columns.items()):
+        t_ms = np.asarray(cols[0], dtype=np.int64)
+        order = np.argsort(t_ms, kind="stable")
+        th_l, th_r, side_l, side_r = (np.asarray(c, dtype=np.int64)[order] for c in cols[1:])
+        recordings.append(MachineRecording(line, machine, t_ms[order], th_l, th_r, side_l, side_r))
+    return recordings
+
+
+def load_capture(directory: str) -> List[MachineRecording]:
+    """Rebuild per-machine polls from a raw register capture and its layout.json"""
+    recordings = []
+    for dev_id, dev in sorted(load_layout(directory).items()):
+        records = load_records(directory, int(dev_id))
+        for line, machines in dev["lines"].items():
+            for machine in machines:
+                addresses = [machine[f] for f in ("addr_th_l", "addr_th_r", "addr_side_l", "addr_side_r")]
+                wall_ms, values = tick_series(records, addresses)
+                recordings.append(
+                    MachineRecording(
+                        line.strip().upper(), machine["name"], wall_ms.astype(np.int64), *values.T
+                    )
+                )
+    return recordings
+
+
+def load_recordings(path: str) -> List[MachineRecording]:
+    return load_capture(path) if os.path.isdir(path) else load_csv(path)
+
+
+# ----------------------------
+# SINKS
+# ----------------------------
+class StatsSink:
+    """Cycle sink that only counts; any object with `async save_cycle(cycle_data) -> bool` works"""
+
+    def __init__(self):
+        self.cycles: Counter = Counter()  # (line, machine, position) → cycles
+        self.grades: Counter = Counter()
+        self.cycle_types: Counter = Counter()
+        self.total_duration_s = 0.0
+
+    async def save_cycle(self, cycle_data: dict) -> bool:
+        self.cycles[(cycle_data["line"], cycle_data["machine"], cycle_data["position"])] += 1
+        self.grades[cycle_data["quality_grade"]] += 1
+        self.cycle_types[cycle_data["cycle_type"]] += 1
+        self.total_duration_s += cycle_data.get("duration_s") or 0.0
+        return True
+
+    def merge(self, other: "StatsSink"):
+        self.cycles.update(other.cycles)
+        self.grades.update(other.grades)
+        self.cycle_types.update(other.cycle_types)
+        self.total_duration_s += other.total_duration_s
+
+    def close(self):
+        pass
+
+
+class JsonlSink(StatsSink):
+    """StatsSink that also writes every cycle as one JSON line"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.file = open(path, "w")
+
+    async def save_cycle(self, cycle_data: dict) -> bool:
+        await super().save_cycle(cycle_data)
+        self.file.write(json.dumps(cycle_data, separators=(",", ":")) + "\n")
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+# ----------------------------
+# ENGINE
+# ----------------------------
+class ReplayClock:
+    """Stands in for time.time(): returns the timestamp of the sample being replayed"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@dataclass
+class ReplayResult:
+    samples: int
+    recorded_s: float  # wall time covered by the recordings
+    elapsed_s: float  # time the replay took
+    open_cycles: int  # cycles still active when a recording ended (not saved)
+
+
+def apply_overrides(overrides: Iterable[str]) -> Dict[str, object]:
+    """Apply NAME=VALUE (or module.NAME=VALUE) overrides to the poller's constants"""
+    applied = {}
+    for override in overrides:
+        name, sep, raw = override.partition("=")
+        module_name, _, attr = name.strip().rpartition(".")
+        module = OVERRIDE_MODULES.get(module_name or "dwp_poll")
+        if not sep or module is None or not attr.isupper() or not hasattr(module, attr):
+            raise ValueError(f"Unknown setting {override!r} (expected NAME=VALUE for a constant in dwp_poll.py)")
+        value = ast.literal_eval(raw.strip())
+        setattr(module, attr, value)
+        applied[name.strip()] = value
+    return applied
+
+
+async def replay_machine(poller: DWPPoller, clock: ReplayClock, rec: MachineRecording) -> int:
+    """Replay one machine; returns the number of its cycles left open at the end"""
+    key_l = f"{rec.line}-{rec.machine}-L"
+    key_r = f"{rec.line}-{rec.machine}-R"
+    states = poller.cycle_states
+
+    # While both positions are idle only a sample reaching the start threshold
+    # can change anything, so idle stretches are skipped in one jump
+    start = dwp_poll.CYCLE_START_THRESHOLD
+    wake = np.flatnonzero(
+        (rec.th_l >= start) | (rec.side_l >= start) | (rec.th_r >= start) | (rec.side_r >= start)
+    )
+
+    for chunk_start in range(0, rec.samples, REPLAY_CHUNK_SAMPLES):
+        chunk_end = min(chunk_start + REPLAY_CHUNK_SAMPLES, rec.samples)
+        window = slice(chunk_start, chunk_end)
+        t_ms = rec.t_ms[window].tolist()
+        th_l, th_r = rec.th_l[window].tolist(), rec.th_r[window].tolist()
+        side_l, side_r = rec.side_l[window].tolist(), rec.side_r[window].tolist()
+
+        i = 0
+        n = chunk_end - chunk_start
+        while i < n:
+            state_l, state_r = states.get(key_l), states.get(key_r)
+            if (state_l is None or state_l.state == "idle") and (state_r is None or state_r.state == "idle"):
+                j = int(np.searchsorted(wake, chunk_start + i))
+                if j == wake.size or wake[j] >= chunk_end:
+                    break
+                i = int(wake[j]) - chunk_start
+            clock.now = t_ms[i] / 1000.0
+            await poller.process_position(rec.line, rec.machine, "L", th_l[i], side_l[i], key_l)
+            await poller.process_position(rec.line, rec.machine, "R", th_r[i], side_r[i], key_r)
+            i += 1
+
+    return sum(1 for key in (key_l, key_r) if key in states and states[key].state == "active")
+
+
+async def replay(recordings: List[MachineRecording], sink) -> ReplayResult:
+    clock = ReplayClock()
+    poller = DWPPoller(cycle_writer=sink, clock=clock)
+    started = time.perf_counter()
+    open_cycles = 0
+    for rec in recordings:
+        open_cycles += await replay_machine(poller, clock, rec)
+    elapsed = time.perf_counter() - started
+
+    recorded_s = sum(
+        (rec.t_ms[-1] - rec.t_ms[0]) / 1000.0 for rec in recordings if rec.samples
+    )
+    return ReplayResult(
+        samples=sum(rec.samples for rec in recordings),
+        recorded_s=recorded_s,
+        elapsed_s=elapsed,
+        open_cycles=open_cycles,
+    )
+
+
+def _replay_worker(
+    recordings: List[MachineRecording], overrides: List[str], log_level: int
+) -> Tuple[ReplayResult, StatsSink]:
+    # Workers may not inherit the parent's module state
+    apply_overrides(overrides)
+    logger.setLevel(log_level)
+    sink = StatsSink()
+    return asyncio.run(replay(recordings, sink)), sink
+
+
+def replay_parallel(
+    recordings: List[MachineRecording], overrides: List[str], jobs: int
+) -> Tuple[ReplayResult, StatsSink]:
+    """Replay machines in `jobs` processes, largest recordings first, and merge the counts"""
+    shards: List[List[MachineRecording]] = [[] for _ in range(jobs)]
+    load = [0] * jobs
+    for rec in sorted(recordings, key=lambda r: r.samples, reverse=True):
+        shard = load.index(min(load))
+        shards[shard].append(rec)
+        load[shard] += rec.samples
+
+    started = time.perf_counter()
+    sink = StatsSink()
+    samples = open_cycles = 0
+    recorded_s = 0.0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(_replay_worker, shard, overrides, logger.level) for shard in shards if shard
+        ]
+        for future in futures:
+            result, shard_sink = future.result()
+            sink.merge(shard_sink)
+            samples += result.samples
+            recorded_s += result.recorded_s
+            open_cycles += result.open_cycles
+    return ReplayResult(samples, recorded_s, time.perf_counter() - started, open_cycles), sink
+
+
+# ----------------------------
+# REPORT
+# ----------------------------
+def build_report(result: ReplayResult, sink: StatsSink, overrides: Dict[str, object]) -> dict:
+    total = sum(sink.cycles.values())
+    return {
+        "overrides": overrides,
+        "samples": result.samples,
+        "recorded_hours": round(result.recorded_s / 3600, 2),
+        "elapsed_s": round(result.elapsed_s, 3),
+        "samples_per_s": round(result.samples / result.elapsed_s) if result.elapsed_s else None,
+        "cycles": total,
+        "open_cycles": result.open_cycles,
+        "mean_duration_s": round(sink.total_duration_s / total, 2) if total else None,
+        "per_position": {
+            f"{line}-mc{machine}-{pos}": count for (line, machine, pos), count in sorted(sink.cycles.items())
+        },
+        "grades": dict(sink.grades.most_common()),
+        "cycle_types": dict(sink.cycle_types.most_common()),
+    }
+
+
+def print_report(report: dict):
+    speedup = report["recorded_hours"] * 3600 / report["elapsed_s"] if report["elapsed_s"] else 0
+    print(f"🔁 Replayed {report['samples']} samples ({report['recorded_hours']} h recorded) "
+          f"in {report['elapsed_s']}s — {report['samples_per_s']} samples/s, {speedup:.0f}x real time")
+    if report["overrides"]:
+        print(f"⚙️  Overrides: {report['overrides']}")
+    print(f"📊 Cycles: {report['cycles']} (still open at end: {report['open_cycles']}), "
+          f"mean duration {report['mean_duration_s']}s")
+    for key, count in report["per_position"].items():
+        print(f"   {key:<16} {count}")
+    total = report["cycles"] or 1
+    print("🎯 Grades:")
+    for grade, count in report["grades"].items():
+        print(f"   {grade:<16} {count:>7} ({count / total:.1%})")
+    print("🏷️  Cycle types:")
+    for cycle_type, count in report["cycle_types"].items():
+        print(f"   {cycle_type:<16} {count:>7} ({count / total:.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded DWP samples through the cycle state machine")
+    parser.add_argument("recordings", nargs="+", help="Recording CSV file(s) or capture directories")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a dwp_poll.py constant, e.g. CYCLE_START_THRESHOLD=2 (repeatable)")
+    parser.add_argument("--line", help="Replay only this line")
+    parser.add_argument("--machine", "-m", help="Replay only this machine name (e.g., mc1)")
+    parser.add_argument("--cycles-out", help="Also write every cycle to this JSONL file (single process only)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Replay machines in this many processes")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.setLevel(args.log_level.upper())
+    try:
+        applied = apply_overrides(args.overrides)
+    except (ValueError, SyntaxError) as e:
+        parser.error(str(e))
+
+    recordings = [rec for path in args.recordings for rec in load_recordings(path)]
+    if args.line:
+        recordings = [rec for rec in recordings if rec.line == args.line.strip().upper()]
+    if args.machine:
+        recordings = [rec for rec in recordings if rec.machine == args.machine]
+
+    if args.jobs > 1:
+        if args.cycles_out:
+            parser.error("--cycles-out needs --jobs 1")
+        result, sink = replay_parallel(recordings, args.overrides, args.jobs)
+    else:
+        sink = JsonlSink(args.cycles_out) if args.cycles_out else StatsSink()
+        try:
+            result = asyncio.run(replay(recordings, sink))
+        finally:
+            sink.close()
+
+    report = build_report(result, sink, applied)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
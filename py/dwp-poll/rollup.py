@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+# Incremental rollups of ins_dwp_counts into ins_dwp_rollups: per minute and
+# per shift, per line/machine/position, the cycle count, counts per grade and
+# sum/sum of squares/min/max of the peaks and durations (mean and standard
+# deviation follow from those). The cycle writer aggregates every batch with
+# RollupAggregator and upserts the deltas in the same transaction as the
+# cycle INSERT, so the rollups never drift from the table they summarize.
+# backfill_rollups.py rebuilds them from history with the same aggregator.
+
+PERIOD_MINUTE = "minute"
+PERIOD_SHIFT = "shift"
+
+GRADES = (
+    "EXCELLENT", "GOOD", "MARGINAL", "DEFECTIVE", "SENSOR_LOW", "PRESSURE_HIGH", "SHORT_CYCLE", "OVERFLOW", "TIMEOUT"
+)
+GRADE_COLUMNS = tuple(f"grade_{grade.lower()}" for grade in GRADES) + ("grade_other",)
+_GRADE_INDEX = {grade: i for i, grade in enumerate(GRADES)}
+
+KEY_COLUMNS = ("period", "period_start", "shift", "line", "mechine", "position")
+_SUM_COLUMNS = ("cycles", "good_cycles") + GRADE_COLUMNS
+_MOMENT_SERIES = ("peak_th", "peak_side", "duration")
+ROLLUP_COLUMNS = (
+    KEY_COLUMNS
+    + _SUM_COLUMNS
+    + tuple(f"{series}_{moment}" for series in _MOMENT_SERIES for moment in ("sum", "sumsq", "min", "max"))
+)
+
+# (period, period start as epoch seconds, shift number (None for minutes), line, machine, position)
+RollupKey = Tuple[str, int, Optional[int], str, int, str]
+
+
+@dataclass
+class Moments:
+    sum: float = 0.0
+    sumsq: float = 0.0
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    def add(self, value: float):
+        self.sum += value
+        self.sumsq += value * value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def values(self) -> tuple:
+        return (self.sum, self.sumsq, self.min, self.max)
+
+
+@dataclass
+class RollupStats:
+    cycles: int = 0
+    good_cycles: int = 0  # th_ok and side_ok
+    grades: List[int] = field(default_factory=lambda: [0] * len(GRADE_COLUMNS))
+    peak_th: Moments = field(default_factory=Moments)
+    peak_side: Moments = field(default_factory=Moments)
+    duration: Moments = field(default_factory=Moments)
+
+
+@lru_cache(maxsize=256)
+def _shift_of_hour(hour_start: int, start_hours: Tuple[int, ...]) -> Tuple[int, int]:
+    local = datetime.fromtimestamp(hour_start)
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    # The latest shift start at or before this hour; the last shift of the
+    # previous day covers the hours before the first start
+    starts = [
+        (midnight + timedelta(hours=hour), number)
+        for midnight in (day - timedelta(days=1), day)
+        for number, hour in enumerate(start_hours, 1)
+    ]
+    start, number = max(s for s in starts if s[0] <= local)
+    return number, int(start.timestamp())
+
+
+def shift_of(epoch: float, start_hours: Sequence[int]) -> Tuple[int, int]:
+    """(shift number, shift start as epoch seconds) of a local-time instant.
+
+    start_hours are the local hours the shifts start at, e.g. (6, 14, 22).
+    """
+    return _shift_of_hour(int(epoch) // 3600 * 3600, tuple(sorted(start_hours)))
+
+
+class RollupAggregator:
+    def __init__(self, shift_start_hours: Sequence[int]):
+        self.shift_start_hours = tuple(sorted(shift_start_hours))
+        self.buckets: Dict[RollupKey, RollupStats] = {}
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def add(self, row: Mapping):
+        """Aggregate one ins_dwp_counts row, given as column → value (created_at in epoch seconds)"""
+        at = float(row["created_at"])
+        shift, shift_start = shift_of(at, self.shift_start_hours)
+        position = (row["line"], int(row["mechine"]), row["position"])
+        minute_key = (PERIOD_MINUTE, int(at) // 60 * 60, None) + position
+        for key in (minute_key, (PERIOD_SHIFT, shift_start, shift) + position):
+            stats = self.buckets.get(key)
+            if stats is None:
+                stats = self.buckets[key] = RollupStats()
+            stats.cycles += 1
+            stats.good_cycles += 1 if row["th_ok"] and row["side_ok"] else 0
+            stats.grades[_GRADE_INDEX.get(row["grade"], len(GRADES))] += 1
+            if row["peak_th"] is not None:
+                stats.peak_th.add(row["peak_th"])
+            if row["peak_side"] is not None:
+                stats.peak_side.add(row["peak_side"])
+            if row["duration"] is not None:
+                stats.duration.add(float(row["duration"]))
+
+    def rows(self) -> List[tuple]:
+        """Rollup deltas in ROLLUP_COLUMNS order"""
+        return [
+            (
+                *key,
+                stats.cycles,
+                stats.good_cycles,
+                *stats.grades,
+                *stats.peak_th.values(),
+                *stats.peak_side.values(),
+                *stats.duration.values(),
+            )
+            for key, stats in self.buckets.items()
+        ]
+
+    def clear(self):
+        self.buckets.clear()
+
+
+def upsert_sql(row_count: int) -> str:
+    """Multi-row upsert that adds deltas to existing rollup rows"""
+    row_placeholder = "(%s, FROM_UNIXTIME(%s), " + ", ".join(["%s"] * (len(ROLLUP_COLUMNS) - 2)) + ", NOW(), NOW())"
+    updates = []
+    for column in ROLLUP_COLUMNS[len(KEY_COLUMNS) :]:
+        # LEAST/GREATEST are NULL if either side is: fall back to whichever is set
+        if column.endswith("_min"):
+            updates.append(
+                f"`{column}` = COALESCE(LEAST(`{column}`, VALUES(`{column}`)), `{column}`, VALUES(`{column}`))"
+            )
+        elif column.endswith("_max"):
+            updates.append(
+                f"`{column}` = COALESCE(GREATEST(`{column}`, VALUES(`{column}`)), `{column}`, VALUES(`{column}`))"
+            )
+        else:
+            updates.append(f"`{column}` = `{column}` + VALUES(`{column}`)")
+    updates.append("`updated_at` = NOW()")
+    columns = ", ".join(f"`{column}`" for column in ROLLUP_COLUMNS)
+    return (
+        f"INSERT INTO `ins_dwp_rollups` ({columns}, `created_at`, `updated_at`) "
+        f"VALUES {', '.join([row_placeholder] * row_count)} "
+        f"ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+    )
+
+
+async def upsert_rollups(cur, aggregator: RollupAggregator):
+    """Add the aggregator's deltas to ins_dwp_rollups (caller owns the transaction)"""
+    rows = aggregator.rows()
+    if rows:
+        await cur.execute(upsert_sql(len(rows)), [value for row in rows for value in row])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# Drift-free tick scheduling for the DWP poller. Deadlines are absolute
+# (start + n * interval on the monotonic clock), so time spent polling never
+# accumulates into drift, and a late tick is explicitly accounted for instead
+# of silently stretching the sample interval.
+
+CATCHUP_SKIP = "skip"  # drop missed deadlines, resume on the latest one
+CATCHUP_BURST = "burst"  # run missed ticks back-to-back (bounded by max_burst)
+
+
+@dataclass
+class Tick:
+    deadline: float  # scheduled start (monotonic seconds)
+    started: float  # actual start (monotonic seconds)
+    overrun: bool  # deadline had already passed when the previous tick finished
+    skipped: int  # deadlines dropped before this tick
+
+    @property
+    def jitter(self) -> float:
+        return self.started - self.deadline
+
+
+class TickScheduler:
+    def __init__(
+        self,
+        interval: float,
+        catch_up: str = CATCHUP_SKIP,
+        max_burst: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if catch_up not in (CATCHUP_SKIP, CATCHUP_BURST):
+            raise ValueError(f"Unknown catch-up policy: {catch_up}")
+        self.interval = interval
+        self.catch_up = catch_up
+        self.max_burst = max(1, max_burst)
+        self.clock = clock
+        self.next_deadline: Optional[float] = None
+
+    async def wait(self) -> Tick:
+        """Sleep until the next deadline and describe how the tick was scheduled"""
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+
+        deadline = self.next_deadline
+        overrun = now > deadline
+        skipped = 0
+        if overrun:
+            # Whole intervals that passed after this tick's deadline
+            behind = int((now - deadline) // self.interval)
+            if self.catch_up == CATCHUP_SKIP:
+                skipped = behind
+            else:
+                skipped = max(0, behind - self.max_burst)
+            deadline += skipped * self.interval
+        else:
+            await asyncio.sleep(deadline - now)
+
+        self.next_deadline = deadline + self.interval
+        return Tick(deadline=deadline, started=self.clock(), overrun=overrun, skipped=skipped)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Cycle segmentation shared by DWPPoller and cycle_splitter. Run boundaries of
+# the above-threshold signal and the lengths of low ("zero") runs are computed
+# once with run-length encoding, so mapping every peak to its sub-cycle and
+# checking the zero gap between neighbouring peaks is O(n) overall instead of
+# rescanning the buffer per peak. StreamingSegmenter applies the same zero-gap
+# rule online, so the poller knows when a stroke has ended and the sub-cycles
+# before it can be saved while the run continues.
+
+
+@dataclass
+class PeakSegment:
+    number: int  # position of the peak in the peak list
+    peak: int  # sample index of the peak
+    start: int  # first sample of the sub-cycle
+    end: int  # last sample of the sub-cycle (inclusive)
+    # True when no zero gap separates this peak from the previous one: the
+    # peak belongs to the previous sub-cycle and must not be saved on its own
+    merged: bool = False
+
+
+def combine_channels(th: Sequence[int], side: Sequence[int]) -> np.ndarray:
+    """Element-wise max of TH/Side, to reason about physical gaps"""
+    th = np.asarray(th)
+    side = np.asarray(side)
+    if th.size and side.size:
+        return np.maximum(th, side)
+    return th if th.size else side
+
+
+def segment_peaks(
+    combined: np.ndarray,
+    peaks: Sequence[int],
+    end_threshold: int,
+    min_zero_gap: int,
+) -> List[PeakSegment]:
+    """Map every peak to the above-threshold run around it.
+
+    A sample is "high" when combined > end_threshold. A peak's sub-cycle
+    reaches outward from the peak over the high samples on either side: the
+    high run containing it, or for a low peak the peak plus the high runs
+    right next to it.
+    Consecutive peaks only start a new sub-cycle when at least
+    `min_zero_gap` consecutive low samples lie strictly between them.
+    """
+    combined = np.asarray(combined)
+    n = combined.size
+    if n == 0 or len(peaks) == 0:
+        return []
+
+    high = combined > end_threshold
+    idx = np.arange(n)
+
+    # High-run boundaries for every sample: last low index before / first low index after
+    prev_low = np.maximum.accumulate(np.where(high, -1, idx))
+    next_low = np.minimum.accumulate(np.where(high, n, idx)[::-1])[::-1]
+
+    # Length of the low run ending at each sample, and a prefix count of the
+    # samples that close a low run of at least min_zero_gap
+    prev_high = np.maximum.accumulate(np.where(high, idx, -1))
+    low_run = idx - prev_high
+    gap_closes = np.concatenate(([0], np.cumsum(low_run >= min_zero_gap)))
+
+    def has_zero_gap(first: int, last: int) -> bool:
+        # A gap fits in [first, last] iff some i in [first + gap - 1, last] closes one
+        lo = first + min_zero_gap - 1
+        if lo > last:
+            return False
+        return gap_closes[last + 1] - gap_closes[lo] > 0
+
+    segments = []
+    prev_peak = None
+    for number, peak in enumerate(peaks):
+        peak = int(peak)
+        merged = prev_peak is not None and not has_zero_gap(prev_peak + 1, peak - 1)
+        start = int(prev_low[peak - 1]) + 1 if peak > 0 else 0
+        end = int(next_low[peak + 1]) - 1 if peak < n - 1 else n - 1
+        segments.append(PeakSegment(number, peak, start, end, merged))
+        prev_peak = peak
+    return segments
+
+
+class StreamingSegmenter:
+    """Incremental zero-gap detector for one position, fed sample by sample.
+
+    Tracks the current group of high samples (first/last index, running peak)
+    and the length of the current low run. When a high sample arrives after at
+    least `min_zero_gap` low samples, the previous group is a finished
+    sub-cycle and `feed` reports its bounds.
+    """
+
+    __slots__ = (
+        "end_threshold",
+        "min_zero_gap",
+        "zero_run",
+        "first_high",
+        "last_high",
+        "peak_value",
+        "peak_index",
+    )
+
+    def __init__(self, end_threshold: int, min_zero_gap: int):
+        self.end_threshold = end_threshold
+        self.min_zero_gap = min_zero_gap
+        self.reset()
+
+    def reset(self):
+        self.zero_run = 0
+        self.first_high = -1  # -1: no high sample in the current group yet
+        self.last_high = -1
+        self.peak_value = 0
+        self.peak_index = -1
+
+    def feed(self, index: int, value: int) -> Optional[Tuple[int, int]]:
+        """Add the combined (max TH/Side) sample at buffer `index`.
+
+        Returns (first_high, last_high) of the group that just closed, or None.
+        """
+        if value <= self.end_threshold:
+            self.zero_run += 1
+            return None
+
+        closed = None
+        if self.first_high >= 0 and self.zero_run >= self.min_zero_gap:
+            closed = (self.first_high, self.last_high)
+            self.first_high = -1
+            self.peak_value = 0
+        if self.first_high < 0:
+            self.first_high = index
+        self.last_high = index
+        if value > self.peak_value:
+            self.peak_value = value
+            self.peak_index = index
+        self.zero_run = 0
+        return closed
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from metrics import MetricsRegistry, MetricsServer
+
+# Sharded polling. A supervisor process runs N copies of dwp_poll.py, each
+# started with `--shard i --shards N`; every worker loads ins_dwp_devices as
+# usual and keeps only the devices the hash ring assigns to it. Devices that
+# share a line are kept in one shard, because the per-line cycle counter is
+# cached in the worker's process. Consistent hashing means changing N only
+# moves ~1/N of the devices. When a device config reload moves a line to
+# another shard, the old owner stops polling it, writes out its spooled cycles
+# and drops its counter; the new owner waits for that before it starts.
+#
+# The supervisor restarts shards that exit (or stop answering their metrics
+# endpoint), scrapes every shard's /metrics, logs a fleet health summary and
+# serves the merged metrics, with a `shard` label, on its own port.
+
+logger = logging.getLogger("DWP")
+
+HASH_RING_REPLICAS = 128  # virtual nodes per shard
+
+# Graceful shard stop. On Windows send_signal(SIGTERM) is TerminateProcess, which
+# would skip the shard's spool flush and line release, so shards get their own
+# process group there and are sent CTRL_BREAK_EVENT (SIGBREAK in the shard).
+if sys.platform == "win32":
+    SHARD_CREATION_FLAGS = subprocess.CREATE_NEW_PROCESS_GROUP
+    SHARD_STOP_SIGNAL = signal.CTRL_BREAK_EVENT
+else:
+    SHARD_CREATION_FLAGS = 0
+    SHARD_STOP_SIGNAL = signal.SIGTERM
+
+
+def _hash(key: str) -> int:
+    # Stable across processes and Python versions, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, shards: int, replicas: int = HASH_RING_REPLICAS):
+        if shards < 1:
+            raise ValueError(f"Shard count must be at least 1, got {shards}")
+        self.shards = shards
+        points = sorted(
+            (_hash(f"shard-{shard}-{replica}"), shard) for shard in range(shards) for replica in range(replicas)
+        )
+        self.points = [point for point, _ in points]
+        self.owners = [shard for _, shard in points]
+
+    def shard_for(self, key) -> int:
+        index = bisect_right(self.points, _hash(str(key))) % len(self.points)
+        return self.owners[index]
+
+
+def device_groups(device_lines: Dict[int, Iterable[str]]) -> List[List[int]]:
+    """Devices connected through a shared line, each group sorted by id"""
+    parent = {dev_id: dev_id for dev_id in device_lines}
+
+    def find(dev_id: int) -> int:
+        while parent[dev_id] != dev_id:
+            parent[dev_id] = parent[parent[dev_id]]
+            dev_id = parent[dev_id]
+        return dev_id
+
+    line_owner: Dict[str, int] = {}
+    for dev_id in sorted(device_lines):
+        for line in device_lines[dev_id]:
+            other = line_owner.setdefault(line, dev_id)
+            a, b = find(other), find(dev_id)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    groups: Dict[int, List[int]] = {}
+    for dev_id in sorted(device_lines):
+        groups.setdefault(find(dev_id), []).append(dev_id)
+    return list(groups.values())
+
+
+def assign_shards(device_lines: Dict[int, Iterable[str]], shards: int) -> Dict[int, int]:
+    """device id → shard index; a group of line-sharing devices hashes by its lowest id"""
+    ring = HashRing(shards)
+    assignment = {}
+    for group in device_groups(device_lines):
+        shard = ring.shard_for(group[0])
+        for dev_id in group:
+            assignment[dev_id] = shard
+    return assignment
+
+
+def add_signal_handler(loop: asyncio.AbstractEventLoop, signum: int, callback):
+    """loop.add_signal_handler, falling back to signal.signal where the loop has no
+    signal support (Windows)"""
+    try:
+        loop.add_signal_handler(signum, callback)
+    except NotImplementedError:
+        signal.signal(signum, lambda *_: loop.call_soon_threadsafe(callback))
+
+
+def shard_path(path: str, shard: int) -> str:
+    """Per-shard variant of a file path: spool/cycles.db → spool/cycles-shard2.db"""
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}-shard{shard}{p.suffix}"))
+
+
+# ----------------------------
+# METRICS AGGREGATION
+# ----------------------------
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)")
+_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def _family(sample_name: str, families: Dict[str, dict]) -> str:
+    if sample_name in families:
+        return sample_name
+    for suffix in _SUFFIXES:
+        if sample_name.endswith(suffix) and sample_name[: -len(suffix)] in families:
+            return sample_name[: -len(suffix)]
+    return sample_name
+
+
+def merge_expositions(texts: Dict[int, str]) -> str:
+    """Merge Prometheus text expositions of several shards, adding a `shard` label"""
+    families: Dict[str, dict] = {}
+    for shard, text in sorted(texts.items()):
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, {"headers": [], "samples": []})
+                if len(family["headers"]) < 2:
+                    family["headers"].append(line)
+                continue
+            match = _SAMPLE.match(line)
+            if not match:
+                continue
+            name, labels, value = match.groups()
+            label = f'shard="{shard}"'
+            labels = "{" + label + ("," + labels[1:] if labels and labels != "{}" else "}")
+            families.setdefault(_family(name, families), {"headers": [], "samples": []})["samples"].append(
+                f"{name}{labels} {value}"
+            )
+    lines: List[str] = []
+    for family in families.values():
+        lines.extend(family["headers"])
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def sample_values(text: str, name: str) -> List[float]:
+    """Values of every sample of one metric name in an exposition"""
+    values = []
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match and match.group(1) == name:
+            values.append(float(match.group(3)))
+    return values
+
+
+class ShardRegistry(MetricsRegistry):
+    """Supervisor metrics followed by the merged metrics of every shard"""
+
+    def __init__(self):
+        super().__init__()
+        self.shard_texts: Dict[int, str] = {}
+
+    def render(self) -> str:
+        return super().render() + merge_expositions(self.shard_texts)
+
+
+async def scrape(host: str, port: int, timeout: float) -> str:
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise ConnectionError(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    return body.decode()
+
+
+# ----------------------------
+# SUPERVISOR
+# ----------------------------
+@dataclass
+class ShardState:
+    index: int
+    metrics_port: int
+    process: Optional[asyncio.subprocess.Process] = None
+    started_at: float = 0.0  # monotonic
+    restarts: int = 0
+    last_exit: Optional[int] = None
+    last_scrape_ok: Optional[float] = None  # monotonic
+    backoff_sec: float = 0.0
+
+
+class ShardSupervisor:
+    def __init__(
+        self,
+        shards: int,
+        worker_args: List[str],
+        metrics_host: str,
+        metrics_port: int,
+        shard_metrics_base_port: int,
+        spool_path: Optional[str] = None,
+        health_interval_sec: float = 5.0,
+        hang_timeout_sec: float = 60.0,
+        restart_backoff_max_sec: float = 60.0,
+        stable_after_sec: float = 60.0,
+        summary_interval_sec: float = 60.0,
+    ):
+        """worker_args: extra dwp_poll.py arguments passed to every shard (e.g. --machine mc1)"""
+        HashRing(shards)  # validate the count up front
+        self.shards = [ShardState(i, shard_metrics_base_port + i) for i in range(shards)]
+        self.worker_args = worker_args
+        self.spool_path = spool_path
+        self.metrics_host = metrics_host
+        self.metrics_port = metrics_port
+        self.health_interval_sec = health_interval_sec
+        self.hang_timeout_sec = hang_timeout_sec
+        self.restart_backoff_max_sec = restart_backoff_max_sec
+        self.stable_after_sec = stable_after_sec
+        self.summary_interval_sec = summary_interval_sec
+        self.running = True
+        self.registry = ShardRegistry()
+        self.shard_up = self.registry.gauge("dwp_shard_up", "1 if the shard process is running", ("shard",))
+        self.shard_restarts = self.registry.counter(
+            "dwp_shard_restarts_total", "Shard processes restarted by the supervisor", ("shard",)
+        )
+        self.registry.add_collector(self.collect_metrics)
+        self.metrics_server: Optional[MetricsServer] = None
+
+    def worker_command(self, shard: ShardState) -> List[str]:
+        return [
+            sys.executable,
+            str(Path(__file__).resolve().parent / "dwp_poll.py"),
+            "--shard", str(shard.index),
+            "--shards", str(len(self.shards)),
+            "--metrics-port", str(shard.metrics_port),
+            *self.worker_args,
+        ]
+
+    async def start_shard(self, shard: ShardState):
+        shard.process = await asyncio.create_subprocess_exec(
+            *self.worker_command(shard),
+            env={**os.environ, "DWP_METRICS_HOST": "127.0.0.1"},
+            creationflags=SHARD_CREATION_FLAGS,
+        )
+        shard.started_at = time.monotonic()
+        shard.last_scrape_ok = None
+        logger.info(f"🧩 Shard {shard.index}/{len(self.shards)} started (pid {shard.process.pid}, metrics :{shard.metrics_port})")
+
+    async def watch_shard(self, shard: ShardState):
+        """Keep one shard running, restarting it with exponential backoff"""
+        while self.running:
+            await self.start_shard(shard)
+            shard.last_exit = await shard.process.wait()
+            self.registry.shard_texts.pop(shard.index, None)
+            if not self.running:
+                break
+            uptime = time.monotonic() - shard.started_at
+            if uptime >= self.stable_after_sec:
+                shard.backoff_sec = 0.0
+            shard.backoff_sec = min(max(1.0, shard.backoff_sec * 2), self.restart_backoff_max_sec)
+            shard.restarts += 1
+            logger.error(
+                f"❌ Shard {shard.index} exited with code {shard.last_exit} after {uptime:.0f}s | "
+                f"restarting in {shard.backoff_sec:.0f}s (restarts={shard.restarts})"
+            )
+            await asyncio.sleep(shard.backoff_sec)
+
+    async def check_health(self):
+        """Scrape every shard; kill shards whose event loop stopped answering"""
+        while self.running:
+            now = time.monotonic()
+            for shard in self.shards:
+                if shard.process is None or shard.process.returncode is not None:
+                    continue
+                try:
+                    self.registry.shard_texts[shard.index] = await scrape(
+                        "127.0.0.1", shard.metrics_port, self.health_interval_sec
+                    )
+                    shard.last_scrape_ok = now
+                except (OSError, asyncio.TimeoutError, ConnectionError):
+                    silent_since = shard.last_scrape_ok or shard.started_at
+                    if now - silent_since > self.hang_timeout_sec:
+                        logger.error(
+                            f"❌ Shard {shard.index} (pid {shard.process.pid}) unresponsive for "
+                            f"{now - silent_since:.0f}s — killing"
+                        )
+                        shard.process.kill()
+            await asyncio.sleep(self.health_interval_sec)
+
+    def collect_metrics(self):
+        for shard in self.shards:
+            running = shard.process is not None and shard.process.returncode is None
+            self.shard_up.set(1 if running else 0, shard.index)
+            self.shard_restarts.set(shard.restarts, shard.index)
+
+    async def log_summary(self):
+        while self.running:
+            await asyncio.sleep(self.summary_interval_sec)
+            parts = []
+            for shard in self.shards:
+                text = self.registry.shard_texts.get(shard.index, "")
+                online = sample_values(text, "dwp_device_online")
+                overruns = sum(sample_values(text, "dwp_poll_overruns_total"))
+                up = shard.process is not None and shard.process.returncode is None
+                parts.append(
+                    f"#{shard.index} {'up' if up else 'DOWN'} {int(sum(online))}/{len(online)} online, "
+                    f"{overruns:.0f} overruns, {shard.restarts} restarts"
+                )
+            logger.info(f"🧩 Shards: {' | '.join(parts)}")
+
+    async def stop_shards(self, timeout: float = 15.0):
+        processes = [s.process for s in self.shards if s.process is not None and s.process.returncode is None]
+        for process in processes:
+            process.send_signal(SHARD_STOP_SIGNAL)
+        try:
+            await asyncio.wait_for(asyncio.gather(*(p.wait() for p in processes)), timeout)
+        except asyncio.TimeoutError:
+            for process in processes:
+                if process.returncode is None:
+                    logger.warning(f"⚠️ Shard pid {process.pid} did not stop in {timeout:.0f}s — killing")
+                    process.kill()
+            await asyncio.gather(*(p.wait() for p in processes))
+
+    def warn_orphan_spools(self):
+        """Spool files of shard indexes beyond the current count are never drained"""
+        if not self.spool_path:
+            return
+        pattern = Path(shard_path(self.spool_path, 0)).name.replace("shard0", "shard*")
+        for path in sorted(Path(self.spool_path).parent.glob(pattern)):
+            index = path.stem.rsplit("-shard", 1)[-1]
+            if index.isdigit() and int(index) >= len(self.shards):
+                logger.warning(
+                    f"⚠️ Spool {path} belongs to shard {index}, which is not running with "
+                    f"{len(self.shards)} shard(s) — restart with more shards to deliver its cycles"
+                )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+
+        def request_stop():
+            if stop.is_set():
+                return
+            logger.info("🛑 Shutdown signal received — stopping shards...")
+            self.running = False
+            stop.set()
+
+        def forward_reload():
+            logger.info("🔃 SIGHUP received — asking shards to reload device config")
+            for shard in self.shards:
+                if shard.process is not None and shard.process.returncode is None:
+                    shard.process.send_signal(signal.SIGHUP)
+
+        add_signal_handler(loop, signal.SIGINT, request_stop)
+        add_signal_handler(loop, signal.SIGTERM, request_stop)
+        if hasattr(signal, "SIGHUP"):  # not on Windows, where shards reload on their interval only
+            add_signal_handler(loop, signal.SIGHUP, forward_reload)
+
+        logger.info(f"🧩 Supervisor starting {len(self.shards)} shard(s)")
+        self.warn_orphan_spools()
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.registry, self.metrics_host, self.metrics_port)
+            await self.metrics_server.start()
+        tasks = [asyncio.create_task(self.watch_shard(shard)) for shard in self.shards]
+        tasks.append(asyncio.create_task(self.check_health()))
+        tasks.append(asyncio.create_task(self.log_summary()))
+        try:
+            await stop.wait()
+        finally:
+            self.running = False
+            await self.stop_shards()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.metrics_server is not None:
+                await self.metrics_server.close()
+            logger.info("👋 Supervisor stopped.")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Local append-only spool for completed cycles. Every cycle is committed to a
+# SQLite database in WAL mode before it is sent to MySQL, so a slow or
+# unreachable database never loses data: the cycle writer drains the spool in
+# batches and deletes rows only after MySQL accepted them. Cycles MySQL keeps
+# rejecting on their own (bad data, schema mismatch) are moved to the
+# dead_cycles table with the error instead, so they don't block the rest.
+# Once the cause is fixed they can be requeued with:
+#   INSERT INTO cycles (cycle_uid, payload, spooled_at)
+#       SELECT cycle_uid, payload, spooled_at FROM dead_cycles;
+#   DELETE FROM dead_cycles;
+# In sharded mode a shard that stops polling a line records it in
+# released_lines once the line's cycles are out of its spool; the shard that
+# takes the line over reads that (see `line_released`) before it starts.
+
+logger = logging.getLogger("DWP")
+
+
+class CycleSpool:
+    def __init__(self, path: str, synchronous: str = "NORMAL"):
+        """synchronous: SQLite durability level; NORMAL survives process crashes,
+        FULL also survives power loss at the cost of an fsync per cycle."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cycles (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                cycle_uid TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                spooled_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_cycles (
+                seq INTEGER PRIMARY KEY,
+                cycle_uid TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                spooled_at REAL NOT NULL,
+                error TEXT,
+                failed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS released_lines (
+                line TEXT PRIMARY KEY,
+                released_at REAL NOT NULL
+            )
+            """
+        )
+        self.depth = self.conn.execute("SELECT COUNT(*) FROM cycles").fetchone()[0]
+        self.dead = self.conn.execute("SELECT COUNT(*) FROM dead_cycles").fetchone()[0]
+
+    def append(self, cycle_data: dict) -> str:
+        """Durably store a cycle and return its unique ID"""
+        cycle_uid = cycle_data.get("cycle_uid") or str(uuid.uuid4())
+        cycle_data["cycle_uid"] = cycle_uid
+        # Replays must keep the original cycle time, not the time MySQL came back
+        cycle_data.setdefault("recorded_at", time.time())
+        self.conn.execute(
+            "INSERT INTO cycles (cycle_uid, payload, spooled_at) VALUES (?, ?, ?)",
+            (cycle_uid, json.dumps(cycle_data, separators=(",", ":")), time.time()),
+        )
+        self.depth += 1
+        return cycle_uid
+
+    def pending(self, limit: int) -> List[Tuple[int, dict, int]]:
+        """Oldest spooled cycles as (seq, cycle_data, attempts)"""
+        rows = self.conn.execute(
+            "SELECT seq, payload, attempts FROM cycles ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+        return [(seq, json.loads(payload), attempts) for seq, payload, attempts in rows]
+
+    def ack(self, seqs: List[int]):
+        """Forget cycles MySQL has accepted"""
+        if not seqs:
+            return
+        self.conn.execute(
+            f"DELETE FROM cycles WHERE seq IN ({', '.join('?' * len(seqs))})", seqs
+        )
+        self.depth = max(0, self.depth - len(seqs))
+
+    def mark_attempt(self, seqs: List[int]):
+        """Record a failed delivery; the next attempt must check for duplicates"""
+        if not seqs:
+            return
+        self.conn.execute(
+            f"UPDATE cycles SET attempts = attempts + 1 WHERE seq IN ({', '.join('?' * len(seqs))})",
+            seqs,
+        )
+
+    def dead_letter(self, seq: int, error: Optional[str]):
+        """Move a cycle MySQL rejects out of the queue, keeping it and the error"""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            moved = self.conn.execute(
+                """
+                INSERT INTO dead_cycles (seq, cycle_uid, payload, attempts, spooled_at, error, failed_at)
+                SELECT seq, cycle_uid, payload, attempts, spooled_at, ?, ? FROM cycles WHERE seq = ?
+                """,
+                (error, time.time(), seq),
+            ).rowcount
+            self.conn.execute("DELETE FROM cycles WHERE seq = ?", (seq,))
+        self.depth = max(0, self.depth - moved)
+        self.dead += moved
+
+    def release_lines(self, lines: List[str]):
+        """Record that this process no longer polls these lines"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO released_lines (line, released_at) VALUES (?, ?)",
+            [(line, now) for line in lines],
+        )
+
+    def close(self):
+        try:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Spool checkpoint failed: {e}")
+        self.conn.close()
+
+
+def line_released(path: str, line: str, since: float) -> bool:
+    """True if the spool at `path` released `line` after `since` (epoch) and holds none of its
+    cycles any more. Opens the file read-only, so it can check another process's spool."""
+    if not Path(path).exists():
+        return False
+    try:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return False
+    try:
+        released = conn.execute("SELECT released_at FROM released_lines WHERE line = ?", (line,)).fetchone()
+        if released is None or released[0] < since:
+            return False
+        spooled = conn.execute(
+            "SELECT 1 FROM cycles WHERE json_extract(payload, '$.line') = ? LIMIT 1", (line,)
+        ).fetchone()
+        return spooled is None
+    except sqlite3.Error:
+        # e.g. a spool from before released_lines existed
+        return False
+    finally:
+        conn.close()
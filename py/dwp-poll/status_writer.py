@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional, Tuple
+
+# Write-behind for device status transitions (`log_dwp_uptime`). The poller
+# records a transition with `StatusWriter.log`, which only appends it to an
+# in-memory queue; a background task writes the queue to MySQL as multi-row
+# INSERTs. Rows carry the time of the transition, so batching doesn't shift
+# `logged_at`. Unlike cycles, statuses are not spooled to disk: if MySQL is
+# down for long enough, the oldest queued transitions are dropped.
+
+logger = logging.getLogger("DWP")
+
+# (device id, status, message, duration in previous state (s), epoch seconds)
+StatusRow = Tuple[int, str, Optional[str], Optional[int], float]
+
+
+@dataclass
+class StatusWriterStats:
+    enqueued: int = 0
+    written: int = 0
+    rejected: int = 0  # rows for devices missing from ins_dwp_devices
+    dropped: int = 0  # oldest rows discarded while the queue was full
+    failed_batches: int = 0
+
+
+class StatusWriter:
+    def __init__(
+        self,
+        db,
+        batch_size: int,
+        flush_interval_sec: float,
+        retry_interval_sec: float,
+        max_queued: int,
+    ):
+        """db: DatabaseManager-like object with async `save_device_statuses(rows) -> Optional[int]`"""
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_sec = flush_interval_sec
+        self.retry_interval_sec = retry_interval_sec
+        self.queue: Deque[StatusRow] = deque(maxlen=max(1, max_queued))
+        self.stats = StatusWriterStats()
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(), name="dwp-status-writer")
+
+    def log(self, device_id: int, status: str, message: str = None, duration_seconds: int = None):
+        """Queue a status transition ('online', 'offline', 'timeout'). Never waits on MySQL."""
+        if len(self.queue) == self.queue.maxlen:
+            self.stats.dropped += 1
+            if self.stats.dropped == 1 or self.stats.dropped % 1000 == 0:
+                logger.warning(f"⚠️ Device status queue full — dropped {self.stats.dropped} oldest transition(s) so far")
+        self.queue.append((device_id, status, message, duration_seconds, time.time()))
+        self.stats.enqueued += 1
+        if len(self.queue) >= self.batch_size:
+            self.wakeup.set()
+
+    async def close(self):
+        """Try to deliver everything still queued, then stop the writer task"""
+        if self.task is None:
+            return
+        self.stopping.set()
+        self.wakeup.set()
+        await self.task
+        self.task = None
+        if self.queue:
+            logger.warning(f"⚠️ {len(self.queue)} device status transition(s) not written to log_dwp_uptime")
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval_sec)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            delivered = await self.drain()
+            if self.stopping.is_set():
+                return
+            if not delivered:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), self.retry_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain(self) -> bool:
+        """Write queued rows until the queue is empty or a batch fails"""
+        while self.queue:
+            batch = [self.queue[i] for i in range(min(self.batch_size, len(self.queue)))]
+            try:
+                written = await self.db.save_device_statuses(batch)
+            except Exception as e:
+                logger.error(f"❌ Device status batch write failed: {e}")
+                written = None
+            if written is None:
+                self.stats.failed_batches += 1
+                return False
+            # Rows queued meanwhile went to the back (and may have pushed some
+            # of the batch out of a full queue): remove what is still in front
+            for row in batch:
+                if self.queue and self.queue[0] is row:
+                    self.queue.popleft()
+            self.stats.written += written
+            self.stats.rejected += len(batch) - written
+            logger.debug(f"📝 Logged {written} device status transition(s)")
+        return True
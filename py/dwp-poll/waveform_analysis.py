@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import logging
+from dataclasses import dataclass, fields
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Vectorized waveform sanity / std_error analysis for the DWP poller. Every
+# feature the rules need is computed in one NumPy pass over a 2×N (TH, Side)
+# array; the rule functions then only compare a handful of scalars. Verdicts
+# and reasons are identical to the original per-sample Python loops.
+# `cycle_features` derives the per-cycle feature vector that is stored in typed
+# ins_dwp_counts columns for reporting, the same way.
+
+logger = logging.getLogger("DWP")
+
+ACTIVE_LEVEL = 5  # samples above this count as "nonzero" for sensor checks
+SENSOR_ACTIVE_PEAK = 30  # one channel peaking here while the other stays flat...
+SENSOR_FLAT_PEAK = 3  # ...at or below this suggests a disconnected sensor
+SIDE_ZERO_RATIO_MAX = 0.8
+JUMP_WARN = 30  # Δ per sample that is logged
+JUMP_FATAL = 40  # Δ per sample that is physically impossible
+MIN_SAMPLE_RATIO = 0.15  # fewer than 15% of expected samples → missed samples
+DEFAULT_INTERVAL_MS = 100
+
+# CycleFeatures.flags bits
+FLAG_TH_SENSOR = 1  # TH sensor looks flat/disconnected (see sensor_flags)
+FLAG_SIDE_SENSOR = 2  # Side sensor looks flat/disconnected
+FLAG_IMPOSSIBLE_JUMP = 4  # a Δ above JUMP_FATAL between two samples
+
+
+@dataclass
+class WaveformFeatures:
+    sample_count: int
+    max_th: int
+    max_side: int
+    min_th: int
+    min_side: int
+    th_active: int  # samples with TH > ACTIVE_LEVEL
+    side_active: int  # samples with Side > ACTIVE_LEVEL
+    # First sample whose Δ exceeds JUMP_FATAL: (index, ΔTH, ΔSide)
+    fatal_jump: Optional[Tuple[int, int, int]]
+    # Samples with JUMP_WARN < Δ before the fatal jump (or anywhere if none)
+    warn_jumps: List[Tuple[int, int, int]]
+    median_interval_ms: int
+
+
+def _median(values: np.ndarray) -> float:
+    """statistics.median semantics via partition (np.median is ~3x slower on short arrays)"""
+    n = values.size
+    k = n // 2
+    if n % 2:
+        return float(np.partition(values, k)[k])
+    part = np.partition(values, (k - 1, k))
+    return (int(part[k - 1]) + int(part[k])) / 2
+
+
+def analyze_waveform(
+    th_waveform: Sequence[int],
+    side_waveform: Sequence[int],
+    timestamps_ms: Optional[Sequence[int]] = None,
+) -> WaveformFeatures:
+    """Compute every sanity feature of a TH/Side waveform pair in one pass.
+
+    Both channels must be non-empty and of equal length.
+    """
+    w = np.vstack((np.asarray(th_waveform), np.asarray(side_waveform))).astype(np.int32)
+    n = w.shape[1]
+    maxs = w.max(axis=1)
+    mins = w.min(axis=1)
+    active = np.count_nonzero(w > ACTIVE_LEVEL, axis=1)
+
+    fatal_jump = None
+    warn_jumps: List[Tuple[int, int, int]] = []
+    if n > 1:
+        deltas = np.abs(np.diff(w, axis=1))
+        worst = deltas.max(axis=0)
+        fatal = np.flatnonzero(worst > JUMP_FATAL)
+        limit = n - 1
+        if fatal.size:
+            i = int(fatal[0])
+            fatal_jump = (i + 1, int(deltas[0, i]), int(deltas[1, i]))
+            limit = i
+        if logger.isEnabledFor(logging.DEBUG):
+            for i in np.flatnonzero(worst[:limit] > JUMP_WARN):
+                warn_jumps.append((int(i) + 1, int(deltas[0, i]), int(deltas[1, i])))
+
+    median_interval_ms = DEFAULT_INTERVAL_MS
+    if timestamps_ms is not None and len(timestamps_ms) > 1:
+        diffs = np.diff(np.asarray(timestamps_ms, dtype=np.int64))
+        # ignore zero diffs if any (defensive)
+        diffs = diffs[diffs > 0]
+        if diffs.size:
+            median_interval_ms = max(1, int(_median(diffs)))
+
+    return WaveformFeatures(
+        sample_count=n,
+        max_th=int(maxs[0]),
+        max_side=int(maxs[1]),
+        min_th=int(mins[0]),
+        min_side=int(mins[1]),
+        th_active=int(active[0]),
+        side_active=int(active[1]),
+        fatal_jump=fatal_jump,
+        warn_jumps=warn_jumps,
+        median_interval_ms=median_interval_ms,
+    )
+
+
+def check_sanity(f: WaveformFeatures, sample_count: int, duration_ms: int) -> Tuple[bool, str]:
+    """Returns (is_valid, reason_if_invalid) for precomputed features"""
+    # 1. Side pressure near-zero while TH is high → sensor fault
+    #    In split cycles, allow *brief* side drop, but not entire flat zero
+    if f.max_th >= SENSOR_ACTIVE_PEAK and f.max_side <= SENSOR_FLAT_PEAK:
+        zero_side_ratio = (f.sample_count - f.side_active) / f.sample_count
+        if zero_side_ratio > SIDE_ZERO_RATIO_MAX:  # likely sensor disconnected
+            return (
+                False,
+                f"Side sensor likely disconnected: TH={f.max_th}, Side max={f.max_side}, {zero_side_ratio:.0%} zeros",
+            )
+
+    # 2. Extreme Δ/dt (jumps > JUMP_FATAL in one sample); smaller spikes are only logged
+    for i, dth, dside in f.warn_jumps:
+        logger.debug(
+            "⚠️ Large pressure jump ΔTH=%s, ΔSide=%s at sample %s", dth, dside, i, extra={"rate_key": "pressure-jump"}
+        )
+    if f.fatal_jump is not None:
+        i, dth, dside = f.fatal_jump
+        return False, f"Impossible pressure jump: ΔTH={dth}, ΔSide={dside} at sample {i}"
+
+    # 3. Flatline detection
+    if f.max_th - f.min_th <= 1 and f.max_side - f.min_side <= 1 and sample_count > 3:
+        if f.max_th == 0 and f.max_side == 0:
+            return False, "Zero flatline — no cycle detected"
+        return False, "Flatline waveform — no pressure change"
+
+    # 4. Duration vs sample sanity, against the measured median interval
+    expected_samples = max(1, round(duration_ms / f.median_interval_ms))
+    if sample_count < 1 or expected_samples == 0:
+        return False, "Invalid duration or sample count"
+    if sample_count < expected_samples * MIN_SAMPLE_RATIO:
+        return (
+            False,
+            f"Too few samples: {sample_count} for {duration_ms}ms (expected ~{expected_samples}, median_interval={f.median_interval_ms}ms)",
+        )
+
+    # 5. Negative values (shouldn't happen, but guard)
+    if f.min_th < 0 or f.min_side < 0:
+        return False, "Negative pressure reading"
+
+    return True, "OK"
+
+
+def sensor_flags(f: WaveformFeatures, th_flag: int, side_flag: int) -> List[List[int]]:
+    """Apply waveform-aware sensor checks to range-based std_error flags"""
+    # Side sensor likely failed if TH active but Side flat near zero
+    if f.max_th >= SENSOR_ACTIVE_PEAK and f.max_side <= SENSOR_FLAT_PEAK and f.side_active <= 1:
+        side_flag = 0
+    # TH sensor likely failed if Side active but TH flat near zero
+    if f.max_side >= SENSOR_ACTIVE_PEAK and f.max_th <= SENSOR_FLAT_PEAK and f.th_active <= 1:
+        th_flag = 0
+    # Flatline sensors
+    if f.sample_count > 2:
+        if f.max_th == f.min_th:
+            th_flag = 0
+        if f.max_side == f.min_side:
+            side_flag = 0
+    return [[th_flag], [side_flag]]
+
+
+@dataclass
+class CycleFeatures:
+    """Per-cycle feature vector; field names are the ins_dwp_counts column names"""
+    peak_th: int
+    peak_side: int
+    time_to_peak_th_ms: int  # from the first sample to the (first) peak
+    time_to_peak_side_ms: int
+    dwell_th_ms: int  # time spent above the dwell level
+    dwell_side_ms: int
+    auc_th: float  # area under the curve, value × seconds
+    auc_side: float
+    rise_th: float  # mean slope from the first sample up to the peak, per second
+    rise_side: float
+    fall_th: float  # mean slope from the peak down to the last sample, per second (positive)
+    fall_side: float
+    flags: int  # FLAG_* bits
+
+
+FEATURE_COLUMNS = tuple(f.name for f in fields(CycleFeatures))
+
+
+def _per_second(delta: np.ndarray, ms: np.ndarray) -> np.ndarray:
+    return np.divide(delta * 1000.0, ms, out=np.zeros(delta.shape), where=ms > 0)
+
+
+def cycle_features(
+    th_waveform: Sequence[int],
+    side_waveform: Sequence[int],
+    timestamps_ms: Optional[Sequence[int]],
+    dwell_level: int,
+    analysis: Optional[WaveformFeatures] = None,
+) -> CycleFeatures:
+    """Compute the feature vector of a TH/Side waveform pair, both channels at once.
+
+    Without usable timestamps samples are taken to be DEFAULT_INTERVAL_MS apart.
+    `analysis` (from analyze_waveform) is reused for the flags when given.
+    """
+    w = np.vstack((np.asarray(th_waveform), np.asarray(side_waveform))).astype(np.int64)
+    n = w.shape[1]
+    if timestamps_ms is not None and len(timestamps_ms) == n:
+        # Wall-clock timestamps: a backward clock step counts as no time, so
+        # every duration below is >= 0 (the columns are unsigned)
+        dt = np.maximum(np.diff(np.asarray(timestamps_ms, dtype=np.int64)), 0)
+    else:
+        dt = np.full(max(n - 1, 0), DEFAULT_INTERVAL_MS, dtype=np.int64)
+    t = np.concatenate(([0], np.cumsum(dt)))
+    rows = np.arange(2)
+    peak_at = w.argmax(axis=1)
+    peaks = w[rows, peak_at]
+    time_to_peak = t[peak_at]
+    # A sample above the level holds until the next one
+    dwell = ((w[:, :-1] > dwell_level) * dt).sum(axis=1)
+    auc = ((w[:, 1:] + w[:, :-1]) * dt).sum(axis=1) / 2000.0
+    rise = _per_second(peaks - w[:, 0], time_to_peak)
+    fall = _per_second(peaks - w[:, -1], t[-1] - time_to_peak)
+
+    if analysis is None:
+        analysis = analyze_waveform(th_waveform, side_waveform, timestamps_ms)
+    (th_ok,), (side_ok,) = sensor_flags(analysis, 1, 1)
+    flags = (0 if th_ok else FLAG_TH_SENSOR) | (0 if side_ok else FLAG_SIDE_SENSOR)
+    if analysis.fatal_jump is not None:
+        flags |= FLAG_IMPOSSIBLE_JUMP
+
+    return CycleFeatures(
+        peak_th=int(peaks[0]),
+        peak_side=int(peaks[1]),
+        time_to_peak_th_ms=int(time_to_peak[0]),
+        time_to_peak_side_ms=int(time_to_peak[1]),
+        dwell_th_ms=int(dwell[0]),
+        dwell_side_ms=int(dwell[1]),
+        auc_th=round(float(auc[0]), 3),
+        auc_side=round(float(auc[1]), 3),
+        rise_th=round(float(rise[0]), 3),
+        rise_side=round(float(rise[1]), 3),
+        fall_th=round(float(fall[0]), 3),
+        fall_side=round(float(fall[1]), 3),
+        flags=flags,
+    )
@@ -5,6 +5,7 @@
 use App\Traits\HasDateRangeFilter;
 use App\Models\InsDwpDevice;
 use App\Models\InsDwpCount;
+use App\Services\DwpPvCodec;
 use App\Models\UptimeLog;
 use App\Models\InsDwpTimeAlarmCount;
 use App\Services\WorkingHoursService;
@@ -202,8 +203,8 @@ public function updateData()
             $rightLast = $latestCounts->where('mechine', $machineName)->where('position', 'R')->first();
 
             // Parse enhanced PV structure
-            $leftPv = $leftLast ? (json_decode($leftLast->pv, true) ?? null) : null;
-            $rightPv = $rightLast ? (json_decode($rightLast->pv, true) ?? null) : null;
+            $leftPv = $leftLast ? (DwpPvCodec::decode($leftLast->pv) ?? null) : null;
+            $rightPv = $rightLast ? (DwpPvCodec::decode($rightLast->pv) ?? null) : null;
 
             // Extract waveforms from enhanced PV structure
             $leftWaveforms = $leftPv['waveforms'] ?? [[0], [0]];
@@ -222,7 +223,7 @@ public function updateData()
             $allPeaks = [];
             if (isset($recentRecords[$machineName])) {
                 foreach ($recentRecords[$machineName] as $record) {
-                    $decodedPv = json_decode($record->pv, true) ?? [];
+                    $decodedPv = DwpPvCodec::decode($record->pv) ?? [];
                     // Check for enhanced PV structure
                     if (isset($decodedPv['waveforms']) && is_array($decodedPv['waveforms'])) {
                         // Use waveforms from enhanced structure
@@ -416,7 +417,7 @@ public function getPressureReadingStats()
         
         foreach ($query->cursor() as $record) {
             // Parse the PV data
-            $arrayPv = is_string($record->pv) ? json_decode($record->pv, true) : $record->pv;
+            $arrayPv = DwpPvCodec::decode($record->pv);
             
             if (!is_array($arrayPv)) {
                 continue;
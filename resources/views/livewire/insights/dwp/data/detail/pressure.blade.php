@@ -4,6 +4,7 @@
 use Livewire\Attributes\On;
 use Livewire\Attributes\Url;
 use App\Models\InsDwpCount;
+use App\Services\DwpPvCodec;
 use Carbon\Carbon;
 
 new class extends Component {
@@ -64,7 +65,7 @@ private function getMax(array $array)
     private function renderPressureChartClient()
     {
         $isTimeAxis = false;
-        $pvRaw = json_decode($this->detail['pv'] ?? '[]', true);
+        $pvRaw = DwpPvCodec::decode($this->detail['pv'] ?? '[]');
         $waveforms = $pvRaw['waveforms'] ?? [];
         $duration = (int) ($this->detail['duration'] ?? 0);
         // Get values and timestamps
@@ -8,6 +8,7 @@
 use Livewire\Attributes\Url;
 use Livewire\Attributes\On;
 use App\Models\InsDwpCount;
+use App\Services\DwpPvCodec;
 use Carbon\Carbon;
 
 new #[Layout("layouts.app")] class extends Component {
@@ -330,7 +331,7 @@ private function generateCharts()
         // Loop through each database record - optimized processing
         foreach ($counts as $count) {
             // Decode JSON once
-            $arrayPv = is_string($count->pv) ? json_decode($count->pv, true) : $count->pv;
+            $arrayPv = DwpPvCodec::decode($count->pv);
             
             if (!is_array($arrayPv)) {
                 continue;
@@ -506,7 +507,7 @@ private function generatePressureSummaryChart($data)
             }
 
             // Parse the PV data
-            $arrayPv = is_string($record->pv) ? json_decode($record->pv, true) : $record->pv;
+            $arrayPv = DwpPvCodec::decode($record->pv);
             
             if (!is_array($arrayPv)) {
                 continue;
@@ -6,6 +6,7 @@
 use Livewire\Attributes\Url;
 use Livewire\Attributes\On;
 use App\Models\InsDwpCount;
+use App\Services\DwpPvCodec;
 use App\Models\InsDwpDevice;
 use App\Models\InsDwpStandardPV;
 use App\Helpers\GlobalHelpers;
@@ -275,7 +276,7 @@ public function with(): array
         if ($this->status) {
             $allCounts = $query->get();
             $filteredCounts = $allCounts->filter(function($count) {
-                $pv = json_decode($count->pv, true);
+                $pv = DwpPvCodec::decode($count->pv);
                 if (!isset($pv['waveforms']) || !isset($pv['timestamps'])) {
                     return false;
                 }
@@ -417,7 +418,7 @@ public function download($type)
                     $this->getCountsQuery()->chunk(1000, function ($counts) use ($file) {
                         foreach ($counts as $count) {
                             $device = $this->getDeviceForLine($count->line);
-                            $pv = json_decode($count->pv, true)['waveforms'];
+                            $pv = DwpPvCodec::decode($count->pv)['waveforms'];
                             $toe = $this->getMedian($pv[0]);
                             $side = $this->getMedian($pv[1]);
                             
@@ -719,8 +720,9 @@ private function repeatWaveform(array $valuesRaw, array $timestampsRaw, int $dur
                         @endphp
                         @foreach ($counts as $count)
                             @php
-                                $pv = json_decode($count->pv, true)['waveforms'];
-                                $pvTimestamp = json_decode($count->pv, true)['timestamps'];
+                                $pvData = DwpPvCodec::decode($count->pv);
+                                $pv = $pvData['waveforms'];
+                                $pvTimestamp = $pvData['timestamps'];
                                 $toeHeelArray = $this->repeatWaveform($pv[0] ?? null, $pvTimestamp ?? [], (int)($count->duration ?? 0));
                                 $sideArray = $this->repeatWaveform($pv[1] ?? null, $pvTimestamp ?? [], (int)($count->duration ?? 0));
 
@@ -0,0 +1,59 @@
+<?php
+
+use App\Services\DwpPvCodec;
+
+// Fixtures are pv columns as the poller writes them:
+// json.dumps(pv_codec.encode_pv(..., version), separators=(",", ":"))
+
+it('decodes a version 2 pv into the version 1 layout', function () {
+    // th/side: [0, 30, 65535, 12, 0, 7] / [5, 3, 0, 40, 65535, 1] (negative
+    // deltas, 3-byte varints); timestamps step back 10 ms after the second sample
+    $pv = '{"v":2,"n":6,"waveforms":["ADzC/wfl/wcXDg==","CgMFUK7/B/v/Bw=="],"t0":1700000000000,"dt":"yAHbAYAFowMA","quality":{"grade":"GOOD"}}';
+
+    expect(DwpPvCodec::decode($pv))->toBe([
+        'waveforms' => [
+            [0, 30, 65535, 12, 0, 7],
+            [5, 3, 0, 40, 65535, 1],
+        ],
+        'timestamps' => [
+            1700000000000,
+            1700000000100,
+            1700000000090,
+            1700000000400,
+            1700000000500,
+            1700000000600,
+        ],
+        'quality' => ['grade' => 'GOOD'],
+    ]);
+});
+
+it('decodes an already parsed version 2 pv', function () {
+    $pv = json_decode('{"v":2,"n":6,"waveforms":["ADzC/wfl/wcXDg==","CgMFUK7/B/v/Bw=="],"t0":1700000000000,"dt":"yAHbAYAFowMA","quality":{"grade":"GOOD"}}', true);
+
+    $decoded = DwpPvCodec::decode($pv);
+
+    expect($decoded['waveforms'][0])->toBe([0, 30, 65535, 12, 0, 7])
+        ->and($decoded['timestamps'][2])->toBe(1700000000090);
+});
+
+it('decodes empty version 2 waveforms without timestamps', function () {
+    $pv = '{"v":2,"n":0,"waveforms":["",""],"quality":{}}';
+
+    expect(DwpPvCodec::decode($pv))->toBe([
+        'waveforms' => [[], []],
+        'quality' => [],
+    ]);
+});
+
+it('passes version 1 pv through unchanged', function () {
+    $json = '{"waveforms":[[40,41],[39,40]],"timestamps":[1700000000000,1700000000100],"quality":{"grade":"GOOD"}}';
+    $pv = json_decode($json, true);
+
+    expect(DwpPvCodec::decode($json))->toBe($pv)
+        ->and(DwpPvCodec::decode($pv))->toBe($pv);
+});
+
+it('returns null for a pv that is not JSON', function () {
+    expect(DwpPvCodec::decode('not json'))->toBeNull()
+        ->and(DwpPvCodec::decode(null))->toBeNull();
+});